@@ -5,8 +5,14 @@ Created on Tue Feb  4 08:30:51 2025
 @author: geots
 """
 
+import os
+import sys
+
 from pyomo.environ import *
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Codes'))
+from SolverBackends import get_solver
+
 # Create a model
 model = ConcreteModel()
 
@@ -39,7 +45,7 @@ model.MilkMachine1 = Constraint(expr=model.xC - 10 - 40 * model.yC <= 0)
 model.MilkMachine2 = Constraint(expr=model.xC - 11 * model.yC >= 0)
 
 # Create a solver
-solver = SolverFactory('gurobi')  # Make sure Gurobi is installed and properly configured
+solver = get_solver()  # Backend from SolverBackends (HiGHS unless configured otherwise)
 
 # Solve the model
 results = solver.solve(model, tee=True)
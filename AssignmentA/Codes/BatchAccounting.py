@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""
+Array-based feasibility checks and cost accounting for policy evaluation.
+
+Decisions are held as NumPy arrays with any number of leading batch axes,
+typically (experiments, periods):
+    x, z, m, current_stock, demands, prices:  (..., W)
+    send, receive:                            (..., W, W)
+so that a whole evaluation run is checked and costed with a few array operations.
+"""
+
+import numpy as np
+
+
+def to_array(values, W, ndim=1):
+    """
+    Converts a policy output (array, list or dict keyed by warehouse / warehouse pair) to an array.
+    """
+    if isinstance(values, dict):
+        if ndim == 1:
+            return np.array([values[w] for w in W], dtype=float)
+        return np.array([[values[w, q] for q in W] for w in W], dtype=float)
+    return np.asarray(values, dtype=float)
+
+
+def constraint_checks(x, send, receive, z, m, current_stock, demands,
+                      warehouse_capacities, transport_capacities, tol=1e-6):
+    """
+    Checks each here-and-now constraint of every decision in the batch.
+
+    The constraints are those of the warehouse models: non-negativity, storage and
+    transport capacities, send/receive consistency, the stock balance and sending
+    only from stored stock.
+
+    Returns:
+        dict: Constraint name -> boolean array over the leading batch axes, True where it holds.
+    """
+    return {
+        'nonnegative': (
+            (x >= -tol).all(-1) & (z >= -tol).all(-1) & (m >= -tol).all(-1)
+            & (send >= -tol).all((-2, -1)) & (receive >= -tol).all((-2, -1))
+        ),
+        'storage': (z <= warehouse_capacities + tol).all(-1),
+        'transport': (send <= transport_capacities + tol).all((-2, -1)),
+        'consistent': (np.abs(send - np.swapaxes(receive, -2, -1)) <= tol).all((-2, -1)),
+        'balance': (np.abs(
+            x + m + current_stock + receive.sum(-1) - demands - z - send.sum(-1)
+        ) <= tol).all(-1),
+        'sent_from_stock': (send.sum(-1) <= current_stock + tol).all(-1),
+    }
+
+
+def check_feasibility_batch(x, send, receive, z, m, current_stock, demands,
+                            warehouse_capacities, transport_capacities, tol=1e-6):
+    """
+    Checks the here-and-now constraints of every decision in the batch (see constraint_checks).
+
+    Returns:
+        np.ndarray: Boolean array over the leading batch axes, True where the decision is feasible.
+    """
+    checks = constraint_checks(x, send, receive, z, m, current_stock, demands,
+                               warehouse_capacities, transport_capacities, tol)
+    return np.logical_and.reduce(list(checks.values()))
+
+
+def policy_cost_batch(prices, x, receive, m, cost_miss, cost_tr):
+    """
+    Cost of every decision in the batch:
+        sum_w prices[w] * x[w] + cost_miss[w] * m[w] + sum_q cost_tr[w, q] * receive[w, q]
+
+    Returns:
+        np.ndarray: Costs over the leading batch axes, as floats. Unlike the original
+            Evaluation_Framework, which stored them in an integer array, they are not truncated.
+    """
+    return (
+        (prices * x).sum(-1)
+        + (m * cost_miss).sum(-1)
+        + np.einsum('...wq,wq->...', receive, cost_tr)
+    )
+
+
+def stock_trajectory(z, initial_stock):
+    """
+    Stock at the start of every period, given the end-of-period stocks z of shape (..., T, W).
+    """
+    stock = np.empty_like(z)
+    stock[..., 0, :] = initial_stock
+    stock[..., 1:, :] = z[..., :-1, :]
+    return stock
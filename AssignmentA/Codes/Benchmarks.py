@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark suite for the decision pipeline.
+
+Times, separately, scenario generation, Pyomo model construction, solver
+time and the end-to-end policy evaluation, over parameterised sizes. Results
+are written as JSON and can be compared against a stored baseline run:
+
+    python Benchmarks.py --output results.json --baseline baseline.json
+    python Benchmarks.py --warehouses 10 50 --scenarios 10 100 --save-baseline baseline.json
+
+The exit code is 1 when a benchmark is slower than its baseline by more than
+the threshold factor, so the suite can guard a CI job.
+"""
+
+import argparse
+import json
+import platform
+import sys
+import time
+
+import numpy as np
+
+
+def _timed(function, repeat):
+    """
+    Runs function() `repeat` times.
+
+    Returns:
+        tuple: (median seconds, result of the last call).
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        times.append(time.perf_counter() - start)
+    return float(np.median(times)), result
+
+
+def bench_scenario_generation(n_scenarios, repeat=3):
+    """Scalar wind_model/price_model loop against the batch generator."""
+    from data import get_fixed_data
+    from ScenarioGenerator import generate_scenarios, generate_scenarios_scalar
+
+    data = get_fixed_data()
+    # The scalar loop is timed on at most 1000 scenarios and scaled
+    n_scalar = min(n_scenarios, 1000)
+    scalar, _ = _timed(lambda: generate_scenarios_scalar(n_scalar, data), repeat)
+    batch, _ = _timed(lambda: generate_scenarios(n_scenarios, data, rng=0), repeat)
+    return {
+        'scalar': scalar * n_scenarios / n_scalar,
+        'batch': batch,
+    }
+
+
+def bench_hydrogen_model(backend=None, repeat=3):
+    """Task0 hydrogen hub MILP: Pyomo build and solve."""
+    from SolverBackends import get_solver
+    from Task0 import build_model
+
+    np.random.seed(0)
+    build, (model, T, p_wind) = _timed(build_model, repeat)
+    solver = get_solver(backend)
+    solve, _ = _timed(lambda: solver.solve(model), repeat)
+    return {'build': build, 'solve': solve}
+
+
+def bench_oih(warehouses, periods, backend=None, repeat=3):
+    """OiH model: build once, then update prices and re-solve."""
+    from MatrixModels import synthetic_problem_data
+    from OiH import OiHModel
+
+    problem_data = synthetic_problem_data(warehouses, periods)
+    rng = np.random.default_rng(0)
+    build, oih = _timed(lambda: OiHModel(backend, problem_data), repeat)
+
+    def solve():
+        oih.update(rng.uniform(10, 50, warehouses), rng.uniform(10, 50, warehouses))
+        oih.solve()
+    solve, _ = _timed(solve, repeat)
+    return {'build': build, 'solve': solve}
+
+
+def bench_sp(warehouses, scenarios, backend=None, repeat=3):
+    """Two-stage SP: build once, then update the scenario prices and re-solve."""
+    from MatrixModels import synthetic_problem_data
+    from SP_2stage import StochasticHereAndNowModel
+
+    problem_data = synthetic_problem_data(warehouses)
+    rng = np.random.default_rng(0)
+    prob = np.full(scenarios, 1 / scenarios)
+    build, sp = _timed(lambda: StochasticHereAndNowModel(scenarios, backend, problem_data), repeat)
+
+    def solve():
+        sp.update(rng.uniform(10, 50, warehouses), rng.uniform(10, 50, (warehouses, scenarios)),
+                  problem_data[6], prob=prob)
+        sp.solve()
+    solve, _ = _timed(solve, repeat)
+    return {'build': build, 'solve': solve}
+
+
+def bench_evaluation(experiments, n_workers=1, repeat=1):
+    """End-to-end policy evaluation of Evaluation_Framework."""
+    from Evaluation_Engine import evaluate_policy
+
+    seconds, _ = _timed(lambda: evaluate_policy(n_workers=n_workers, experiments=experiments), repeat)
+    return {'total': seconds}
+
+
+def run_suite(warehouses=(10, 50), periods=(2,), scenarios=(10, 100), experiments=(40,),
+              backend=None, repeat=3, n_workers=1):
+    """
+    Runs every benchmark over the given sizes.
+
+    Returns:
+        dict: 'metadata' and 'results', where results maps a benchmark name such as
+            'sp[warehouses=10,scenarios=100]' to its timings in seconds.
+    """
+    results = {}
+
+    def record(name, sizes, function, *args, **kwargs):
+        key = name
+        if sizes:
+            key += '[%s]' % ','.join('%s=%s' % item for item in sizes.items())
+        try:
+            results[key] = function(*args, **kwargs)
+        except ImportError as error:
+            # e.g. the course's experiment or policy modules are not on the path
+            results[key] = {'skipped': str(error)}
+        print(key, results[key])
+
+    for n in scenarios:
+        record('scenario_generation', {'scenarios': n}, bench_scenario_generation, n, repeat)
+    record('hydrogen_model', {}, bench_hydrogen_model, backend, repeat)
+    for w in warehouses:
+        for t in periods:
+            record('oih', {'warehouses': w, 'periods': t}, bench_oih, w, t, backend, repeat)
+        for n in scenarios:
+            record('sp', {'warehouses': w, 'scenarios': n}, bench_sp, w, n, backend, repeat)
+    for e in experiments:
+        record('evaluation', {'experiments': e, 'workers': n_workers}, bench_evaluation, e, n_workers)
+
+    metadata = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': sys.version.split()[0],
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'backend': backend,
+        'repeat': repeat,
+    }
+    return {'metadata': metadata, 'results': results}
+
+
+def compare(results, baseline):
+    """
+    Compares two suite outputs.
+
+    Returns:
+        list: (benchmark, timing, seconds, baseline seconds, ratio) for every timing present
+            in both, sorted by decreasing ratio.
+    """
+    rows = []
+    for name, timings in results['results'].items():
+        for timing, seconds in timings.items():
+            reference = baseline['results'].get(name, {}).get(timing)
+            if isinstance(seconds, float) and isinstance(reference, float) and reference > 0:
+                rows.append((name, timing, seconds, reference, seconds / reference))
+    return sorted(rows, key=lambda row: -row[4])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--warehouses', type=int, nargs='+', default=[10, 50])
+    parser.add_argument('--periods', type=int, nargs='+', default=[2])
+    parser.add_argument('--scenarios', type=int, nargs='+', default=[10, 100])
+    parser.add_argument('--experiments', type=int, nargs='+', default=[40])
+    parser.add_argument('--backend', default=None)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--output', help='JSON file for the results')
+    parser.add_argument('--baseline', help='JSON results of an earlier run to compare against')
+    parser.add_argument('--save-baseline', help='Also write the results as the new baseline')
+    parser.add_argument('--threshold', type=float, default=1.25,
+                        help='Slowdown factor against the baseline counted as a regression')
+    args = parser.parse_args()
+
+    suite = run_suite(args.warehouses, args.periods, args.scenarios, args.experiments,
+                      args.backend, args.repeat, args.workers)
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, 'w') as file:
+                json.dump(suite, file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        rows = compare(suite, baseline)
+        for name, timing, seconds, reference, ratio in rows:
+            flag = 'REGRESSION' if ratio > args.threshold else ''
+            print("%-45s %-8s %9.4f s  baseline %9.4f s  x%.2f %s" % (name, timing, seconds, reference, ratio, flag))
+        if any(row[4] > args.threshold for row in rows):
+            sys.exit(1)
@@ -0,0 +1,233 @@
+# -*- coding: utf-8 -*-
+"""
+L-shaped (Benders) decomposition of the two-stage stochastic program of SP_2stage.
+
+The master problem holds the first-stage decisions (x1, z1, m1, ys1, yr1) and one
+recourse estimate theta_s per scenario (multi-cut). Given the master's stock z1,
+every second-stage subproblem is an independent LP that only differs in its
+price vector. Each worker keeps one HiGHS instance of that LP and only changes
+prices and z1-dependent bounds between solves. Subproblems are solved in parallel and return optimality
+cuts theta_s >= Q_s(z1_hat) + g_s (z1 - z1_hat). The second stage always has a
+feasible recourse (missing quantities are allowed), so no feasibility cuts are needed.
+"""
+
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import highspy
+
+from MatrixModels import MatrixModel, problem_arrays, build_sp_matrix, synthetic_problem_data
+
+
+def build_recourse_matrix(problem_data, z1, tau=1):
+    """
+    Second-stage LP of one scenario for a given first-stage stock z1, with zero prices.
+
+    Returns:
+        tuple: (MatrixModel, demand rows, sending rows), the rows whose
+            right-hand sides depend on z1.
+    """
+    W, b, e, Cs, Ct, z0, sim_T, D = problem_arrays(problem_data)
+    n = len(W)
+    D2 = D[:, min(tau, D.shape[1] - 1)]
+
+    mm = MatrixModel()
+    x2 = mm.add_variables('x2', (n,))
+    z2 = mm.add_variables('z2', (n,), ub=Cs)
+    m2 = mm.add_variables('m2', (n,), cost=b)
+    ys2 = mm.add_variables('ys2', (n, n), cost=e, ub=Ct)
+    yr2 = mm.add_variables('yr2', (n, n))
+
+    mm.add_rows([(1.0, ys2.ravel()), (-1.0, yr2.T.ravel())], 0, 0)
+    demand_rows = mm.add_rows([(1.0, x2), (1.0, m2), (-1.0, z2), (1.0, yr2), (-1.0, ys2)], D2 - z1, D2 - z1)
+    sending_rows = mm.add_rows([(1.0, ys2)], -np.inf, z1)
+
+    return mm, demand_rows, sending_rows
+
+
+# Recourse LP of the current process: (Highs instance, x2 columns, demand rows, sending rows, D2)
+_recourse = None
+
+
+def _init_recourse(problem_data, tau):
+    """
+    Loads the recourse LP into a HiGHS instance once per process; later solves only
+    change the z1-dependent row bounds and the x2 prices, and warm-start from the previous basis.
+    """
+    global _recourse
+    recourse, demand_rows, sending_rows = build_recourse_matrix(problem_data, np.zeros(len(problem_data[1])), tau)
+    D = problem_arrays(problem_data)[-1]
+    D2 = D[:, min(tau, D.shape[1] - 1)]
+    _recourse = (recourse.to_highs(), recourse.blocks['x2'].astype(np.int32), demand_rows.astype(np.int32),
+                 sending_rows.astype(np.int32), D2)
+
+
+def _solve_recourse_chunk(args):
+    """
+    Solves the recourse LP at first-stage stock z1 for a chunk of scenario price vectors.
+
+    Returns:
+        tuple: (recourse costs Q of shape (k,), subgradients dQ/dz1 of shape (k, W)).
+    """
+    z1, prices = args
+    highs, x2_index, demand_rows, sending_rows, D2 = _recourse
+    n = len(z1)
+    highs.changeRowsBounds(n, demand_rows, D2 - z1, D2 - z1)
+    highs.changeRowsBounds(n, sending_rows, np.full(n, -highspy.kHighsInf), z1)
+
+    Q = np.empty(len(prices))
+    gradient = np.empty((len(prices), n))
+    for k, price in enumerate(prices):
+        highs.changeColsCost(n, x2_index, price)
+        highs.run()
+        # A failed solve would give a wrong cut
+        if highs.getModelStatus() != highspy.HighsModelStatus.kOptimal:
+            raise RuntimeError("HiGHS did not solve the recourse LP of scenario %d of the chunk: %s"
+                               % (k, highs.modelStatusToString(highs.getModelStatus())))
+        row_dual = np.asarray(highs.getSolution().row_dual)
+        Q[k] = highs.getInfo().objective_function_value
+        # Demand rhs is D2 - z1 and sending rhs is z1
+        gradient[k] = -row_dual[demand_rows] + row_dual[sending_rows]
+    return Q, gradient
+
+
+def recourse_lower_bound(problem_data, p_scen, tau=1):
+    """
+    Lower bound of the recourse cost of every scenario, for the theta columns of the master.
+
+    Missing and transport costs are non-negative, and the second-stage order of a warehouse
+    is at most D2 + z2 + sent <= D2 + 2 * Cs, so only negative prices can lower the cost:
+    Q_s >= sum_w min(p_s[w], 0) * (D2[w] + 2 * Cs[w]).
+
+    Returns:
+        np.ndarray: Bounds of shape (N,), -inf where the capacity is unbounded.
+    """
+    W, b, e, Cs, Ct, z0, sim_T, D = problem_arrays(problem_data)
+    D2 = D[:, min(tau, D.shape[1] - 1)]
+    negative = np.minimum(p_scen, 0)
+    # 0 * inf is skipped for non-negative prices
+    with np.errstate(invalid='ignore'):
+        return np.where(negative < 0, negative * (D2 + 2 * Cs)[:, None], 0.0).sum(axis=0)
+
+
+class BendersResult:
+    """
+    Outcome of the L-shaped method.
+
+    Attributes:
+        objective (float): Best upper bound (cost of the returned first-stage decision).
+        lower_bound (float): Final master objective.
+        first_stage (dict): Arrays 'x1', 'z1', 'm1' (W,) and 'ys1', 'yr1' (W, W).
+        iterations (int): Number of master iterations.
+        history (list): (lower bound, upper bound) after each iteration.
+    """
+
+    def __init__(self, objective, lower_bound, first_stage, iterations, history):
+        self.objective = objective
+        self.lower_bound = lower_bound
+        self.first_stage = first_stage
+        self.iterations = iterations
+        self.history = history
+
+
+def solve_sp_benders(problem_data, p1, p_scen, prob, current_stock=None, tau=1, tol=1e-6,
+                     max_iterations=100, n_workers=None):
+    """
+    Solves the two-stage SP with the multi-cut L-shaped method.
+
+    Args:
+        problem_data (tuple): Output of load_the_data().
+        p1: First-stage price of each warehouse.
+        p_scen (np.ndarray): Second-stage scenario prices, shape (warehouses, N).
+        prob (np.ndarray): Scenario probabilities, shape (N,).
+        current_stock: Current stock of each warehouse. Defaults to the initial stock.
+        tau (int): Current timeslot (1-based), selects the demands of both stages.
+        tol (float): Relative gap between the bounds at which to stop.
+        max_iterations (int): Maximum number of master iterations.
+        n_workers (int, optional): Processes for the subproblems. Defaults to the number of cores.
+
+    Returns:
+        BendersResult
+    """
+    W = problem_data[1]
+    n, N = len(W), p_scen.shape[1]
+    prob = np.asarray(prob, dtype=float)
+
+    # Master: the extensive form without scenarios, plus theta_s above a lower bound of the recourse cost
+    master = build_sp_matrix(problem_data, p1, p_scen[:, :0], prob[:0], current_stock, tau)
+    theta = master.add_variables('theta', (N,), cost=prob, lb=recourse_lower_bound(problem_data, p_scen, tau),
+                                 ub=np.inf)
+    z1_index = master.blocks['z1']
+    # The master stays loaded in HiGHS; cuts are appended and each solve warm-starts from the last basis
+    master_highs = master.to_highs()
+
+    n_workers = os.cpu_count() if n_workers is None else n_workers
+    if n_workers > 1:
+        pool = ProcessPoolExecutor(max_workers=n_workers, initializer=_init_recourse, initargs=(problem_data, tau))
+    else:
+        pool = None
+        _init_recourse(problem_data, tau)
+    chunks = np.array_split(np.arange(N), max(1, min(N, 4 * n_workers)))
+
+    upper_bound, lower_bound, best, history = np.inf, -np.inf, None, []
+    try:
+        for iteration in range(1, max_iterations + 1):
+            master_highs.run()
+            if master_highs.getModelStatus() != highspy.HighsModelStatus.kOptimal:
+                raise RuntimeError("HiGHS did not solve the Benders master: %s"
+                                   % master_highs.modelStatusToString(master_highs.getModelStatus()))
+            lower_bound = master_highs.getInfo().objective_function_value
+            values = np.asarray(master_highs.getSolution().col_value)
+            solution = {name: values[index] for name, index in master.blocks.items()}
+            z1 = solution['z1']
+
+            tasks = [(z1, p_scen[:, chunk].T) for chunk in chunks]
+            results = pool.map(_solve_recourse_chunk, tasks) if pool else map(_solve_recourse_chunk, tasks)
+            Q, gradient = (np.concatenate(parts) for parts in zip(*results))
+
+            candidate = lower_bound - prob @ solution['theta'] + prob @ Q
+            if candidate < upper_bound:
+                upper_bound = candidate
+                best = {name: solution[name] for name in ('x1', 'z1', 'm1', 'ys1', 'yr1')}
+            history.append((lower_bound, upper_bound))
+
+            if upper_bound - lower_bound <= tol * max(1.0, abs(upper_bound)):
+                break
+
+            # Optimality cuts theta_s - g_s z1 >= Q_s - g_s z1_hat, only for scenarios whose estimate is too low
+            violated = Q > solution['theta'] + tol * max(1.0, abs(upper_bound)) / N
+            k = int(violated.sum())
+            columns = np.column_stack([theta[violated], np.broadcast_to(z1_index, (k, n))])
+            coefficients = np.column_stack([np.ones(k), -gradient[violated]])
+            master_highs.addRows(k, Q[violated] - gradient[violated] @ z1, np.full(k, highspy.kHighsInf),
+                                 columns.size, np.arange(0, columns.size, n + 1, dtype=np.int32),
+                                 columns.ravel().astype(np.int32), coefficients.ravel())
+    finally:
+        if pool:
+            pool.shutdown()
+
+    return BendersResult(upper_bound, lower_bound, best, iteration, history)
+
+
+if __name__ == "__main__":
+    # Extensive form against the L-shaped method on a synthetic instance
+    problem_data = synthetic_problem_data(10)
+    rng = np.random.default_rng(0)
+    p1 = rng.uniform(10, 50, 10)
+
+    for N in (100, 500, 1000, 2000):
+        p_scen = rng.uniform(10, 50, (10, N))
+        prob = np.full(N, 1 / N)
+
+        start = time.perf_counter()
+        extensive = build_sp_matrix(problem_data, p1, p_scen, prob).solve()[0]
+        extensive_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        benders = solve_sp_benders(problem_data, p1, p_scen, prob)
+        benders_time = time.perf_counter() - start
+
+        print("N=%5d  extensive %.4f in %.2f s | L-shaped %.4f in %.2f s (%d iterations)"
+              % (N, extensive, extensive_time, benders.objective, benders_time, benders.iterations))
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""
+Checkpoints of long policy-evaluation campaigns.
+
+Completed experiments are written to a directory as compressed .npz chunks,
+each holding the decisions of a batch of experiments and their indices, next
+to a manifest.json describing the run. A run pointed at the same directory
+restores the finished experiments into its TrajectoryStore and only runs the
+others. As experiment e always runs with its own seed stream, and the price
+experiments are drawn from the run's seed and recorded by their hash in the
+manifest, the resumed run gives the same result as an uninterrupted one.
+
+Chunks are written to a temporary file and renamed, so a run killed while
+writing never leaves a corrupt chunk behind.
+"""
+
+import glob
+import json
+import os
+
+import numpy as np
+
+from TrajectoryStore import FIELDS
+
+# Costs are recomputed from the decisions at the end of every run
+CHECKPOINT_FIELDS = [name for name in FIELDS if name != 'cost']
+
+
+class Checkpoint:
+    """
+    Directory of experiment chunks.
+
+    Args:
+        path (str): Checkpoint directory, created if needed.
+        metadata (dict): Describes the run (JSON-serialisable). Resuming a checkpoint
+            written with different metadata raises a ValueError.
+        every (int): Number of completed experiments per chunk.
+        resume (bool): Keep the chunks found in path. False deletes them and starts over.
+    """
+
+    def __init__(self, path, metadata, every=50, resume=True):
+        self.path = path
+        self.every = every
+        self.pending = []
+        os.makedirs(path, exist_ok=True)
+
+        manifest = os.path.join(path, 'manifest.json')
+        if resume and os.path.exists(manifest):
+            with open(manifest) as file:
+                saved = json.load(file)
+            if saved != metadata:
+                raise ValueError("Checkpoint in %s belongs to another run: %s, expected %s" % (path, saved, metadata))
+        else:
+            for chunk in self.chunk_files():
+                os.remove(chunk)
+        with open(manifest, 'w') as file:
+            json.dump(metadata, file, indent=2)
+        # Number of the next chunk, after all existing ones
+        self._next = max((int(os.path.basename(chunk)[6:12]) + 1 for chunk in self.chunk_files()), default=0)
+
+    def chunk_files(self):
+        return sorted(glob.glob(os.path.join(self.path, 'chunk_*.npz')))
+
+    def restore(self, store):
+        """
+        Copies the checkpointed experiments that fit in store into it.
+
+        Returns:
+            set: Indices of the restored experiments.
+        """
+        restored = set()
+        for chunk in self.chunk_files():
+            with np.load(chunk) as values:
+                experiments = values['experiments']
+                keep = experiments < store.n_experiments
+                for name in CHECKPOINT_FIELDS:
+                    store.arrays[name][experiments[keep]] = values[name][keep]
+                restored.update(experiments[keep].tolist())
+        return restored
+
+    def add(self, store, e):
+        """Marks experiment e of store as completed; writes a chunk every `every` experiments."""
+        self.pending.append(e)
+        if len(self.pending) >= self.every:
+            self.flush(store)
+
+    def flush(self, store):
+        """Writes the pending experiments as a new chunk."""
+        if not self.pending:
+            return
+        experiments = np.array(self.pending)
+        chunk = os.path.join(self.path, 'chunk_%06d.npz' % self._next)
+        with open(chunk + '.tmp', 'wb') as file:
+            np.savez_compressed(file, experiments=experiments,
+                                **{name: store.arrays[name][experiments] for name in CHECKPOINT_FIELDS})
+        os.replace(chunk + '.tmp', chunk)
+        self._next += 1
+        self.pending = []
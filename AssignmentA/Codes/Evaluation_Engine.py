@@ -0,0 +1,282 @@
+# -*- coding: utf-8 -*-
+"""
+Parallel Monte Carlo evaluation of a here-and-now policy.
+
+Experiments are independent, so each one is run in a worker process with its
+own deterministic seed. The per-timeslot logic (policy call, the course's
+check_feasibility and dummy-policy fallback) is the same as in the original
+Evaluation_Framework; decisions are kept in a TrajectoryStore and the whole
+run is costed with BatchAccounting.
+With a checkpoint path, completed experiments are saved as they come in and an
+interrupted run resumes where it stopped (see Checkpoint).
+"""
+
+import hashlib
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from my_policy import make_here_and_now_decision
+from dummy_policy import make_dummy_decision
+from data import load_problem_data
+from feasibility_check import check_feasibility
+from simulation_experiments import simulation_experiments_creation
+from BatchAccounting import constraint_checks, policy_cost_batch, to_array
+from Checkpoint import Checkpoint
+from Instrumentation import Instrumentation
+from Seeding import SeedTree, seed_global
+from SolutionCache import CachedPolicy
+from TrajectoryStore import TrajectoryStore
+
+# Problem data of the current process. load_problem_data caches it, so forked workers
+# inherit the parent's copy and the initializer does not reload it
+_problem_data = None
+# Memory-mapped stores opened by the current process, by path
+_stores = {}
+# Used when a run is not instrumented
+_disabled = Instrumentation(enabled=False)
+
+
+def _init_worker():
+    global _problem_data
+    _problem_data = load_problem_data('problem_data')
+
+
+def _open_store(path):
+    if path not in _stores:
+        _stores[path] = TrajectoryStore.open(path, mode='r+')
+    return _stores[path]
+
+
+def run_experiment(e, prices, seed, policy=make_here_and_now_decision, fallback=make_dummy_decision, store_path=None,
+                   instrumentation=None):
+    """
+    Runs the policy over the whole horizon of one experiment.
+
+    Args:
+        e (int): Experiment index (only used for logging).
+        prices (np.ndarray): Price realisation of the experiment, shape (warehouses, periods).
+        seed (np.random.SeedSequence, int or sequence): Seed of the global numpy random state
+            for this experiment.
+        policy (callable): Here-and-now policy (number_of_sim_periods, tau, current_stock, current_prices).
+        fallback (callable): Policy used when a decision is infeasible.
+        store_path (str, optional): Memory-mapped TrajectoryStore to write row e of in place.
+        instrumentation (Instrumentation, optional): Collects stage times and a record per timeslot.
+
+    Returns:
+        dict: Decisions of the experiment (see TrajectoryStore.experiment), or None when
+            they were written to the store at store_path.
+    """
+    instrumentation = _disabled if instrumentation is None else instrumentation
+    if _problem_data is None:
+        with instrumentation.stage('load_data'):
+            _init_worker()
+    (
+        number_of_warehouses,
+        W,
+        cost_miss,
+        cost_tr,
+        warehouse_capacities,
+        transport_capacities,
+        initial_stock,
+        number_of_sim_periods,
+        sim_T,
+        demand_trajectory,
+    ) = _problem_data
+
+    if isinstance(seed, np.random.SeedSequence):
+        seed_global(seed)
+    else:
+        np.random.seed(seed)
+    if store_path is None:
+        store, row = TrajectoryStore(1, number_of_sim_periods, len(W)), 0
+    else:
+        store, row = _open_store(store_path), e
+    initial_stock = to_array(initial_stock, W)
+    Cs, Ct = to_array(warehouse_capacities, W), to_array(transport_capacities, W, 2)
+    # Decisions rejected by the course's check, with their step record, stock and demands
+    rejected = []
+
+    for tau in sim_T:
+        with instrumentation.step(e, tau) as record:
+            current_stock = initial_stock if tau == 1 else store.z[row, tau - 2]
+            current_demands = demand_trajectory[:, tau - 1]
+            current_prices = prices[:, tau - 1]
+
+            with instrumentation.stage('policy'):
+                decision = policy(number_of_sim_periods, tau, current_stock, current_prices)
+
+            with instrumentation.stage('check_feasibility'):
+                # The course's check decides whether the decision is accepted
+                successful = check_feasibility(
+                    *decision,
+                    current_stock,
+                    current_demands,
+                    warehouse_capacities,
+                    transport_capacities,
+                )
+            x, send, receive, z, m = decision
+            x, z, m = to_array(x, W), to_array(z, W), to_array(m, W)
+            send, receive = to_array(send, W, 2), to_array(receive, W, 2)
+
+            if not successful:
+                rejected.append((record, tau, x, send, receive, z, m, current_stock, current_demands))
+                print("DECISION DOES NOT MEET THE CONSTRAINTS FOR THIS TIMESLOT. THE DUMMY POLICY WILL BE USED INSTEAD")
+                print(e, number_of_sim_periods, tau, current_stock, current_demands, x, send, receive, z, m)
+                with instrumentation.stage('fallback'):
+                    x, send, receive, z, m = fallback(number_of_sim_periods, tau, current_stock, current_prices)
+                    x, z, m = to_array(x, W), to_array(z, W), to_array(m, W)
+                    send, receive = to_array(send, W, 2), to_array(receive, W, 2)
+
+            with instrumentation.stage('record'):
+                store.record_step(row, tau, x, send, receive, z, m, fallback=not successful)
+
+    if rejected:
+        # The array checks only name the violated constraints, once for all rejected decisions
+        records, taus, *arrays = zip(*rejected)
+        checks = constraint_checks(*(np.stack(a) for a in arrays), Cs, Ct)
+        for i, (record, tau) in enumerate(zip(records, taus)):
+            instrumentation.record_fallback({name: ok[i] for name, ok in checks.items()}, record)
+            print("Experiment", e, "timeslot", tau, "violated:", [name for name, ok in checks.items() if not ok[i]])
+
+    if store_path is not None:
+        store.flush()
+        return None
+    return store.experiment(0)
+
+
+def _run_experiment_task(args):
+    *args, instrument, drain_cache = args
+    instrumentation = Instrumentation() if instrument else None
+    result = run_experiment(*args, instrumentation=instrumentation)
+    # A worker's solution cache is sent back, like its instrumentation, to be merged by the caller
+    cache_state = args[3].drain() if drain_cache else None
+    return result, instrumentation, cache_state
+
+
+def evaluate_policy(policy=make_here_and_now_decision, fallback=make_dummy_decision, n_workers=None, base_seed=0,
+                    store_path=None, experiments=None, instrumentation=None, checkpoint_path=None,
+                    checkpoint_every=50, resume=True):
+    """
+    Evaluates a policy over all experiments, spread over a process pool.
+
+    The price experiments are drawn from the stream ('prices') of SeedTree(base_seed) and
+    experiment e is always run with its stream ('experiment', e), so the result does not
+    depend on the number of workers or on the order of completion. Policies compared with
+    the same base_seed see the same prices and streams (common random numbers).
+
+    Args:
+        policy (callable): Here-and-now policy to evaluate. For a CachedPolicy, the hits, misses and
+            new entries of the worker caches are merged into policy.cache, which is saved to its
+            path at the end of the run.
+        fallback (callable): Policy used when a decision is infeasible.
+        n_workers (int, optional): Number of worker processes. Defaults to the number of cores;
+            1 runs everything in the current process.
+        base_seed (int, sequence or np.random.SeedSequence): Root seed shared by all experiments
+            of this evaluation, see SeedTree.
+        store_path (str, optional): Directory of a memory-mapped TrajectoryStore. Workers then
+            write their decisions to disk in place instead of sending them back.
+        experiments (int, optional): Only run the first `experiments` experiments, e.g. for benchmarks.
+        instrumentation (Instrumentation, optional): Filled in place with stage times, per-timeslot
+            records of all experiments (also from worker processes) and, if enabled, a cProfile.
+        checkpoint_path (str, optional): Directory the completed experiments are checkpointed to.
+            Experiments already in it are restored instead of run again (see Checkpoint).
+        checkpoint_every (int): Number of completed experiments per checkpoint chunk.
+        resume (bool): Restore the experiments of an existing checkpoint. False starts over.
+
+    Returns:
+        tuple: (FINAL_POLICY_COST, policy_cost of shape (experiments, periods),
+                policy_cost_at_experiment of shape (experiments,),
+                TrajectoryStore holding the decisions of the run).
+            The costs are floats. The original Evaluation_Framework stored each timeslot's
+            cost in an integer array, which truncated it toward zero, so its
+            FINAL_POLICY_COST can differ by less than one per timeslot.
+    """
+    instrumentation = _disabled if instrumentation is None else instrumentation
+    with instrumentation.profiling():
+        with instrumentation.stage('load_data'):
+            _init_worker()
+            number_of_warehouses, W = _problem_data[0], _problem_data[1]
+            number_of_sim_periods = _problem_data[7]
+
+            # The course's generator draws from the global state, seeded from its own stream
+            seeds = SeedTree(base_seed)
+            seed_global(seeds.sequence('prices'))
+            number_of_experiments, Expers, Price_experiments = simulation_experiments_creation(
+                number_of_warehouses, W, number_of_sim_periods
+            )
+            if experiments is not None:
+                number_of_experiments = min(experiments, number_of_experiments)
+                Expers = list(Expers)[:number_of_experiments]
+
+        store = TrajectoryStore(number_of_experiments, number_of_sim_periods, len(W), path=store_path)
+        checkpoint = None
+        if checkpoint_path is not None:
+            with instrumentation.stage('checkpoint'):
+                metadata = {
+                    'policy': getattr(policy, '__qualname__', type(policy).__name__),
+                    'fallback': getattr(fallback, '__qualname__', type(fallback).__name__),
+                    # The root of the seed tree, also when base_seed is a SeedSequence or None
+                    'seed_entropy': seeds.entropy,
+                    'seed_spawn_key': list(seeds.root.spawn_key),
+                    'seeding': 'SeedTree',
+                    'periods': int(number_of_sim_periods),
+                    'warehouses': len(W),
+                    # Restored decisions are costed with these prices, so they must be the same
+                    'prices_sha256': hashlib.sha256(
+                        np.ascontiguousarray(Price_experiments, dtype=float).tobytes()).hexdigest(),
+                }
+                checkpoint = Checkpoint(checkpoint_path, metadata, every=checkpoint_every, resume=resume)
+                finished = checkpoint.restore(store)
+                Expers = [e for e in Expers if e not in finished]
+                instrumentation.count('restored_experiments', len(finished))
+        n_workers = os.cpu_count() if n_workers is None else n_workers
+        # In the current process the policy fills its own cache, worker caches are merged into it
+        drain_cache = isinstance(policy, CachedPolicy) and n_workers != 1
+        tasks = [(e, Price_experiments[e], seeds.sequence('experiment', e), policy, fallback, store_path,
+                  instrumentation.enabled, drain_cache)
+                 for e in Expers]
+
+        def collect(results):
+            for e, (result, worker_instrumentation, cache_state) in zip(Expers, results):
+                if result is not None:
+                    store.set_experiment(e, result)
+                if worker_instrumentation is not None:
+                    instrumentation.merge(worker_instrumentation)
+                if cache_state is not None:
+                    policy.merge(cache_state)
+                if checkpoint is not None:
+                    with instrumentation.stage('checkpoint'):
+                        checkpoint.add(store, e)
+
+        with instrumentation.stage('experiments'):
+            try:
+                if n_workers == 1:
+                    collect(map(_run_experiment_task, tasks))
+                else:
+                    with ProcessPoolExecutor(max_workers=n_workers, initializer=_init_worker) as pool:
+                        chunksize = max(1, len(tasks) // (4 * n_workers))
+                        collect(pool.map(_run_experiment_task, tasks, chunksize=chunksize))
+            finally:
+                # Also keeps what was completed when the run is interrupted
+                if checkpoint is not None:
+                    checkpoint.flush(store)
+                if isinstance(policy, CachedPolicy):
+                    policy.save()
+
+        # Cost the run chunk by chunk, so memory stays bounded for memory-mapped stores
+        with instrumentation.stage('costing'):
+            cost_miss = to_array(_problem_data[2], W)
+            cost_tr = to_array(_problem_data[3], W, 2)
+            prices = np.swapaxes(np.asarray(Price_experiments), 1, 2)
+            for chunk in store.chunks():
+                store.cost[chunk] = policy_cost_batch(prices[chunk], store.x[chunk], store.receive[chunk],
+                                                      store.m[chunk], cost_miss, cost_tr)
+            store.flush()
+
+    policy_cost = np.asarray(store.cost)
+    policy_cost_at_experiment = policy_cost.sum(axis=1)
+    FINAL_POLICY_COST = policy_cost_at_experiment.sum() / number_of_experiments
+
+    return FINAL_POLICY_COST, policy_cost, policy_cost_at_experiment, store
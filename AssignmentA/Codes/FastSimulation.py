@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+"""
+JIT-compiled scalar kernels of the wind and price processes and of the
+hydrogen storage transition, for loops that cannot be vectorised because each
+step depends on a sequential decision.
+
+The kernels are compiled with numba when it is installed and otherwise run as
+plain Python with identical results. They take no dict (not supported in
+nopython mode) but parameter tuples built by wind_parameters,
+price_parameters and storage_parameters, and no random generator: every step
+consumes a fixed number of pre-drawn variates (see draw_steps). The draws of a
+run come from its own numpy Generator, so results are reproducible and do
+not depend on numba or on the global np.random state.
+
+run_episodes loops over whole episodes in nopython mode; its policy must then
+itself be an @njit function (t, s_h, wind, price, demand) -> (x, p2h, h2p, g).
+HydrogenMDP.simulate_compiled runs the MDP's episodes through it.
+"""
+
+import numpy as np
+
+from data import get_fixed_data
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+    def njit(*args, **kwargs):
+        """Stand-in for numba.njit: returns the function unchanged."""
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+        return lambda function: function
+
+# Variates consumed per step: wind (normal noise, event, large or small, large size, small size)
+# followed by price (normal noise, resampling, resampled level)
+WIND_DRAWS = 5
+PRICE_DRAWS = 3
+STEP_DRAWS = WIND_DRAWS + PRICE_DRAWS
+
+
+def wind_parameters(data):
+    return (float(data['target_mean_wind']), float(data['wind_reversion_strength']),
+            float(data['extreme_event_prob_wind']))
+
+
+def price_parameters(data):
+    return (float(data['mean_price']), float(data['price_reversion_strength']),
+            float(data['wind_influence_on_price']), float(data['price_cap']), float(data['price_floor']))
+
+
+def storage_parameters(data):
+    return (float(data['conversion_p2h']), float(data['conversion_h2p']), float(data['hydrogen_capacity']),
+            float(data['electrolyzer_cost']))
+
+
+def draw_steps(rng, shape):
+    """
+    Variates for wind and price steps of the given shape.
+
+    Returns:
+        np.ndarray: Shape shape + (STEP_DRAWS,); standard normals in the noise columns,
+            uniforms on [0, 1) elsewhere.
+    """
+    draws = rng.random(tuple(shape) + (STEP_DRAWS,))
+    draws[..., 0] = rng.standard_normal(shape)
+    draws[..., WIND_DRAWS] = rng.standard_normal(shape)
+    return draws
+
+
+@njit(cache=True)
+def wind_step(current, previous, params, draws):
+    """wind_model with the variates draws[0:WIND_DRAWS]."""
+    target_mean, reversion_strength, extreme_event_prob = params
+    correlated_noise = draws[0] + 0.8 * (current - previous)
+    mean_reversion = reversion_strength * (target_mean - current)
+
+    extreme_event = 0.0
+    if draws[1] < extreme_event_prob:
+        if draws[2] < 0.5:
+            extreme_event = 10.0 + 5.0 * draws[3]
+        else:
+            extreme_event = 2.0 * draws[4]
+
+    return max(current + mean_reversion + correlated_noise + extreme_event, 0.0)
+
+
+@njit(cache=True)
+def price_step(current_price, previous_price, projected_wind, params, draws):
+    """price_model with the variates draws[WIND_DRAWS:STEP_DRAWS]."""
+    mean_price, reversion_strength, wind_influence, price_cap, price_floor = params
+    mean_reversion = reversion_strength * (mean_price - current_price)
+    wind_effect = wind_influence * projected_wind
+
+    next_price = (current_price + 0.6 * (current_price - previous_price) + mean_reversion + wind_effect
+                  + draws[WIND_DRAWS])
+    if next_price < 0 and draws[WIND_DRAWS + 1] > 0.2:
+        next_price = draws[WIND_DRAWS + 2] * mean_price * 0.3
+
+    return max(min(next_price, price_cap), price_floor)
+
+
+@njit(cache=True)
+def storage_step(s_h, p2h, h2p, params):
+    """Hydrogen level after converting p2h and h2p, within [0, capacity]."""
+    R_p2h, R_h2p, capacity, electrolyzer_cost = params
+    return min(max(s_h + R_p2h * p2h - h2p / R_h2p, 0.0), capacity)
+
+
+@njit(cache=True)
+def step_cost(price, g, x, params):
+    return price * g + params[3] * x
+
+
+@njit(cache=True)
+def simulate_paths(wind0, price0, wind_params, price_params, draws):
+    """
+    Wind and price paths as in Task1.2: the first two slots hold the initial values,
+    later slots follow wind_model and price_model (with the new wind as projection).
+
+    Args:
+        draws (np.ndarray): Shape (episodes, T, STEP_DRAWS), see draw_steps.
+
+    Returns:
+        tuple: (wind, price), arrays of shape (episodes, T).
+    """
+    episodes, T = draws.shape[0], draws.shape[1]
+    wind = np.empty((episodes, T))
+    price = np.empty((episodes, T))
+    for e in range(episodes):
+        for t in range(T):
+            if t < 2:
+                wind[e, t] = wind0
+                price[e, t] = price0
+            else:
+                wind[e, t] = wind_step(wind[e, t - 1], wind[e, t - 2], wind_params, draws[e, t])
+                price[e, t] = price_step(price[e, t - 1], price[e, t - 2], wind[e, t], price_params, draws[e, t])
+    return wind, price
+
+
+@njit
+def run_episodes(policy, wind, price, demand, storage_params):
+    """
+    Runs the policy through every episode, starting with empty storage.
+
+    Args:
+        policy (callable): (t, s_h, wind, price, demand) -> (x, p2h, h2p, g); an @njit
+            function when numba is available.
+        wind, price (np.ndarray): Paths of shape (episodes, T).
+        demand (np.ndarray): Demand of every slot, shape (T,).
+        storage_params (tuple): See storage_parameters.
+
+    Returns:
+        np.ndarray: Total cost of every episode.
+    """
+    episodes, T = wind.shape
+    costs = np.zeros(episodes)
+    for e in range(episodes):
+        s_h = 0.0
+        for t in range(T):
+            x, p2h, h2p, g = policy(t, s_h, wind[e, t], price[e, t], demand[t])
+            costs[e] += step_cost(price[e, t], g, x, storage_params)
+            s_h = storage_step(s_h, p2h, h2p, storage_params)
+    return costs
+
+
+@njit(cache=True)
+def dummy_policy(t, s_h, wind, price, demand):
+    """Never uses the electrolyzer."""
+    return 0.0, 0.0, 0.0, max(0.0, demand - wind)
+
+
+def simulate_experiment(policy=dummy_policy, E=10, data=None, rng=None):
+    """
+    Task1.2's simulate_experiment on the kernels.
+
+    Args:
+        policy (callable): See run_episodes.
+        E (int): Number of independent experiments (days).
+        data (dict, optional): Fixed data. Defaults to get_fixed_data().
+        rng (np.random.Generator or int, optional): Generator (or seed) of the experiments.
+
+    Returns:
+        np.ndarray: Total cost of every experiment.
+    """
+    data = get_fixed_data() if data is None else data
+    rng = np.random.default_rng(rng)
+    draws = draw_steps(rng, (E, data['num_timeslots']))
+    wind, price = simulate_paths(float(data['target_mean_wind']), float(data['mean_price']),
+                                 wind_parameters(data), price_parameters(data), draws)
+    demand = np.asarray(data['demand_schedule'], dtype=float)
+    return run_episodes(policy, wind, price, demand, storage_parameters(data))
+
+
+if __name__ == "__main__":
+    import time
+
+    from PriceProcess import price_model_batch
+    from WindProcess import wind_model_batch
+
+    print("numba available:", NUMBA_AVAILABLE)
+    data = get_fixed_data()
+    # Compile outside the timing
+    simulate_experiment(E=1, rng=0)
+    for E in (1000, 100_000 if NUMBA_AVAILABLE else 10_000):
+        start = time.perf_counter()
+        costs = simulate_experiment(E=E, rng=0)
+        print("%6d experiments: mean cost %.2f in %.3f s" % (E, costs.mean(), time.perf_counter() - start))
+
+    # Same distribution as the batch processes
+    rng = np.random.default_rng(1)
+    n = 200_000
+    wind, price = simulate_paths(4.5, 35.0, wind_parameters(data), price_parameters(data), draw_steps(rng, (n, 6)))
+    current_wind, last_wind = np.full(n, 4.5), np.full(n, 4.5)
+    current_price, last_price = np.full(n, 35.0), np.full(n, 35.0)
+    for _ in range(4):
+        current_wind, last_wind = wind_model_batch(current_wind, last_wind, data, rng), current_wind
+        current_price, last_price = price_model_batch(current_price, last_price, current_wind, data, rng), current_price
+    print("slot 5 wind mean %.3f / %.3f, price mean %.3f / %.3f (kernels / batch)"
+          % (wind[:, 5].mean(), current_wind.mean(), price[:, 5].mean(), current_price.mean()))
@@ -0,0 +1,249 @@
+# -*- coding: utf-8 -*-
+"""
+Value-function lookup tables for the hydrogen hub MDP.
+
+Backward induction over a discretised state: hydrogen level s_h, wind and
+price on uniform grids. Wind and price move with the wind_model/price_model
+dynamics (with the previous values taken equal to the current ones, since the
+MDP state does not keep them). Their transitions are estimated once, by
+sampling wind_model_batch/price_model_batch from every grid node and spreading
+the samples bilinearly over the grid. The expectation of the next value is
+then a matrix product.
+
+The action at each state is the next hydrogen level. Conversion follows from
+it, the electrolyzer is on when hydrogen is produced, and the grid covers the
+demand left after wind and conversion. The trained tables hold the optimal
+next level of every grid state. The online policy interpolates them, so a
+decision costs a few array lookups instead of a solver call.
+"""
+
+import time
+
+import numpy as np
+
+from data import get_fixed_data
+from PriceProcess import price_model_batch
+from WindProcess import wind_model_batch
+
+
+def _grid_position(grid, values):
+    """
+    Lower grid index and interpolation weight of the upper neighbour, for a uniform grid.
+    Values outside the grid are clamped to its ends.
+    """
+    step = grid[1] - grid[0]
+    position = np.clip((np.asarray(values, dtype=float) - grid[0]) / step, 0, len(grid) - 1)
+    lower = np.minimum(position.astype(int), len(grid) - 2)
+    return lower, position - lower
+
+
+def transition_matrix(wind_grid, price_grid, data, samples=500, rng=None):
+    """
+    Transition probabilities between the (wind, price) nodes of the grid.
+
+    Returns:
+        np.ndarray: P of shape (nodes, nodes), nodes ordered as (wind index, price index),
+            with P[i, j] the probability of moving from node i to node j.
+    """
+    rng = np.random.default_rng(rng)
+    n_wind, n_price = len(wind_grid), len(price_grid)
+    wind = np.repeat(np.repeat(wind_grid, n_price), samples)
+    price = np.repeat(np.tile(price_grid, n_wind), samples)
+
+    next_wind = wind_model_batch(wind, wind, data, rng)
+    next_price = price_model_batch(price, price, next_wind, data, rng)
+
+    i, a = _grid_position(wind_grid, next_wind)
+    j, b = _grid_position(price_grid, next_price)
+    source = np.repeat(np.arange(n_wind * n_price), samples)
+    P = np.zeros((n_wind * n_price, n_wind * n_price))
+    for di, wi in ((0, 1 - a), (1, a)):
+        for dj, wj in ((0, 1 - b), (1, b)):
+            np.add.at(P, (source, (i + di) * n_price + j + dj), wi * wj / samples)
+    return P
+
+
+def step_cost(data, t, s_h, next_s_h, wind, price):
+    """
+    Action and cost of moving from s_h to next_s_h at timeslot t, broadcast over all arguments.
+
+    Returns:
+        tuple: (x, p2h, h2p, g, cost, feasible), where feasible is False when the move
+            exceeds the conversion rates.
+    """
+    delta = next_s_h - s_h
+    p2h = np.maximum(delta, 0) / data['conversion_p2h']
+    h2p = np.maximum(-delta, 0) * data['conversion_h2p']
+    x = (p2h > 0).astype(float)
+    g = np.maximum(data['demand_schedule'][t] - wind - h2p + p2h, 0)
+    cost = price * g + data['electrolyzer_cost'] * x
+    feasible = (p2h <= data['p2h_rate'] + 1e-9) & (h2p <= data['h2p_rate'] + 1e-9)
+    return x, p2h, h2p, g, cost, feasible
+
+
+class ValueTables:
+    """
+    Value function and decisions of the hydrogen MDP on a grid.
+
+    Attributes:
+        storage_grid, wind_grid, price_grid (np.ndarray): Uniform grids of the state variables.
+        values (np.ndarray): Expected cost-to-go, shape (T + 1, storage, wind, price).
+        decisions (np.ndarray): Optimal next hydrogen level, shape (T, storage, wind, price).
+    """
+
+    def __init__(self, storage_grid, wind_grid, price_grid, values, decisions):
+        self.storage_grid = storage_grid
+        self.wind_grid = wind_grid
+        self.price_grid = price_grid
+        self.values = values
+        self.decisions = decisions
+
+    def save(self, path):
+        np.savez(path, storage_grid=self.storage_grid, wind_grid=self.wind_grid, price_grid=self.price_grid,
+                 values=self.values, decisions=self.decisions)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as tables:
+            return cls(tables['storage_grid'], tables['wind_grid'], tables['price_grid'],
+                       tables['values'], tables['decisions'])
+
+
+def train_value_tables(data=None, storage_levels=31, wind_grid=None, price_grid=None, samples=500, rng=None):
+    """
+    Computes the value tables by backward induction.
+
+    Args:
+        data (dict, optional): Fixed data. Defaults to get_fixed_data().
+        storage_levels (int): Number of hydrogen levels between 0 and the capacity.
+            These are also the candidate next levels of every decision.
+        wind_grid, price_grid (np.ndarray, optional): Uniform grids. Default to 0-15 in
+            steps of 0.5 for wind and the price floor to cap in steps of 2.5.
+        samples (int): Samples per grid node used to estimate the transitions.
+        rng (np.random.Generator or int, optional): Generator (or seed) for the samples.
+
+    Returns:
+        ValueTables
+    """
+    data = get_fixed_data() if data is None else data
+    T = data['num_timeslots']
+    storage_grid = np.linspace(0, data['hydrogen_capacity'], storage_levels)
+    wind_grid = np.arange(0, 15.01, 0.5) if wind_grid is None else np.asarray(wind_grid, dtype=float)
+    price_grid = (np.arange(data['price_floor'], data['price_cap'] + 0.01, 2.5) if price_grid is None
+                  else np.asarray(price_grid, dtype=float))
+    P = transition_matrix(wind_grid, price_grid, data, samples, rng)
+
+    # Exogenous nodes as one axis: (storage, next storage, node)
+    wind = np.repeat(wind_grid, len(price_grid))[None, None, :]
+    price = np.tile(price_grid, len(wind_grid))[None, None, :]
+    s_h, next_s_h = storage_grid[:, None, None], storage_grid[None, :, None]
+
+    values = np.zeros((T + 1, storage_levels, len(wind_grid) * len(price_grid)))
+    decisions = np.empty((T, storage_levels, len(wind_grid) * len(price_grid)))
+    for t in range(T - 1, -1, -1):
+        *_, cost, feasible = step_cost(data, t, s_h, next_s_h, wind, price)
+        # Expected next value of every (next storage, current node)
+        expected = values[t + 1] @ P.T
+        Q = np.where(feasible, cost + expected[None, :, :], np.inf)
+        best = Q.argmin(axis=1)
+        values[t] = np.take_along_axis(Q, best[:, None, :], axis=1)[:, 0, :]
+        decisions[t] = storage_grid[best]
+
+    shape = (storage_levels, len(wind_grid), len(price_grid))
+    return ValueTables(storage_grid, wind_grid, price_grid, values.reshape((T + 1,) + shape),
+                       decisions.reshape((T,) + shape))
+
+
+class ValueTablePolicy:
+    """
+    Policy (state, t) -> (x, p2h, h2p, g) of HydrogenMDP that looks up the next hydrogen
+    level in the value tables, with trilinear interpolation between grid states.
+    """
+
+    def __init__(self, tables, data=None):
+        self.tables = tables
+        self.data = get_fixed_data() if data is None else data
+        self.grids = [(float(grid[0]), float(grid[1] - grid[0]), len(grid) - 1)
+                      for grid in (tables.storage_grid, tables.wind_grid, tables.price_grid)]
+        self.demand = list(self.data['demand_schedule'])
+        self.max_charge = self.data['conversion_p2h'] * self.data['p2h_rate']
+        self.max_discharge = self.data['h2p_rate'] / self.data['conversion_h2p']
+
+    def __call__(self, state, t):
+        s_h = state[0]
+        # Lower corner and weights of the grid cell, computed on plain floats
+        corner, weight = [], []
+        for value, (start, step, last) in zip(state, self.grids):
+            position = min(max((value - start) / step, 0.0), last)
+            lower = min(int(position), last - 1)
+            corner.append(lower)
+            weight.append(position - lower)
+        i, j, k = corner
+        a, b, c = weight
+        cell = self.tables.decisions[t, i:i + 2, j:j + 2, k:k + 2]
+        cell = cell[0] * (1 - a) + cell[1] * a
+        cell = cell[0] * (1 - b) + cell[1] * b
+        next_s_h = cell[0] * (1 - c) + cell[1] * c
+
+        next_s_h = min(max(next_s_h, s_h - self.max_discharge, 0.0),
+                       s_h + self.max_charge, self.data['hydrogen_capacity'])
+        # Interpolation round-off below 1e-9 counts as keeping the level
+        if next_s_h > s_h + 1e-9:
+            x, p2h, h2p = 1, (next_s_h - s_h) / self.data['conversion_p2h'], 0.0
+        elif next_s_h < s_h - 1e-9:
+            x, p2h, h2p = 0, 0.0, (s_h - next_s_h) * self.data['conversion_h2p']
+        else:
+            x, p2h, h2p = 0, 0.0, 0.0
+        g = max(self.demand[t] - state[1] - h2p + p2h, 0.0)
+        return (x, p2h, h2p, g)
+
+    def batch(self, state, t):
+        """
+        Vectorized version for HydrogenMDP.simulate_batch: state is a tuple of arrays
+        (s_h, wind, price) and the action a tuple of arrays (x, p2h, h2p, g).
+        """
+        s_h, wind, price = (np.asarray(value, dtype=float) for value in state)
+        (i, a), (j, b), (k, c) = (_grid_position(grid, value) for grid, value in
+                                  zip((self.tables.storage_grid, self.tables.wind_grid, self.tables.price_grid),
+                                      (s_h, wind, price)))
+        decisions = self.tables.decisions[t]
+        next_s_h = 0.0
+        for di, wi in ((0, 1 - a), (1, a)):
+            for dj, wj in ((0, 1 - b), (1, b)):
+                for dk, wk in ((0, 1 - c), (1, c)):
+                    next_s_h = next_s_h + wi * wj * wk * decisions[i + di, j + dj, k + dk]
+
+        next_s_h = np.clip(next_s_h, np.maximum(s_h - self.max_discharge, 0),
+                           np.minimum(s_h + self.max_charge, self.data['hydrogen_capacity']))
+        delta = next_s_h - s_h
+        delta = np.where(np.abs(delta) > 1e-9, delta, 0)
+        x = (delta > 0).astype(float)
+        p2h = np.maximum(delta, 0) / self.data['conversion_p2h']
+        h2p = np.maximum(-delta, 0) * self.data['conversion_h2p']
+        g = np.maximum(self.demand[t] - wind - h2p + p2h, 0)
+        return (x, p2h, h2p, g)
+
+
+if __name__ == "__main__":
+    from HydrogenMDP import HydrogenMDP, dummy_policy
+
+    start = time.perf_counter()
+    tables = train_value_tables(rng=0)
+    print("Training: %.2f s, table size %.1f MB" % (time.perf_counter() - start,
+                                                    (tables.values.nbytes + tables.decisions.nbytes) / 1e6))
+    tables.save('hydrogen_value_tables.npz')
+    policy = ValueTablePolicy(ValueTables.load('hydrogen_value_tables.npz'))
+
+    state = (5.0, 4.2, 37.3)
+    start = time.perf_counter()
+    for _ in range(100_000):
+        policy(state, 12)
+    print("Policy step: %.2f us" % ((time.perf_counter() - start) / 100_000 * 1e6))
+
+    np.random.seed(0)
+    print("Dummy policy:       %.2f" % HydrogenMDP(dummy_policy, episodes=1000).simulate())
+    np.random.seed(0)
+    print("Value-table policy: %.2f" % HydrogenMDP(policy, episodes=1000).simulate())
+    start = time.perf_counter()
+    rewards = HydrogenMDP(policy).simulate_batch(policy.batch, episodes=100_000, rng=0)
+    print("Value-table policy, 100000 batched episodes: %.2f in %.2f s" % (rewards.mean(), time.perf_counter() - start))
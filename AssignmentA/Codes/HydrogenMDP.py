@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+"""
+Markov decision process of the hydrogen hub (Task 2).
+
+The state is (s_h, wind, price) and a policy maps (state, t) to an action
+(x, p2h, h2p, g): electrolyzer on/off, power converted to hydrogen, power
+converted back from hydrogen and power bought from the grid.
+
+simulate_batch advances many episodes in lockstep as arrays, for vectorized
+policies that map a batch of states (s_h, wind, price arrays) to a batch of actions.
+simulate_compiled runs the sequential episode loop in FastSimulation.run_episodes,
+for policies written as @njit kernels.
+"""
+
+import numpy as np
+from data import get_fixed_data
+from FastSimulation import run_episodes, storage_parameters
+
+
+class HydrogenMDP:
+    def __init__(self, policy, episodes=10, rng=None):
+        self.data = get_fixed_data()
+        self.T = self.data['num_timeslots']
+        self.episodes = episodes
+        self.policy = policy  # Policy function: (s, t) -> action
+        # Generator (or seed) of the episodes; None draws from the global np.random state
+        self.random = np.random if rng is None else np.random.default_rng(rng)
+
+    def simulate(self):
+        total_rewards = []
+        for _ in range(self.episodes):
+            total_reward = self.run_episode()
+            total_rewards.append(total_reward)
+        return np.mean(total_rewards)
+
+    def run_episode(self):
+        s_h = 0  # Initial hydrogen storage
+        total_reward = 0
+        wind_series = self.random.normal(self.data['target_mean_wind'], 1, self.T)
+        price_series = self.random.normal(self.data['mean_price'], 5, self.T)
+
+        for t in range(self.T):
+            state = (s_h, wind_series[t], price_series[t])
+            action = self.policy(state, t)
+
+            x_t, p2h_t, h2p_t, g_t = action
+
+            s_h = min(max(s_h + self.data['conversion_p2h'] * p2h_t - h2p_t / self.data['conversion_h2p'], 0), self.data['hydrogen_capacity'])
+            cost = price_series[t] * g_t + self.data['electrolyzer_cost'] * x_t
+            total_reward -= cost  # Negative cost as reward
+
+        return total_reward
+
+    def simulate_batch(self, policy, episodes=None, rng=None, chunk=100_000):
+        """
+        Runs the episodes as arrays, chunk episodes at a time.
+
+        Args:
+            policy (callable): Vectorized policy (state, t) -> action, where state is a tuple of
+                arrays (s_h, wind, price) and action a tuple (x, p2h, h2p, g) of arrays (or scalars)
+                of the same length, e.g. dummy_policy_batch.
+            episodes (int, optional): Number of episodes. Defaults to self.episodes.
+            rng (np.random.Generator or int, optional): Generator (or seed) for wind and price.
+            chunk (int): Maximum number of episodes simulated at once.
+
+        Returns:
+            np.ndarray: Total reward of every episode.
+        """
+        episodes = self.episodes if episodes is None else episodes
+        rng = np.random.default_rng(rng)
+        R_p2h, R_h2p = self.data['conversion_p2h'], self.data['conversion_h2p']
+        C, C_elzr = self.data['hydrogen_capacity'], self.data['electrolyzer_cost']
+
+        total_rewards = np.empty(episodes)
+        for start in range(0, episodes, chunk):
+            n = min(chunk, episodes - start)
+            wind_series = rng.normal(self.data['target_mean_wind'], 1, (n, self.T))
+            price_series = rng.normal(self.data['mean_price'], 5, (n, self.T))
+            s_h = np.zeros(n)
+            total_reward = np.zeros(n)
+
+            for t in range(self.T):
+                x_t, p2h_t, h2p_t, g_t = policy((s_h, wind_series[:, t], price_series[:, t]), t)
+                s_h = np.clip(s_h + R_p2h * p2h_t - h2p_t / R_h2p, 0, C)
+                total_reward -= price_series[:, t] * g_t + C_elzr * x_t
+
+            total_rewards[start:start + n] = total_reward
+        return total_rewards
+
+    def simulate_compiled(self, policy, episodes=None, rng=None):
+        """
+        Runs the episodes with the compiled loop of FastSimulation.run_episodes.
+
+        Args:
+            policy (callable): Kernel (t, s_h, wind, price, demand) -> (x, p2h, h2p, g), an @njit
+                function when numba is available, e.g. FastSimulation.dummy_policy.
+            episodes (int, optional): Number of episodes. Defaults to self.episodes.
+            rng (np.random.Generator or int, optional): Generator (or seed) for wind and price.
+
+        Returns:
+            np.ndarray: Total reward of every episode.
+        """
+        episodes = self.episodes if episodes is None else episodes
+        rng = np.random.default_rng(rng)
+        wind_series = rng.normal(self.data['target_mean_wind'], 1, (episodes, self.T))
+        price_series = rng.normal(self.data['mean_price'], 5, (episodes, self.T))
+        demand = np.asarray(self.data['demand_schedule'], dtype=float)
+        return -run_episodes(policy, wind_series, price_series, demand, storage_parameters(self.data))
+
+
+_demand_schedule = np.asarray(get_fixed_data()['demand_schedule'])
+
+
+# Dummy policy: Never use electrolyzer
+def dummy_policy(state, t):
+    s_h, p_wind, lambda_grid = state
+    return (0, 0, 0, max(0, _demand_schedule[t] - p_wind))
+
+
+def dummy_policy_batch(state, t):
+    s_h, p_wind, lambda_grid = state
+    return (0, 0, 0, np.maximum(0, _demand_schedule[t] - p_wind))
+
+
+if __name__ == "__main__":
+    import time
+
+    mdp = HydrogenMDP(dummy_policy, episodes=1000)
+    np.random.seed(0)
+    start = time.perf_counter()
+    print("Scalar, %d episodes: %.2f in %.2f s" % (mdp.episodes, mdp.simulate(), time.perf_counter() - start))
+    start = time.perf_counter()
+    rewards = mdp.simulate_batch(dummy_policy_batch, episodes=100_000, rng=0)
+    print("Batch, 100000 episodes: %.2f in %.2f s" % (rewards.mean(), time.perf_counter() - start))
+
+    from FastSimulation import dummy_policy as dummy_kernel
+    # Compile outside the timing
+    mdp.simulate_compiled(dummy_kernel, episodes=1, rng=0)
+    start = time.perf_counter()
+    rewards = mdp.simulate_compiled(dummy_kernel, episodes=100_000, rng=0)
+    print("Compiled, 100000 episodes: %.2f in %.2f s" % (rewards.mean(), time.perf_counter() - start))
@@ -0,0 +1,240 @@
+# -*- coding: utf-8 -*-
+"""
+Rolling-horizon (MPC) controller for the hydrogen hub.
+
+Instead of solving the whole day once with perfect foresight (Task0), the
+controller plans each slot over a receding window of `horizon` slots. The
+realised wind and price of the current slot are used together with the
+expected wind_model/price_model paths for the later slots. Only the first
+slot of the plan is applied.
+
+The window MILP is built once and kept loaded in HiGHS. Moving the window
+only changes the grid prices, the power-balance right-hand sides and the
+initial storage. Slots past the end of the day are switched off through
+their bounds, with their storage dynamics relaxed. When the realised wind and price stay within a tolerance band
+of the forecast the current plan was made with, the controller skips the
+re-solve and applies the next slot of that plan.
+"""
+
+import time
+
+import highspy
+import numpy as np
+
+from data import get_fixed_data
+from MatrixModels import MatrixModel
+from PriceProcess import price_model_batch
+from WindProcess import wind_model_batch
+
+
+def forecast(wind, previous_wind, price, previous_price, steps, data, rng, n_samples=200):
+    """
+    Expected wind and price of the current slot and the `steps - 1` following ones.
+
+    Returns:
+        tuple: (wind, price) arrays of shape (steps,), starting with the realised values.
+    """
+    winds, prices = [wind], [price]
+    current_wind, last_wind = np.full(n_samples, wind, dtype=float), np.full(n_samples, previous_wind, dtype=float)
+    current_price, last_price = np.full(n_samples, price, dtype=float), np.full(n_samples, previous_price, dtype=float)
+    for _ in range(steps - 1):
+        current_wind, last_wind = wind_model_batch(current_wind, last_wind, data, rng), current_wind
+        current_price, last_price = price_model_batch(current_price, last_price, current_wind, data, rng), current_price
+        winds.append(current_wind.mean())
+        prices.append(current_price.mean())
+    return np.array(winds), np.array(prices)
+
+
+class MPCResult:
+    """
+    Outcome of a day under MPC.
+
+    Attributes:
+        cost (float): Total cost, sum of price * g + electrolyzer cost * x.
+        actions (np.ndarray): (x, p2h, h2p, g) of every slot, shape (T, 4).
+        storage (np.ndarray): Hydrogen level after every slot, shape (T,).
+        solves (int): Number of window solves.
+        skips (int): Number of slots that followed the previous plan without re-solving.
+        step_times (np.ndarray): Wall-clock time of every controller step in seconds.
+    """
+
+    def __init__(self, cost, actions, storage, solves, skips, step_times):
+        self.cost = cost
+        self.actions = actions
+        self.storage = storage
+        self.solves = solves
+        self.skips = skips
+        self.step_times = step_times
+
+
+class HydrogenMPC:
+    """
+    Receding-window controller.
+
+    Args:
+        horizon (int): Number of slots in the planning window.
+        data (dict, optional): Fixed data. Defaults to get_fixed_data().
+        wind_tol, price_tol (float): Tolerance band around the forecast within which the
+            previous plan is kept. 0 re-solves at every slot.
+        n_samples (int): Sample paths averaged for each forecast.
+        rng (np.random.Generator or int, optional): Generator (or seed) for the forecasts.
+
+    The controller is also a HydrogenMDP policy: calling it with (state, t) uses the
+    previous call's wind and price as the previous values (and the current ones at t = 0).
+    """
+
+    def __init__(self, horizon=6, data=None, wind_tol=0.5, price_tol=2.0, n_samples=200, rng=None):
+        self.horizon = horizon
+        self.data = get_fixed_data() if data is None else data
+        self.wind_tol = wind_tol
+        self.price_tol = price_tol
+        self.n_samples = n_samples
+        self.rng = np.random.default_rng(rng)
+        self.T = self.data['num_timeslots']
+        self.demand = np.asarray(self.data['demand_schedule'], dtype=float)
+        self._build()
+        self.reset()
+
+    def _build(self):
+        data, H = self.data, self.horizon
+        R_p2h, R_h2p = data['conversion_p2h'], data['conversion_h2p']
+
+        mm = MatrixModel()
+        x = mm.add_variables('x', (H,), cost=data['electrolyzer_cost'], ub=1, integer=True)
+        p2h = mm.add_variables('p2h', (H,))
+        h2p = mm.add_variables('h2p', (H,), ub=data['h2p_rate'])
+        g = mm.add_variables('g', (H,))
+        s = mm.add_variables('s', (H,), ub=data['hydrogen_capacity'])
+        c = mm.add_variables('c', (H,))
+
+        # power_balance with curtailment: D - wind == g + h2p - p2h - c
+        self.balance_rows = mm.add_rows([(1.0, g), (1.0, h2p), (-1.0, p2h), (-1.0, c)], 0, 0)
+        # storage_dynamics, starting from the current level s_init in the first slot
+        self.initial_row = mm.add_rows([(1.0, s[:1]), (-R_p2h, p2h[:1]), (1 / R_h2p, h2p[:1])], 0, 0)
+        self.dynamics_rows = mm.add_rows([(1.0, s[1:]), (-1.0, s[:-1]), (-R_p2h, p2h[1:]), (1 / R_h2p, h2p[1:])], 0, 0)
+        # electrolyzer_operation: p2h <= P2H * x
+        mm.add_rows([(1.0, p2h), (-data['p2h_rate'], x)], -np.inf, 0)
+
+        self.mm = mm
+        self.highs = mm.to_highs()
+        self.lower = np.concatenate(mm._lb)
+        self.upper = np.concatenate(mm._ub)
+
+    def reset(self):
+        """Forgets the current plan and the previous observation, e.g. at the start of a day."""
+        self.plan = None
+        self.plan_start = None
+        self.plan_forecast = None
+        self.previous = None
+        self.solves = 0
+        self.skips = 0
+
+    def _solve(self, t, s_h, wind_forecast, price_forecast):
+        H, blocks = self.horizon, self.mm.blocks
+        slots = np.arange(t, t + H)
+        active = slots < self.T
+        demand = np.where(active, self.demand[np.minimum(slots, self.T - 1)], 0.0)
+        net = np.where(active, demand - wind_forecast, 0.0)
+
+        self.highs.changeColsCost(H, blocks['g'].astype(np.int32), np.where(active, price_forecast, 0.0))
+        self.highs.changeRowsBounds(H, self.balance_rows.astype(np.int32), net, net)
+        self.highs.changeRowsBounds(1, self.initial_row.astype(np.int32), np.array([s_h]), np.array([s_h]))
+        # Slots past the end of the day have their actions fixed to zero and no storage dynamics;
+        # their storage level stays free within the capacity, so it does not constrain the day
+        actions = [name for name in blocks if name != 's']
+        columns = np.concatenate([blocks[name] for name in actions]).astype(np.int32)
+        upper = np.where(np.tile(active, len(actions)), self.upper[columns], 0.0)
+        self.highs.changeColsBounds(len(columns), columns, self.lower[columns], upper)
+        bound = np.where(active[1:], 0.0, np.inf)
+        self.highs.changeRowsBounds(H - 1, self.dynamics_rows.astype(np.int32), -bound, bound)
+
+        self.highs.run()
+        if self.highs.getModelStatus() != highspy.HighsModelStatus.kOptimal:
+            raise RuntimeError("HiGHS did not solve the MPC window at t=%d: %s"
+                               % (t, self.highs.modelStatusToString(self.highs.getModelStatus())))
+        values = np.asarray(self.highs.getSolution().col_value)
+        self.plan = np.column_stack([np.round(values[blocks['x']]), values[blocks['p2h']], values[blocks['h2p']]])
+        self.plan_start = t
+        self.plan_forecast = (wind_forecast, price_forecast)
+        self.solves += 1
+
+    def step(self, t, s_h, wind, price, previous_wind=None, previous_price=None):
+        """
+        Decision of slot t for hydrogen level s_h and the realised wind and price.
+
+        Returns:
+            tuple: (x, p2h, h2p, g)
+        """
+        previous_wind = wind if previous_wind is None else previous_wind
+        previous_price = price if previous_price is None else previous_price
+
+        k = None if self.plan is None else t - self.plan_start
+        keep = (
+            k is not None and 0 < k < self.horizon
+            and abs(wind - self.plan_forecast[0][k]) <= self.wind_tol
+            and abs(price - self.plan_forecast[1][k]) <= self.price_tol
+        )
+        if keep:
+            self.skips += 1
+        else:
+            wind_forecast, price_forecast = forecast(wind, previous_wind, price, previous_price, self.horizon,
+                                                     self.data, self.rng, self.n_samples)
+            self._solve(t, s_h, wind_forecast, price_forecast)
+            k = 0
+
+        x, p2h, h2p = self.plan[k]
+        # The planned conversion fits the storage, as storage only moves with the plan;
+        # the grid covers what realised wind leaves, and any excess is curtailed
+        p2h = min(p2h, (self.data['hydrogen_capacity'] - s_h) / self.data['conversion_p2h'])
+        h2p = min(h2p, s_h * self.data['conversion_h2p'])
+        g = max(self.demand[t] - wind - h2p + p2h, 0.0)
+        return (x, p2h, h2p, g)
+
+    def __call__(self, state, t):
+        s_h, wind, price = state
+        if t == 0:
+            self.reset()
+        previous_wind, previous_price = (wind, price) if self.previous is None else self.previous
+        self.previous = (wind, price)
+        return self.step(t, s_h, wind, price, previous_wind, previous_price)
+
+    def run(self, wind, price, initial_storage=0.0):
+        """
+        Controls one day with realised wind and price series of length T.
+
+        Returns:
+            MPCResult
+        """
+        self.reset()
+        R_p2h, R_h2p = self.data['conversion_p2h'], self.data['conversion_h2p']
+        actions = np.zeros((self.T, 4))
+        storage = np.zeros(self.T)
+        step_times = np.zeros(self.T)
+        s_h = initial_storage
+        for t in range(self.T):
+            start = time.perf_counter()
+            actions[t] = self.step(t, s_h, wind[t], price[t], wind[max(t - 1, 0)], price[max(t - 1, 0)])
+            step_times[t] = time.perf_counter() - start
+            x, p2h, h2p, g = actions[t]
+            s_h = min(max(s_h + R_p2h * p2h - h2p / R_h2p, 0), self.data['hydrogen_capacity'])
+            storage[t] = s_h
+        cost = float(price @ actions[:, 3] + self.data['electrolyzer_cost'] * actions[:, 0].sum())
+        return MPCResult(cost, actions, storage, self.solves, self.skips, step_times)
+
+
+if __name__ == "__main__":
+    from MatrixModels import build_hydrogen_matrix
+    from ScenarioGenerator import generate_scenarios
+
+    data = get_fixed_data()
+    wind, price = generate_scenarios(20, data, rng=0)
+
+    # Perfect foresight over the whole day, as in Task0 (with curtailment)
+    foresight = np.mean([build_hydrogen_matrix(data, w, p, curtailment=True).solve()[0] for w, p in zip(wind, price)])
+    print("Perfect foresight: %.2f" % foresight)
+    for wind_tol, price_tol in ((0, 0), (0.5, 2.0), (1.0, 5.0)):
+        controller = HydrogenMPC(horizon=6, wind_tol=wind_tol, price_tol=price_tol, rng=1)
+        runs = [controller.run(w, p) for w, p in zip(wind, price)]
+        print("MPC, band (%.1f, %.1f): %.2f, %.1f solves per day, %.2f ms per step"
+              % (wind_tol, price_tol, np.mean([r.cost for r in runs]), np.mean([r.solves for r in runs]),
+                 1e3 * np.mean([r.step_times.mean() for r in runs])))
@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+"""
+Lightweight instrumentation of the policy-evaluation pipeline.
+
+An Instrumentation collects
+    - wall-clock time and call counts per stage (data loading, policy, feasibility
+      check, fallback, costing, ...),
+    - free-form counters,
+    - one record per (experiment, tau) with the stage times of the step, the
+      SolveResults of every solve made by the policy, whether the fallback was
+      used and which constraints the policy's decision violated,
+and an optional cProfile of the run. A disabled instance costs one attribute
+check per stage, so the evaluation engine always runs with one.
+"""
+
+import contextlib
+import cProfile
+import io
+import json
+import pstats
+import time
+from collections import Counter
+
+_no_stage = contextlib.nullcontext()
+
+
+def _solve_listeners():
+    """
+    SolverBackends.solve_listeners, imported on first use so that runs without
+    solver-based policies do not need pyomo. None when it cannot be imported.
+    """
+    try:
+        import SolverBackends
+    except ImportError:
+        return None
+    return SolverBackends.solve_listeners
+
+
+class Instrumentation:
+    """
+    Args:
+        enabled (bool): Collect timings and records. A disabled instance does nothing.
+        profile (bool or str): Run the evaluation under cProfile; a string is a path
+            the stats are dumped to (readable by pstats, snakeviz, ...). Only the
+            calling process is profiled, so use n_workers=1 to profile the policy.
+            For a sampling profiler such as py-spy, also run with n_workers=1 and
+            leave profile off.
+    """
+
+    def __init__(self, enabled=True, profile=False):
+        self.enabled = enabled
+        self.profile = profile
+        self.stages = {}
+        self.counters = Counter()
+        self.records = []
+        self.profile_stats = None
+        self._step = None
+
+    @contextlib.contextmanager
+    def _timed_stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            total, count = self.stages.get(name, (0.0, 0))
+            self.stages[name] = (total + elapsed, count + 1)
+            if self._step is not None:
+                self._step['times'][name] = self._step['times'].get(name, 0.0) + elapsed
+
+    def stage(self, name):
+        """Context manager timing one pass through the stage `name`."""
+        if not self.enabled:
+            return _no_stage
+        return self._timed_stage(name)
+
+    def count(self, name, n=1):
+        if self.enabled:
+            self.counters[name] += n
+
+    @contextlib.contextmanager
+    def step(self, e, tau):
+        """
+        Context manager around one timeslot of an experiment. Stage times and
+        solves inside it are attributed to the record of (e, tau).
+        """
+        if not self.enabled:
+            yield None
+            return
+        self._step = {'experiment': int(e), 'tau': int(tau), 'times': {}, 'solves': [],
+                      'fallback': False, 'violated': []}
+        listeners = _solve_listeners()
+        if listeners is not None:
+            listeners.append(self._on_solve)
+        try:
+            yield self._step
+        finally:
+            if listeners is not None:
+                listeners.remove(self._on_solve)
+            self.records.append(self._step)
+            self._step = None
+
+    def _on_solve(self, result):
+        self._step['solves'].append({
+            'backend': result.backend,
+            'termination_condition': result.termination_condition,
+            'solve_time': result.solve_time,
+        })
+
+    def record_fallback(self, checks, record=None):
+        """
+        Marks a step as a fallback, with the constraint checks of the rejected decision.
+        record is the step record (as yielded by step()); defaults to the current step.
+        """
+        if not self.enabled:
+            return
+        record = self._step if record is None else record
+        violated = [name for name, ok in checks.items() if not ok]
+        self.counters['fallbacks'] += 1
+        for name in violated:
+            self.counters['violated_' + name] += 1
+        if record is not None:
+            record['fallback'] = True
+            record['violated'] = violated
+
+    @contextlib.contextmanager
+    def profiling(self):
+        """Runs the enclosed block under cProfile when profile is set."""
+        if not (self.enabled and self.profile):
+            yield
+            return
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            self.profile_stats = pstats.Stats(profiler)
+            if isinstance(self.profile, str):
+                self.profile_stats.dump_stats(self.profile)
+
+    def merge(self, other):
+        """Adds the stages, counters and records of another instance (e.g. from a worker)."""
+        for name, (total, count) in other.stages.items():
+            own_total, own_count = self.stages.get(name, (0.0, 0))
+            self.stages[name] = (own_total + total, own_count + count)
+        self.counters.update(other.counters)
+        self.records.extend(other.records)
+
+    def summary(self, top=10):
+        """
+        Structured summary of the run.
+
+        Returns:
+            dict: 'stages' (total, count and mean seconds per stage), 'counters',
+                'solves' (count, total time and termination conditions),
+                'slowest_steps' (the `top` steps with the largest total time) and,
+                when profiled, 'profile' (the `top` functions by cumulative time).
+        """
+        solves = [solve for record in self.records for solve in record['solves']]
+        summary = {
+            'stages': {
+                name: {'total': total, 'count': count, 'mean': total / count if count else 0.0}
+                for name, (total, count) in sorted(self.stages.items(), key=lambda item: -item[1][0])
+            },
+            'counters': dict(self.counters),
+            'steps': len(self.records),
+            'solves': {
+                'count': len(solves),
+                'total_time': sum(solve['solve_time'] for solve in solves),
+                'termination_conditions': dict(Counter(solve['termination_condition'] for solve in solves)),
+            },
+            'slowest_steps': [
+                {'experiment': record['experiment'], 'tau': record['tau'],
+                 'time': sum(record['times'].values()), 'fallback': record['fallback']}
+                for record in sorted(self.records, key=lambda record: -sum(record['times'].values()))[:top]
+            ],
+        }
+        if self.profile_stats is not None:
+            stream = io.StringIO()
+            self.profile_stats.stream = stream
+            self.profile_stats.sort_stats('cumulative').print_stats(top)
+            summary['profile'] = stream.getvalue()
+        return summary
+
+    def save(self, path, top=10):
+        """Writes the summary and all step records as JSON."""
+        with open(path, 'w') as file:
+            json.dump({'summary': self.summary(top), 'records': self.records}, file, indent=2)
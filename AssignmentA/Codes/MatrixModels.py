@@ -0,0 +1,348 @@
+# -*- coding: utf-8 -*-
+"""
+Matrix-form builders for the project's LPs/MILPs.
+
+Each builder assembles the same model as its Pyomo counterpart directly as
+sparse coefficient matrices and solves it with HiGHS through scipy.optimize.milp,
+avoiding Pyomo expression generation:
+    - build_oih_matrix:       OiH.OiHModel
+    - build_sp_matrix:        SP_2stage.StochasticHereAndNowModel
+    - build_hydrogen_matrix:  Task0.create_model
+Capacity constraints (TrCap, StCap, hydrogen_to_power) become variable bounds.
+"""
+
+import time
+
+import numpy as np
+from scipy.optimize import Bounds, LinearConstraint, milp
+from scipy.sparse import coo_matrix
+import highspy
+
+
+class MatrixModel:
+    """
+    Sparse LP/MILP in the form
+        min c x  s.t.  lhs <= A x <= rhs,  lb <= x <= ub,  x_i integer where integrality_i = 1.
+
+    Variables are added in named blocks; `blocks` maps a name to the block's
+    index array so that solutions can be read back in the model's shape.
+    """
+
+    def __init__(self):
+        self.n_vars = 0
+        self.n_rows = 0
+        self.blocks = {}
+        self._c, self._lb, self._ub, self._integrality = [], [], [], []
+        self._rows, self._cols, self._vals = [], [], []
+        self._lhs, self._rhs = [], []
+
+    def add_variables(self, name, shape, cost=0.0, lb=0.0, ub=np.inf, integer=False):
+        size = int(np.prod(shape))
+        index = np.arange(self.n_vars, self.n_vars + size).reshape(shape)
+        self.n_vars += size
+        self.blocks[name] = index
+        self._c.append(np.broadcast_to(cost, shape).ravel())
+        self._lb.append(np.broadcast_to(lb, shape).ravel())
+        self._ub.append(np.broadcast_to(ub, shape).ravel())
+        self._integrality.append(np.full(size, int(integer)))
+        return index
+
+    def add_rows(self, terms, lhs, rhs):
+        """
+        Adds a block of rows lhs <= sum(coef * x[index]) <= rhs.
+
+        Args:
+            terms (list): (coef, index) pairs. index has shape (n_rows,) or (n_rows, k)
+                for a sum of k variables per row; negative entries are skipped.
+                coef is a scalar or has the same shape as index.
+            lhs, rhs: Lower and upper bounds of the rows, broadcast to (n_rows,).
+
+        Returns:
+            np.ndarray: Indices of the added rows.
+        """
+        n = np.shape(terms[0][1])[0]
+        rows = np.arange(self.n_rows, self.n_rows + n)
+        if n == 0:
+            return rows
+        for coef, index in terms:
+            index = np.asarray(index).reshape(n, -1)
+            coef = np.broadcast_to(np.asarray(coef, dtype=float).reshape(n, -1) if np.ndim(coef) else coef, index.shape)
+            keep = index >= 0
+            self._rows.append(np.broadcast_to(rows[:, None], index.shape)[keep])
+            self._cols.append(index[keep])
+            self._vals.append(coef[keep])
+        self._lhs.append(np.broadcast_to(lhs, (n,)))
+        self._rhs.append(np.broadcast_to(rhs, (n,)))
+        self.n_rows += n
+        return rows
+
+    def matrix(self):
+        return coo_matrix(
+            (np.concatenate(self._vals), (np.concatenate(self._rows), np.concatenate(self._cols))),
+            shape=(self.n_rows, self.n_vars),
+        ).tocsr()
+
+    def solve(self, **options):
+        """
+        Solves the model with HiGHS.
+
+        Returns:
+            tuple: (objective value, dict of solution arrays shaped like each variable block).
+        """
+        result = milp(
+            c=np.concatenate(self._c),
+            constraints=LinearConstraint(self.matrix(), np.concatenate(self._lhs), np.concatenate(self._rhs)),
+            bounds=Bounds(np.concatenate(self._lb), np.concatenate(self._ub)),
+            integrality=np.concatenate(self._integrality),
+            options=options,
+        )
+        if result.x is None:
+            raise RuntimeError("HiGHS did not return a solution: %s" % result.message)
+        return result.fun, {name: result.x[index] for name, index in self.blocks.items()}
+
+    def to_highs(self):
+        """
+        Loads the model into a new HiGHS instance, for repeated solves that change
+        costs, bounds or rows in place and warm-start from the previous basis.
+        """
+        A = self.matrix().tocsc()
+        lp = highspy.HighsLp()
+        lp.num_col_ = self.n_vars
+        lp.num_row_ = self.n_rows
+        lp.col_cost_ = np.concatenate(self._c)
+        lp.col_lower_ = np.concatenate(self._lb)
+        lp.col_upper_ = np.concatenate(self._ub)
+        lp.row_lower_ = np.concatenate(self._lhs)
+        lp.row_upper_ = np.concatenate(self._rhs)
+        lp.a_matrix_.format_ = highspy.MatrixFormat.kColwise
+        lp.a_matrix_.start_ = A.indptr
+        lp.a_matrix_.index_ = A.indices
+        lp.a_matrix_.value_ = A.data
+        integrality = np.concatenate(self._integrality)
+        if integrality.any():
+            lp.integrality_ = [highspy.HighsVarType(int(i)) for i in integrality]
+
+        highs = highspy.Highs()
+        highs.setOptionValue('output_flag', False)
+        highs.passModel(lp)
+        return highs
+
+
+def _shifted(index, fill=-1):
+    """Index of the previous period along the last axis, `fill` at the first period."""
+    previous = np.full_like(index, fill)
+    previous[..., 1:] = index[..., :-1]
+    return previous
+
+
+def problem_arrays(problem_data):
+    """Problem data of load_the_data() as arrays indexed by warehouse position."""
+    (number_of_warehouses, W, cost_miss, cost_tr, warehouse_capacities, transport_capacities,
+     initial_stock, number_of_simulation_periods, sim_T, demand_trajectory) = problem_data
+    b = np.array([cost_miss[w] for w in W], dtype=float)
+    e = np.array([[cost_tr[w, q] for q in W] for w in W], dtype=float)
+    Cs = np.array([warehouse_capacities[w] for w in W], dtype=float)
+    Ct = np.array([[transport_capacities[w, q] for q in W] for w in W], dtype=float)
+    z0 = np.array([initial_stock[w] for w in W], dtype=float)
+    return W, b, e, Cs, Ct, z0, list(sim_T), np.asarray(demand_trajectory, dtype=float)
+
+
+def build_oih_matrix(problem_data, p1, p2):
+    """
+    Builds the perfect-information model of OiH.OiHModel.
+
+    Args:
+        problem_data (tuple): Output of load_the_data().
+        p1, p2: Prices of the first two periods for each warehouse.
+
+    Returns:
+        MatrixModel: Model with blocks 'x', 'z', 'm' of shape (W, T) and 'ys', 'yr' of shape (W, W, T).
+    """
+    W, b, e, Cs, Ct, z0, sim_T, D = problem_arrays(problem_data)
+    n, T = len(W), len(sim_T)
+
+    price = np.zeros((n, T))
+    price[:, 0] = [p1[w] for w in W]
+    price[:, 1] = [p2[w] for w in W]
+
+    mm = MatrixModel()
+    x = mm.add_variables('x', (n, T), cost=price)
+    z = mm.add_variables('z', (n, T), ub=Cs[:, None])
+    m = mm.add_variables('m', (n, T), cost=b[:, None])
+    ys = mm.add_variables('ys', (n, n, T), cost=e[:, :, None], ub=Ct[:, :, None])
+    yr = mm.add_variables('yr', (n, n, T))
+
+    # Stored quantity at the start of each period; z0 moves to the right-hand side at t = 1
+    z_prev = _shifted(z)
+    stock0 = np.zeros((n, T))
+    stock0[:, 0] = z0
+    sent = ys.transpose(0, 2, 1).reshape(n * T, n)
+    received = yr.transpose(0, 2, 1).reshape(n * T, n)
+
+    # QTrans: ys[w,q,t] == yr[q,w,t]
+    mm.add_rows([(1.0, ys.ravel()), (-1.0, yr.transpose(1, 0, 2).ravel())], 0, 0)
+
+    # Demand: x + m + z[t-1] + sum_q yr[w,q,t] == D[w,t] + z[t] + sum_q ys[w,q,t]
+    rhs = (D[:, [t - 1 for t in sim_T]] - stock0).ravel()
+    mm.add_rows([(1.0, x.ravel()), (1.0, m.ravel()), (1.0, z_prev.ravel()), (-1.0, z.ravel()),
+                 (1.0, received), (-1.0, sent)], rhs, rhs)
+
+    # YsCons: sum_q ys[w,q,t] <= z[t-1]
+    mm.add_rows([(1.0, sent), (-1.0, z_prev.ravel())], -np.inf, stock0.ravel())
+
+    return mm
+
+
+def build_sp_matrix(problem_data, p1, p_scen, prob, current_stock=None, tau=1):
+    """
+    Builds the extensive form of SP_2stage.StochasticHereAndNowModel.
+
+    Args:
+        problem_data (tuple): Output of load_the_data().
+        p1: First-stage price of each warehouse.
+        p_scen (np.ndarray): Second-stage scenario prices, shape (warehouses, N).
+        prob (np.ndarray): Scenario probabilities, shape (N,).
+        current_stock: Current stock of each warehouse. Defaults to the initial stock.
+        tau (int): Current timeslot (1-based), selects the demands of both stages.
+
+    Returns:
+        MatrixModel: Model with first-stage blocks 'x1', 'z1', 'm1', 'ys1', 'yr1'
+            and second-stage blocks 'x2', 'z2', 'm2' (W, N), 'ys2', 'yr2' (W, W, N).
+    """
+    W, b, e, Cs, Ct, z0, sim_T, D = problem_arrays(problem_data)
+    if current_stock is not None:
+        z0 = np.array([current_stock[w] for w in W], dtype=float)
+    n, N = len(W), p_scen.shape[1]
+    last = D.shape[1] - 1
+    D1, D2 = D[:, min(tau - 1, last)], D[:, min(tau, last)]
+    p1 = np.array([p1[w] for w in W], dtype=float)
+    prob = np.asarray(prob, dtype=float)
+
+    mm = MatrixModel()
+    x1 = mm.add_variables('x1', (n,), cost=p1)
+    z1 = mm.add_variables('z1', (n,), ub=Cs)
+    m1 = mm.add_variables('m1', (n,), cost=b)
+    ys1 = mm.add_variables('ys1', (n, n), cost=e, ub=Ct)
+    yr1 = mm.add_variables('yr1', (n, n))
+    x2 = mm.add_variables('x2', (n, N), cost=p_scen * prob)
+    z2 = mm.add_variables('z2', (n, N), ub=Cs[:, None])
+    m2 = mm.add_variables('m2', (n, N), cost=b[:, None] * prob)
+    ys2 = mm.add_variables('ys2', (n, n, N), cost=e[:, :, None] * prob, ub=Ct[:, :, None])
+    yr2 = mm.add_variables('yr2', (n, n, N))
+
+    # STAGE 1
+    mm.add_rows([(1.0, ys1.ravel()), (-1.0, yr1.T.ravel())], 0, 0)
+    mm.add_rows([(1.0, x1), (1.0, m1), (-1.0, z1), (1.0, yr1), (-1.0, ys1)], D1 - z0, D1 - z0)
+    mm.add_rows([(1.0, ys1)], -np.inf, z0)
+
+    # STAGE 2
+    z1_s = np.broadcast_to(z1[:, None], (n, N)).ravel()
+    sent = ys2.transpose(0, 2, 1).reshape(n * N, n)
+    received = yr2.transpose(0, 2, 1).reshape(n * N, n)
+    rhs = np.repeat(D2, N)
+    mm.add_rows([(1.0, ys2.ravel()), (-1.0, yr2.transpose(1, 0, 2).ravel())], 0, 0)
+    mm.add_rows([(1.0, x2.ravel()), (1.0, m2.ravel()), (1.0, z1_s), (-1.0, z2.ravel()),
+                 (1.0, received), (-1.0, sent)], rhs, rhs)
+    mm.add_rows([(1.0, sent), (-1.0, z1_s)], -np.inf, 0)
+
+    return mm
+
+
+def build_hydrogen_matrix(data, p_wind, lambda_grid, curtailment=False):
+    """
+    Builds the hydrogen hub MILP of Task0.create_model for given wind and price series.
+
+    Args:
+        data (dict): Fixed data from get_fixed_data().
+        p_wind (np.ndarray): Wind generation per timeslot.
+        lambda_grid (np.ndarray): Grid price per timeslot.
+        curtailment (bool): Adds a free curtailment variable 'c' to the power balance, so that
+            wind peaks above demand plus electrolyzer capacity do not make the model infeasible.
+
+    Returns:
+        MatrixModel: Model with blocks 'x', 'p2h', 'h2p', 'g', 's' (and 'c') of shape (T,).
+    """
+    T = data['num_timeslots']
+    D = np.asarray(data['demand_schedule'], dtype=float)
+    R_p2h = data['conversion_p2h']
+    R_h2p = data['conversion_h2p']
+
+    mm = MatrixModel()
+    x = mm.add_variables('x', (T,), cost=data['electrolyzer_cost'], ub=1, integer=True)
+    p2h = mm.add_variables('p2h', (T,))
+    h2p = mm.add_variables('h2p', (T,), ub=data['h2p_rate'])
+    g = mm.add_variables('g', (T,), cost=lambda_grid)
+    s = mm.add_variables('s', (T,), ub=data['hydrogen_capacity'])
+
+    # power_balance: D == g + p_wind + h2p - p2h (- c)
+    balance = [(1.0, g), (1.0, h2p), (-1.0, p2h)]
+    if curtailment:
+        balance.append((-1.0, mm.add_variables('c', (T,))))
+    mm.add_rows(balance, D - p_wind, D - p_wind)
+    # storage_dynamics (t > 0): s[t] == s[t-1] + R_p2h * p2h[t] - h2p[t] / R_h2p
+    mm.add_rows([(1.0, s[1:]), (-1.0, s[:-1]), (-R_p2h, p2h[1:]), (1 / R_h2p, h2p[1:])], 0, 0)
+    # electrolyzer_operation: p2h <= P2H * x
+    mm.add_rows([(1.0, p2h), (-data['p2h_rate'], x)], -np.inf, 0)
+    # electrolyzer_switching (t > 0): -1 <= x[t] - x[t-1] <= 1
+    mm.add_rows([(1.0, x[1:]), (-1.0, x[:-1])], -1, 1)
+
+    return mm
+
+
+def synthetic_problem_data(number_of_warehouses, number_of_periods=2, seed=0):
+    """
+    Random instance in the format of load_the_data(), for benchmarks at arbitrary sizes.
+    """
+    rng = np.random.default_rng(seed)
+    n = number_of_warehouses
+    W = list(range(n))
+    cost_miss = rng.uniform(20, 40, n)
+    cost_tr = rng.uniform(1, 5, (n, n))
+    np.fill_diagonal(cost_tr, 0)
+    warehouse_capacities = rng.uniform(5, 15, n)
+    transport_capacities = rng.uniform(0, 5, (n, n)) * (rng.random((n, n)) < 0.3)
+    np.fill_diagonal(transport_capacities, 0)
+    initial_stock = rng.uniform(0, 1, n) * warehouse_capacities
+    sim_T = list(range(1, number_of_periods + 1))
+    demand_trajectory = rng.uniform(2, 8, (n, number_of_periods))
+    return (n, W, cost_miss, cost_tr, warehouse_capacities, transport_capacities,
+            initial_stock, number_of_periods, sim_T, demand_trajectory)
+
+
+if __name__ == "__main__":
+    from OiH import OiHModel
+    from SP_2stage import StochasticHereAndNowModel
+
+    N = 10
+    for n in (10, 50, 200):
+        problem_data = synthetic_problem_data(n)
+        rng = np.random.default_rng(n)
+        p1, p2 = rng.uniform(10, 50, n), rng.uniform(10, 50, n)
+        p_scen, prob = rng.uniform(10, 50, (n, N)), np.full(N, 1 / N)
+
+        start = time.perf_counter()
+        oih = OiHModel('highs', problem_data)
+        oih.update(p1, p2)
+        pyomo_oih = time.perf_counter() - start
+        start = time.perf_counter()
+        oih_matrix = build_oih_matrix(problem_data, p1, p2)
+        oih_matrix.matrix()
+        matrix_oih = time.perf_counter() - start
+
+        start = time.perf_counter()
+        sp = StochasticHereAndNowModel(N, 'highs', problem_data)
+        sp.update(p1, p_scen, problem_data[6], prob=prob)
+        pyomo_sp = time.perf_counter() - start
+        start = time.perf_counter()
+        sp_matrix = build_sp_matrix(problem_data, p1, p_scen, prob)
+        sp_matrix.matrix()
+        matrix_sp = time.perf_counter() - start
+
+        print("W=%3d  OiH build: pyomo %7.3f s, matrix %6.3f s | SP (N=%d) build: pyomo %7.3f s, matrix %6.3f s"
+              % (n, pyomo_oih, matrix_oih, N, pyomo_sp, matrix_sp))
+
+        if n <= 50:
+            oih.solve()
+            sp.solve()
+            print("       objectives: OiH pyomo %.4f matrix %.4f | SP pyomo %.4f matrix %.4f"
+                  % (oih.objective_value(), oih_matrix.solve()[0], sp.objective_value(), sp_matrix.solve()[0]))
@@ -5,76 +5,202 @@ Created on Thu Feb 13 09:58:17 2025
 @author: geots
 """
 
+import os
+from concurrent.futures import ProcessPoolExecutor
+
 from pyomo.environ import *
-from pyomo.opt import SolverFactory
+import highspy
 import numpy as np
 
+from data import adjacency, load_problem_data, transport_edges
+from MatrixModels import build_oih_matrix
+from PersistentModel import PersistentModel, all_pairs
+
+
+class OiHModel(PersistentModel):
+    """
+    Perfect-information (hindsight) model, built once.
+
+    Only the prices of the first two periods change between experiments, so they
+    are mutable Params of the objective; update() sets them before solve().
+
+    Shipments ys only exist on the links of the transport network (pairs with a
+    positive capacity), so the model grows with the links instead of W^2. The
+    received quantity yr[q, w, t] is the Expression ys[w, q, t] on the same links.
+    The solution returned by solve() still holds ys and yr over every pair, 0 off the links.
+    """
+
+    def __init__(self, backend=None, problem_data=None):
+        if problem_data is None:
+            problem_data = load_problem_data('V2_02435_two_stage_problem_data')
+
+        (self.number_of_warehouses, self.W, self.cost_miss, self.cost_tr, self.warehouse_capacities,
+         self.transport_capacities, self.initial_stock, self.number_of_simulation_periods, self.sim_T,
+         self.demand_trajectory) = problem_data
+        super().__init__(backend)
+
+    def build_model(self):
+        W = self.W
+        sim_T = self.sim_T
+        edges = transport_edges(W, self.transport_capacities)
+        successors, predecessors = adjacency(W, edges)
+
+        # Declare model
+        model = ConcreteModel()
+
+        # Sets and Parameters
+        model.W = Set(initialize=W)
+        model.T = Set(initialize=sim_T)
+        model.E = Set(initialize=edges, dimen=2)  # links of the transport network
+        model.b = Param(model.W, initialize={w: self.cost_miss[w] for w in W})
+        model.e = Param(model.E, initialize={(w, q): self.cost_tr[w, q] for w, q in edges})
+        model.Cs = Param(model.W, initialize={w: self.warehouse_capacities[w] for w in W})
+        model.Ct = Param(model.E, initialize={(w, q): self.transport_capacities[w, q] for w, q in edges})
+        model.D = Param(model.W, model.T, initialize={(w, t): self.demand_trajectory[w, t - 1] for w in W for t in sim_T})
+        model.z0 = Param(model.W, initialize={w: self.initial_stock[w] for w in W})
+
+        # Prices, changed between experiments
+        model.p1 = Param(model.W, initialize=0, mutable=True)
+        model.p2 = Param(model.W, initialize=0, mutable=True)
+
+        # Variables
+
+        # quantity order
+        model.x = Var(model.W, model.T, domain=NonNegativeReals)
+
+        # warehouse storage
+        model.z = Var(model.W, model.T, domain=NonNegativeReals)
+
+        # missing quantity
+        model.m = Var(model.W, model.T, domain=NonNegativeReals)
+
+        # quantity send
+        model.ys = Var(model.E, model.T, domain=NonNegativeReals)
+
+        # quantity received, the quantity sent the other way along the link
+        model.yr = Expression([(q, w, t) for w, q in edges for t in sim_T],
+                              rule=lambda model, q, w, t: model.ys[w,q,t])
+
+        # Objective Function
+        def objective_rule(model):
+            return sum(model.x[w,1] * model.p1[w] + model.x[w,2] * model.p2[w] for w in model.W) + \
+                   sum(model.ys[w,q,t] * model.e[w,q] for w, q in model.E for t in model.T) + \
+                   sum(model.m[w,t] * model.b[w] for w in model.W for t in model.T)
+
+        model.obj = Objective(rule=objective_rule, sense=minimize)
+
+        # Constraints
+
+        #Constraint on transport capacity
+        model.TrCap = Constraint(model.E, model.T, rule=lambda model, w, q, t: model.ys[w,q,t] <= model.Ct[w,q])
+
+        #Constraint on storage capacity
+        model.StCap = Constraint(model.W, model.T, rule=lambda model, w, t: model.z[w,t] <= model.Cs[w])
+
+        #Constraint on coffee balance
+        model.Demand = Constraint(model.W, model.T, rule=lambda model, w, t:
+            model.x[w,t] + model.m[w,t] + (model.z0[w] if t==1 else model.z[w,t-1]) + \
+            sum(model.ys[q,w,t] for q in predecessors[w]) == model.D[w,t] + model.z[w,t] + \
+            sum(model.ys[w,q,t] for q in successors[w]))
+
+         #Constraint on (stored) amount sent between warehouses
+        model.YsCons = Constraint(model.W, model.T, rule=lambda model, w, t:
+            sum(model.ys[w,q,t] for q in successors[w]) <= (model.z0[w] if t==1 else model.z[w,t-1])
+            if successors[w] else Constraint.Skip)
+
+        return model
+
+    def update(self, p1, p2):
+        self.set_param(self.model.p1, {w: p1[w] for w in self.W})
+        self.set_param(self.model.p2, {w: p2[w] for w in self.W})
+
+    def values(self):
+        """Copy of the solution, with ys and yr over every (w, q, t) as in the dense model."""
+        values = super().values()
+        values['ys'], values['yr'] = all_pairs(values['ys'], self.W, self.sim_T)
+        return values
+
+
+# Hindsight model of this process, built on first use
+_oih_model = None
+
+
 def Calculate_OiH_solution(p1, p2):
-    from V2_02435_two_stage_problem_data import load_the_data
-    from V2_price_process import *
-
-    number_of_warehouses, W, cost_miss, cost_tr, warehouse_capacities, transport_capacities, initial_stock, number_of_simulation_periods, sim_T, demand_trajectory = load_the_data()
-
-    # Declare model
-    model = ConcreteModel()
-
-    # Sets and Parameters
-    model.W = Set(initialize=W)
-    model.T = Set(initialize=sim_T)
-    model.b = Param(model.W, initialize=cost_miss)
-    model.e = Param(model.W * model.W, initialize=cost_tr)
-    model.Cs = Param(model.W, initialize=warehouse_capacities)
-    model.Ct = Param(model.W * model.W, initialize=transport_capacities)
-    model.D = Param(model.W, model.T, initialize=demand_trajectory)
-    model.z0 = Param(model.W, initialize=initial_stock)
-
-    # Variables
-    
-    # quantity order
-    model.x = Var(model.W, model.T, domain=NonNegativeReals)
-    
-    # warehouse storage
-    model.z = Var(model.W, model.T, domain=NonNegativeReals)
-    
-    # missing quantity
-    model.m = Var(model.W, model.T, domain=NonNegativeReals)
-    
-    # quantity send
-    model.ys = Var(model.W, model.W, model.T, domain=NonNegativeReals)
-    
-    # quantity received
-    model.yr = Var(model.W, model.W, model.T, domain=NonNegativeReals)
-
-    # Objective Function
-    def objective_rule(model):
-        return sum(model.x[w,1] * p1[w] + model.x[w,2] * p2[w] for w in model.W) + \
-               sum(model.ys[w,q,t] * model.e[w,q] for w in model.W for q in model.W for t in model.T) + \
-               sum(model.m[w,t] * model.b[w] for w in model.W for t in model.T)
-    
-    model.obj = Objective(rule=objective_rule, sense=minimize)
-
-    # Constraints
-    
-    #Constraint on transport capacity
-    model.TrCap = Constraint(model.W, model.W, model.T, rule=lambda model, w, q, t: model.ys[w,q,t] <= model.Ct[w,q])
-    
-    #Constraint on quantity sent equal to quantity received
-    model.QTrans = Constraint(model.W, model.W, model.T, rule=lambda model, w, q, t: model.ys[w,q,t] == model.yr[q,w,t])
-   
-    #Constraint on storage capacity
-    model.StCap = Constraint(model.W, model.T, rule=lambda model, w, t: model.z[w,t] <= model.Cs[w])
-    
-    #Constraint on coffee balance
-    model.Demand = Constraint(model.W, model.T, rule=lambda model, w, t: 
-        model.x[w,t] + model.m[w,t] + (model.z0[w] if t==1 else model.z[w,t-1]) + \
-        sum(model.yr[w,q,t] for q in model.W) == model.D[w,t] + model.z[w,t] + sum(model.ys[w,q,t] for q in model.W))
-    
-     #Constraint on (stored) amount sent between warehouses    
-    model.YsCons = Constraint(model.W, model.T, rule=lambda model, w, t: 
-        sum(model.ys[w,q,t] for q in model.W) <= (model.z0[w] if t==1 else model.z[w,t-1]))
-
-    # Solve model
-    solver = SolverFactory('gurobi')
-    solver.solve(model)
-
-    return model.x, model.z, model.m, model.ys, model.yr, model.obj.expr
+    """
+    Hindsight solution for first- and second-period prices p1, p2.
+
+    Returns:
+        tuple: (x, z, m, ys, yr, objective), copies of the solution: dicts by (w, t), and
+            ys/yr by every (w, q, t), 0 off the transport links.
+    """
+    global _oih_model
+    if _oih_model is None:
+        _oih_model = OiHModel()
+
+    _oih_model.update(p1, p2)
+    values = _oih_model.solve()
+
+    return values['x'], values['z'], values['m'], values['ys'], values['yr'], _oih_model.objective_value()
+
+
+# HiGHS instance of the hindsight LP in this process and its x columns, for batch solves
+_oih_highs = None
+
+
+def _init_oih_batch(problem_data):
+    global _oih_highs
+    n = len(problem_data[1])
+    mm = build_oih_matrix(problem_data, np.zeros(n), np.zeros(n))
+    _oih_highs = (mm.to_highs(), mm.blocks['x'])
+
+
+def _solve_oih_chunk(prices):
+    highs, x_index = _oih_highs
+    columns = x_index.ravel().astype(np.int32)
+    costs = np.empty(len(prices))
+    for k, price in enumerate(prices):
+        highs.changeColsCost(len(columns), columns, price.ravel())
+        highs.run()
+        if highs.getModelStatus() != highspy.HighsModelStatus.kOptimal:
+            raise RuntimeError("HiGHS did not solve the hindsight LP: %s"
+                               % highs.modelStatusToString(highs.getModelStatus()))
+        costs[k] = highs.getInfo().objective_function_value
+    return costs
+
+
+def Calculate_OiH_costs(prices, problem_data=None, n_workers=1):
+    """
+    Hindsight (OiH) costs of many price realisations.
+
+    The LP is built once per process. Between experiments only the order prices
+    change in place, and every solve warm-starts from the previous basis.
+
+    Args:
+        prices (np.ndarray): Order prices of shape (experiments, warehouses, periods), indexed
+            by warehouse position, over the whole horizon of problem_data. To price only the first
+            two periods (as Calculate_OiH_solution does), pass zeros for the later ones.
+        problem_data (tuple, optional): Output of load_the_data(). Defaults to the cached course data.
+        n_workers (int): Processes to spread the experiments over; None uses every core.
+
+    Returns:
+        np.ndarray: Hindsight cost of every experiment, shape (experiments,).
+
+    Raises:
+        ValueError: If prices does not match the warehouses and periods of problem_data.
+    """
+    if problem_data is None:
+        problem_data = load_problem_data('V2_02435_two_stage_problem_data')
+    prices = np.asarray(prices, dtype=float)
+    expected = (len(problem_data[1]), len(problem_data[8]))
+    if prices.ndim != 3 or prices.shape[1:] != expected:
+        raise ValueError("prices must have shape (experiments, warehouses, periods) = (n, %d, %d), got %s"
+                         % (expected + (prices.shape,)))
+    n_workers = os.cpu_count() if n_workers is None else n_workers
+
+    if n_workers == 1:
+        _init_oih_batch(problem_data)
+        return _solve_oih_chunk(prices)
+
+    chunks = np.array_split(prices, max(1, min(len(prices), 4 * n_workers)))
+    with ProcessPoolExecutor(max_workers=n_workers, initializer=_init_oih_batch, initargs=(problem_data,)) as pool:
+        return np.concatenate(list(pool.map(_solve_oih_chunk, chunks)))
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+"""
+Base class for Pyomo models that are built once and re-solved many times.
+
+Data that changes between solves is kept in mutable Params, both for objective
+coefficients (prices) and for right-hand sides (stock levels, demands). Decisions
+can be pinned with fixed Vars (e.g. to evaluate a first-stage decision out of sample).
+With a persistent solver interface only the changed components are pushed to the
+solver on each re-solve, and the solver keeps its previous basis as a warm start.
+"""
+
+import time
+from itertools import chain
+
+from pyomo.core.expr.visitor import identify_mutable_parameters, identify_variables
+from pyomo.environ import Constraint, Var, value
+from pyomo.solvers.plugins.solvers.persistent_solver import PersistentSolver
+
+from SolverBackends import default_backend, get_solver, make_result
+
+
+class PersistentModel:
+    """
+    Holds a ConcreteModel together with a persistent solver instance.
+
+    Subclasses build the model in build_model() and expose an update method
+    that calls set_param / set_fixed before solve(). solve() returns a copy of
+    the solution, since the model and its components are reused by the next solve.
+    """
+
+    def __init__(self, backend=None):
+        self.model = self.build_model()
+        self.backend = default_backend() if backend is None else backend
+        self.solver = get_solver(self.backend, persistent=True)
+        # Legacy persistent interfaces (gurobi_persistent, cplex_persistent, ...) need the
+        # instance and every change pushed explicitly; appsi interfaces detect changes themselves,
+        # and non-persistent solvers simply re-read the model.
+        self._legacy = isinstance(self.solver, PersistentSolver)
+        if self._legacy:
+            self.solver.set_instance(self.model)
+            self._index_components()
+        self._changed_params = []
+        self._changed_vars = []
+        self.results = None
+        self.last_result = None
+
+    def build_model(self):
+        raise NotImplementedError
+
+    def _index_components(self):
+        """
+        Records which constraints and whether the objective reference each Param and Var.
+
+        A legacy interface bakes the value of mutable Params and fixed Vars into the
+        constraint rows and the objective when they are added, so any change to them
+        only reaches the solver by re-adding the rows (and re-setting the objective).
+        """
+        self._constraints_of = {}
+        for con in self.model.component_data_objects(Constraint, active=True, descend_into=True):
+            for component in chain(identify_mutable_parameters(con.expr),
+                                   identify_variables(con.expr, include_fixed=True)):
+                self._constraints_of.setdefault(id(component), []).append(con)
+        objective = self.model.obj.expr
+        self._in_objective = {id(component) for component in chain(
+            identify_mutable_parameters(objective), identify_variables(objective, include_fixed=True))}
+
+    def set_param(self, param, values):
+        """Sets a mutable Param from a dict or array indexed like the Param."""
+        for index in param:
+            param[index] = values[index]
+            self._changed_params.append(param[index])
+
+    def set_fixed(self, var, values):
+        """Fixes a Var to new values, indexed like the Var."""
+        for index in var:
+            var[index].fix(values[index])
+            self._changed_vars.append(var[index])
+
+    def _push_changes(self):
+        """Pushes the changed Params and Vars to a legacy persistent interface."""
+        changed = self._changed_params + self._changed_vars
+        stale = {}
+        for component in changed:
+            for con in self._constraints_of.get(id(component), ()):
+                stale[id(con)] = con
+        for con in stale.values():
+            self.solver.remove_constraint(con)
+        for v in self._changed_vars:
+            self.solver.update_var(v)
+        for con in stale.values():
+            self.solver.add_constraint(con)
+        if any(id(component) in self._in_objective for component in changed):
+            self.solver.set_objective(self.model.obj)
+
+    def solve(self):
+        start = time.perf_counter()
+        if self._legacy:
+            self._push_changes()
+            self.results = self.solver.solve(warmstart=True)
+        else:
+            self.results = self.solver.solve(self.model)
+        self.last_result = make_result(self.backend, self.results, time.perf_counter() - start,
+                                       value(self.model.obj, exception=False))
+        self._changed_params = []
+        self._changed_vars = []
+        return self.values()
+
+    def values(self):
+        """Copy of the current solution: {variable name: {index: value}}."""
+        return {var.local_name: var.extract_values() for var in self.model.component_objects(Var, active=True)}
+
+    def objective_value(self):
+        return value(self.model.obj)
+
+
+def all_pairs(values, W, rest=None):
+    """
+    Spreads values of link variables, indexed (w, q) or (w, q, r), over every pair of W,
+    with 0 off the links, i.e. in the full index of the dense models.
+
+    Returns:
+        tuple: (sent, received) where received[q, w, ...] = sent[w, q, ...].
+    """
+    if rest is None:
+        sent = {(w, q): values.get((w, q), 0.0) for w in W for q in W}
+    else:
+        sent = {(w, q, r): values.get((w, q, r), 0.0) for w in W for q in W for r in rest}
+    received = {(index[1], index[0]) + index[2:]: v for index, v in sent.items()}
+    return sent, received
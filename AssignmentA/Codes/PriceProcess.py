@@ -7,7 +7,7 @@ Created on Thu Jan  9 10:39:11 2025
 
 import numpy as np
 
-def price_model(current_price, previous_price, projected_wind, data):
+def price_model(current_price, previous_price, projected_wind, data, rng=None):
     """
     Price process with dependence on previous prices and projected wind generation.
 
@@ -16,10 +16,13 @@ def price_model(current_price, previous_price, projected_wind, data):
         previous_price (float): Electricity price at the previous time step.
         projected_wind (float): Projected wind generation for the next time step.
         data (dict): Fixed data containing model parameters.
+        rng (np.random.Generator, optional): Generator used for all draws. Defaults to
+            the global np.random state.
 
     Returns:
         float: Next price.
     """
+    random = np.random if rng is None else rng
     mean_price = data['mean_price']
     reversion_strength = data['price_reversion_strength']
     wind_influence = data['wind_influence_on_price']
@@ -28,12 +31,46 @@ def price_model(current_price, previous_price, projected_wind, data):
 
     mean_reversion = reversion_strength * (mean_price - current_price)
     wind_effect = wind_influence * projected_wind
-    noise = np.random.normal(0, 1)
+    noise = random.normal(0, 1)
 
     next_price = current_price + 0.6 * (current_price - previous_price) + mean_reversion + wind_effect + noise
 
     if next_price < 0:
-        if np.random.rand() > 0.2:
-            next_price = np.random.uniform(0, mean_price * 0.3)
+        if random.random() > 0.2:
+            next_price = random.uniform(0, mean_price * 0.3)
 
-    return max(min(next_price, price_cap), price_floor)
\ No newline at end of file
+    return max(min(next_price, price_cap), price_floor)
+
+
+def price_model_batch(current_price, previous_price, projected_wind, data, rng):
+    """
+    Vectorized version of price_model, advancing a whole batch of scenarios one step.
+
+    Args:
+        current_price (np.ndarray): Current electricity price for each scenario.
+        previous_price (np.ndarray): Electricity price at the previous time step for each scenario.
+        projected_wind (np.ndarray): Projected wind generation for the next time step.
+        data (dict): Fixed data containing model parameters.
+        rng (np.random.Generator): Random generator used for all draws.
+
+    Returns:
+        np.ndarray: Next price for each scenario.
+    """
+    mean_price = data['mean_price']
+    reversion_strength = data['price_reversion_strength']
+    wind_influence = data['wind_influence_on_price']
+    price_cap = data['price_cap']
+    price_floor = data['price_floor']
+    n = current_price.shape[0]
+
+    mean_reversion = reversion_strength * (mean_price - current_price)
+    wind_effect = wind_influence * projected_wind
+    noise = rng.standard_normal(n)
+
+    next_price = current_price + 0.6 * (current_price - previous_price) + mean_reversion + wind_effect + noise
+
+    # Negative prices are resampled with probability 0.8, as in the scalar model
+    resample = (next_price < 0) & (rng.random(n) > 0.2)
+    next_price = np.where(resample, rng.uniform(0, mean_price * 0.3, n), next_price)
+
+    return np.clip(next_price, price_floor, price_cap)
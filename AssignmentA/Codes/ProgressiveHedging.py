@@ -0,0 +1,291 @@
+# -*- coding: utf-8 -*-
+"""
+Progressive Hedging for the stochastic hydrogen hub MILP.
+
+The electrolyzer commitments x[t] of Task0 are decided before wind and price
+are known and must be the same in every scenario; grid purchases, conversions
+and storage adapt to each scenario. PH relaxes this non-anticipativity:
+every scenario subproblem is solved on its own with the objective
+
+    cost_s(x_s, ...) + w_s x_s + rho / 2 ||x_s - x_bar||^2
+
+where x_bar is the probability-weighted mean commitment and the multipliers
+w_s += rho (x_s - x_bar) penalise disagreement. For binary x the proximal term
+is linear (x^2 = x), so each subproblem stays a MILP with modified x costs.
+Subproblems are independent. The scenarios are split into one fixed block per
+worker process, so every worker only builds the HiGHS models of its own block,
+keeps them loaded across iterations and only changes the x costs (each re-solve
+warm-starts from that scenario's previous basis).
+Under a time limit every scenario solve gets the remaining budget as HiGHS's
+own time limit; a solve stopped by it contributes its incumbent, and a scenario
+without one keeps its solution of the previous iteration.
+"""
+
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import highspy
+import numpy as np
+
+from data import get_fixed_data
+from MatrixModels import MatrixModel, build_hydrogen_matrix
+from ScenarioTree import tree_trajectories
+
+# Scenario block of the current process, (data, {scenario id: (wind, price)}),
+# and the HiGHS models built so far
+_scenarios = None
+_subproblems = {}
+
+
+def _init_subproblems(data, ids, wind, price):
+    """Assigns the scenarios ids, with trajectories wind and price of shape (len(ids), T), to this process."""
+    global _scenarios
+    _scenarios = (data, {s: (wind[k], price[k]) for k, s in enumerate(ids)})
+    _subproblems.clear()
+
+
+def _subproblem(s):
+    if s not in _subproblems:
+        data, block = _scenarios
+        mm = build_hydrogen_matrix(data, *block[s], curtailment=True)
+        _subproblems[s] = (mm.to_highs(), mm.blocks['x'].astype(np.int32))
+    return _subproblems[s]
+
+
+def _solve_chunk(args):
+    """
+    Solves the subproblems of a chunk of scenarios with the given x costs.
+
+    Args:
+        args (tuple): (scenario ids of shape (k,), x costs of shape (k, T),
+            commitments to fix of shape (T,) or None, seconds left in the budget or None).
+
+    Returns:
+        tuple: (objective values of shape (k,), lower bounds of shape (k,), commitments of
+            shape (k, T), True if a solve was stopped by the time limit). Scenarios the
+            time limit left without a feasible solution are NaN.
+
+    Raises:
+        RuntimeError: If a solve ends without a feasible solution for another reason.
+    """
+    ids, x_cost, fixed, remaining = args
+    deadline = None if remaining is None else time.perf_counter() + remaining
+    T = x_cost.shape[1]
+    objective = np.full(len(ids), np.nan)
+    bound = np.full(len(ids), np.nan)
+    x = np.full((len(ids), T), np.nan)
+    time_limited = False
+    for k, s in enumerate(ids):
+        if deadline is not None and time.perf_counter() >= deadline:
+            time_limited = True
+            break
+        highs, x_index = _subproblem(s)
+        highs.changeColsCost(T, x_index, x_cost[k])
+        if fixed is not None:
+            highs.changeColsBounds(T, x_index, fixed, fixed)
+        limit = highspy.kHighsInf if deadline is None else max(deadline - time.perf_counter(), 0.0)
+        highs.setOptionValue('time_limit', limit)
+        highs.run()
+        status, info = highs.getModelStatus(), highs.getInfo()
+        if status == highspy.HighsModelStatus.kTimeLimit:
+            time_limited = True
+        elif status != highspy.HighsModelStatus.kOptimal:
+            raise RuntimeError("HiGHS did not solve scenario %d: %s" % (s, highs.modelStatusToString(status)))
+        if info.primal_solution_status == int(highspy.SolutionStatus.kSolutionStatusFeasible):
+            # Out of time, the incumbent stands in for the optimum and the MIP dual bound for the bound
+            objective[k] = info.objective_function_value
+            bound[k] = info.mip_dual_bound if time_limited else info.objective_function_value
+            x[k] = np.asarray(highs.getSolution().col_value)[x_index]
+        if fixed is not None:
+            highs.changeColsBounds(T, x_index, np.zeros(T), np.ones(T))
+    return objective, bound, np.round(x), time_limited
+
+
+class PHResult:
+    """
+    Outcome of Progressive Hedging.
+
+    Attributes:
+        x (np.ndarray): Implementable commitments of shape (T,).
+        objective (float): Expected cost of x, with every scenario re-solved with x fixed.
+        lower_bound (float): Expected wait-and-see cost (iteration 0), a lower bound on the optimum.
+        iterations (int): Number of PH iterations after iteration 0.
+        converged (bool): True if all scenarios agreed on x before the iteration or time limit.
+        history (list): One dict per iteration with 'iteration', 'convergence' (expected
+            L1 distance of x_s from x_bar), 'disagreement' (timeslots without consensus),
+            'expected_cost' (of the scenario solutions, without PH terms), 'rho' and 'elapsed'.
+    """
+
+    def __init__(self, x, objective, lower_bound, iterations, converged, history):
+        self.x = x
+        self.objective = objective
+        self.lower_bound = lower_bound
+        self.iterations = iterations
+        self.converged = converged
+        self.history = history
+
+
+def solve_progressive_hedging(wind, price, prob=None, data=None, rho=None, rho_growth=1.1, tol=1e-6,
+                              max_iterations=100, time_limit=None, n_workers=None, verbose=False):
+    """
+    Solves the stochastic hydrogen hub MILP over wind/price scenarios with Progressive Hedging.
+
+    Args:
+        wind, price (np.ndarray): Scenario trajectories of shape (scenarios, T), e.g. from
+            generate_scenarios or, with their probabilities, ScenarioTree.tree_trajectories.
+        prob (np.ndarray, optional): Scenario probabilities, e.g. the leaf probabilities of a
+            scenario tree. Defaults to equal probabilities.
+        data (dict, optional): Fixed data. Defaults to get_fixed_data().
+        rho (float, optional): Initial penalty. Defaults to the mean price, the order of
+            magnitude of the value of one hour of electrolyzer commitment.
+        rho_growth (float): Factor applied to rho after every iteration, which forces
+            the binary commitments to agree eventually.
+        tol (float): Convergence (expected L1 distance from x_bar) at which to stop.
+        max_iterations (int): Maximum number of PH iterations.
+        time_limit (float, optional): Wall-clock budget in seconds. Each scenario solve is
+            limited to what is left of it; once it is used up PH stops and x_bar is rounded
+            to a commitment. The final evaluation of that commitment is not limited.
+        n_workers (int, optional): Processes for the subproblems. Defaults to the number of cores.
+        verbose (bool): Prints the metrics of every iteration.
+
+    Returns:
+        PHResult
+    """
+    start = time.perf_counter()
+    data = get_fixed_data() if data is None else data
+    wind, price = np.asarray(wind, dtype=float), np.asarray(price, dtype=float)
+    S, T = wind.shape
+    prob = np.full(S, 1 / S) if prob is None else np.asarray(prob, dtype=float)
+    rho = float(data['mean_price']) if rho is None else rho
+    C_elzr = data['electrolyzer_cost']
+
+    n_workers = os.cpu_count() if n_workers is None else n_workers
+    # One fixed block of scenarios per worker, each on its own single-process pool, so a
+    # scenario is always solved by the worker holding its model
+    chunks = np.array_split(np.arange(S), max(1, min(S, n_workers)))
+    if len(chunks) > 1:
+        pools = [ProcessPoolExecutor(max_workers=1, initializer=_init_subproblems,
+                                     initargs=(data, ids, wind[ids], price[ids]))
+                 for ids in chunks]
+    else:
+        pools = None
+        _init_subproblems(data, np.arange(S), wind, price)
+
+    def remaining():
+        return None if time_limit is None else max(time_limit - (time.perf_counter() - start), 0.0)
+
+    def solve_all(x_cost, fixed=None, budget=None):
+        tasks = [(ids, x_cost[ids], fixed, budget) for ids in chunks]
+        if pools:
+            futures = [pool.submit(_solve_chunk, task) for pool, task in zip(pools, tasks)]
+            results = [future.result() for future in futures]
+        else:
+            results = list(map(_solve_chunk, tasks))
+        objective, bound, x = (np.concatenate(parts) for parts in list(zip(*results))[:3])
+        # Remove the PH terms from the objective to get the cost of each scenario solution
+        return objective - ((x_cost - C_elzr) * x).sum(axis=1), bound, x, any(r[3] for r in results)
+
+    def record(iteration, cost, x, x_bar):
+        metrics = {
+            'iteration': iteration,
+            'convergence': float(prob @ np.abs(x - x_bar).sum(axis=1)),
+            'disagreement': int((x.min(axis=0) != x.max(axis=0)).sum()),
+            'expected_cost': float(prob @ cost),
+            'rho': rho,
+            'elapsed': time.perf_counter() - start,
+        }
+        history.append(metrics)
+        if verbose:
+            print("PH %3d  convergence %.4f  disagreement %2d  E[cost] %.4f  rho %.2f  %.2f s"
+                  % tuple(metrics.values()))
+        return metrics
+
+    history = []
+    try:
+        # Iteration 0: independent (wait-and-see) solutions
+        cost, bound, x, time_limited = solve_all(np.full((S, T), C_elzr), budget=remaining())
+        if np.isnan(cost).any():
+            raise RuntimeError("The time limit ran out before every wait-and-see problem had a solution")
+        # Without PH terms the bounds are those of the wait-and-see problems
+        lower_bound = float(prob @ bound)
+        x_bar = prob @ x
+        w = rho * (x - x_bar)
+        metrics = record(0, cost, x, x_bar)
+
+        iteration = 0
+        while metrics['convergence'] > tol and iteration < max_iterations:
+            if time_limited or remaining() == 0:
+                break
+            iteration += 1
+            # rho / 2 (x - x_bar)^2 = rho / 2 (1 - 2 x_bar) x + constant for binary x
+            new_cost, _, new_x, time_limited = solve_all(C_elzr + w + rho / 2 * (1 - 2 * x_bar),
+                                                         budget=remaining())
+            # Scenarios left without a solution by the time limit keep their previous one
+            unsolved = np.isnan(new_cost)
+            cost = np.where(unsolved, cost, new_cost)
+            x = np.where(unsolved[:, None], x, new_x)
+            x_bar = prob @ x
+            metrics = record(iteration, cost, x, x_bar)
+            rho *= rho_growth
+            w += rho * (x - x_bar)
+
+        converged = metrics['convergence'] <= tol
+        x_hat = np.round(x_bar)
+        cost, _, _, _ = solve_all(np.full((S, T), C_elzr), fixed=x_hat)
+    finally:
+        for pool in pools or ():
+            pool.shutdown()
+
+    return PHResult(x_hat, float(prob @ cost), lower_bound, iteration, converged, history)
+
+
+def build_hydrogen_extensive(data, wind, price, prob):
+    """
+    Extensive form of the stochastic hydrogen hub MILP: one commitment x shared by all scenarios.
+
+    Returns:
+        MatrixModel: Model with block 'x' of shape (T,) and scenario blocks of shape (scenarios, T).
+    """
+    S, T = wind.shape
+    D = np.asarray(data['demand_schedule'], dtype=float)
+    R_p2h = data['conversion_p2h']
+    R_h2p = data['conversion_h2p']
+
+    mm = MatrixModel()
+    x = mm.add_variables('x', (T,), cost=data['electrolyzer_cost'], ub=1, integer=True)
+    p2h = mm.add_variables('p2h', (S, T))
+    h2p = mm.add_variables('h2p', (S, T), ub=data['h2p_rate'])
+    g = mm.add_variables('g', (S, T), cost=prob[:, None] * price)
+    s = mm.add_variables('s', (S, T), ub=data['hydrogen_capacity'])
+    c = mm.add_variables('c', (S, T))
+    x_s = np.broadcast_to(x, (S, T))
+
+    mm.add_rows([(1.0, g.ravel()), (1.0, h2p.ravel()), (-1.0, p2h.ravel()), (-1.0, c.ravel())],
+                (D - wind).ravel(), (D - wind).ravel())
+    mm.add_rows([(1.0, s[:, 1:].ravel()), (-1.0, s[:, :-1].ravel()), (-R_p2h, p2h[:, 1:].ravel()),
+                 (1 / R_h2p, h2p[:, 1:].ravel())], 0, 0)
+    mm.add_rows([(1.0, p2h.ravel()), (-data['p2h_rate'], x_s.ravel())], -np.inf, 0)
+    mm.add_rows([(1.0, x[1:]), (-1.0, x[:-1])], -1, 1)
+    return mm
+
+
+if __name__ == "__main__":
+    data = get_fixed_data()
+
+    # PH against the extensive form on a small instance, a scenario tree branching in the first hours
+    wind, price, prob = tree_trajectories([5, 5, 2], data, rng=0)
+    start = time.perf_counter()
+    extensive, solution = build_hydrogen_extensive(data, wind, price, prob).solve()
+    print("Extensive form: %.4f in %.2f s" % (extensive, time.perf_counter() - start))
+    result = solve_progressive_hedging(wind, price, prob, data, verbose=True)
+    print("PH: %.4f (lower bound %.4f) after %d iterations, converged: %s"
+          % (result.objective, result.lower_bound, result.iterations, result.converged))
+    print("PH gap to the extensive optimum: %.2f%%" % (100 * (result.objective - extensive) / extensive))
+
+    # A larger instance under a time budget
+    wind, price, prob = tree_trajectories([10, 10, 10], data, rng=1)
+    result = solve_progressive_hedging(wind, price, prob, data, time_limit=60)
+    print("1000 scenarios: %.4f (lower bound %.4f) after %d iterations in %.2f s, converged: %s"
+          % (result.objective, result.lower_bound, result.iterations, result.history[-1]['elapsed'],
+             result.converged))
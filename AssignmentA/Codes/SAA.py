@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+"""
+Sample average approximation (SAA) driver for the two-stage SP of SP_2stage.
+
+Each round solves M independent SAA replications with N sampled scenarios.
+The mean of their optimal values estimates a lower bound on the true optimal
+cost (Mak, Morton and Wood). The best replication's first-stage decision is
+chosen on a selection sample and then evaluated on an independent sample of
+N_eval scenarios, which estimates an upper bound. Both come with one-sided
+confidence limits. N grows until the gap between the confidence limits is
+below the tolerance.
+
+Replications and evaluation chunks run in parallel worker processes. Every
+task seeds its own sampler, so results do not depend on the number of workers.
+Each worker loads the recourse LP into HiGHS once, when it starts, and the
+evaluation chunks only change its prices and right-hand sides.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from scipy import stats
+
+from Benders import _init_recourse, _solve_recourse_chunk
+from data import load_problem_data
+from MatrixModels import build_sp_matrix, problem_arrays
+from SP_2stage import sample_price_fan
+
+FIRST_STAGE = ('x1', 'z1', 'm1', 'ys1', 'yr1')
+
+
+def _solve_replication(args):
+    problem_data, p1, N, current_stock, tau, seed, sampler = args
+    np.random.seed(seed)
+    p_scen = sampler(p1, problem_data[1], N)
+    objective, solution = build_sp_matrix(problem_data, p1, p_scen, np.full(N, 1 / N), current_stock, tau).solve()
+    return objective, {name: solution[name] for name in FIRST_STAGE}
+
+
+def _evaluate_chunk(args):
+    """
+    Recourse costs of the first-stage stocks z1 (one row per candidate) on a sampled chunk,
+    with the recourse LP loaded by _init_recourse in this process.
+    """
+    W, p1, z1, n_samples, seed, sampler = args
+    np.random.seed(seed)
+    p_scen = sampler(p1, W, n_samples)
+    return np.array([_solve_recourse_chunk((z, p_scen.T))[0] for z in z1])
+
+
+def first_stage_cost(problem_data, p1, first_stage):
+    W, b, e = problem_arrays(problem_data)[:3]
+    p1 = np.array([p1[w] for w in W], dtype=float)
+    return float(p1 @ first_stage['x1'] + b @ first_stage['m1'] + (e * first_stage['ys1']).sum())
+
+
+class SAAResult:
+    """
+    Outcome of the SAA driver.
+
+    Attributes:
+        first_stage (dict): Chosen first-stage decision, arrays 'x1', 'z1', 'm1' (W,) and 'ys1', 'yr1' (W, W).
+        N (int): Sample size of the last round.
+        lower_bound, upper_bound (float): Point estimates of the bounds in the last round.
+        lower_limit, upper_limit (float): One-sided confidence limits of the bounds.
+        gap (float): upper_limit - lower_limit, relative to |upper_bound|.
+        converged (bool): True if the gap met the tolerance before max_N.
+        history (list): One dict per round with the fields above.
+    """
+
+    def __init__(self, first_stage, history, converged):
+        last = history[-1]
+        self.first_stage = first_stage
+        self.N = last['N']
+        self.lower_bound = last['lower_bound']
+        self.lower_limit = last['lower_limit']
+        self.upper_bound = last['upper_bound']
+        self.upper_limit = last['upper_limit']
+        self.gap = last['gap']
+        self.converged = converged
+        self.history = history
+
+
+def solve_saa(p1, problem_data=None, current_stock=None, tau=1, N=25, M=10, N_eval=2000, tol=0.01,
+              alpha=0.05, growth=2, max_N=1600, n_workers=None, seed=0, sampler=sample_price_fan, verbose=False):
+    """
+    Solves the two-stage SP by SAA, growing N until the optimality gap is within tol.
+
+    Args:
+        p1: First-stage price of each warehouse.
+        problem_data (tuple, optional): Output of load_the_data(). Defaults to the cached course data.
+        current_stock: Current stock of each warehouse. Defaults to the initial stock.
+        tau (int): Current timeslot (1-based), selects the demands of both stages.
+        N (int): Initial number of scenarios per replication.
+        M (int): Number of replications per round.
+        N_eval (int): Scenarios used to evaluate the chosen decision.
+        tol (float): Relative gap between the confidence limits at which to stop.
+        alpha (float): One-sided significance level of each confidence limit.
+        growth (float): Factor by which N grows between rounds.
+        max_N (int): Largest N tried.
+        n_workers (int, optional): Worker processes. Defaults to the number of cores; 1 runs serially.
+        seed (int): Seed of all samples; a task's sample only depends on the seed, N and the task.
+        sampler (callable): (p1, W, n) -> second-stage prices of shape (W, n), drawing from
+            numpy's global random state. Defaults to SP_2stage.sample_price_fan, the (equally
+            likely) leaves of a one-stage price tree.
+        verbose (bool): Prints each round.
+
+    Returns:
+        SAAResult
+    """
+    if problem_data is None:
+        problem_data = load_problem_data('v2_02435_two_stage_problem_data')
+    n_workers = os.cpu_count() if n_workers is None else n_workers
+    if n_workers > 1:
+        pool = ProcessPoolExecutor(max_workers=n_workers, initializer=_init_recourse, initargs=(problem_data, tau))
+    else:
+        pool = None
+        _init_recourse(problem_data, tau)
+    run = pool.map if pool else map
+    t_quantile = stats.t.ppf(1 - alpha, M - 1)
+    z_quantile = stats.norm.ppf(1 - alpha)
+
+    def evaluate(z1, n_samples, stream):
+        # Fixed-size chunks, so that the samples do not depend on the number of workers
+        sizes = np.diff(np.append(np.arange(0, n_samples, 250), n_samples))
+        tasks = [(problem_data[1], p1, z1, size, (seed, N, stream, k), sampler) for k, size in enumerate(sizes)]
+        return np.concatenate(list(run(_evaluate_chunk, tasks)), axis=1)
+
+    history = []
+    try:
+        while True:
+            tasks = [(problem_data, p1, N, current_stock, tau, (seed, N, m), sampler) for m in range(M)]
+            objectives, solutions = zip(*run(_solve_replication, tasks))
+            objectives = np.array(objectives)
+            lower_bound = objectives.mean()
+            lower_limit = lower_bound - t_quantile * objectives.std(ddof=1) / np.sqrt(M)
+
+            # Choose among the replications' decisions on a selection sample, then evaluate
+            # the chosen one on an independent sample
+            first_costs = np.array([first_stage_cost(problem_data, p1, solution) for solution in solutions])
+            z1 = np.array([solution['z1'] for solution in solutions])
+            selection = first_costs + evaluate(z1, max(1, N_eval // 4), 0).mean(axis=1)
+            best = int(selection.argmin())
+            costs = first_costs[best] + evaluate(z1[best:best + 1], N_eval, 1)[0]
+            upper_bound = costs.mean()
+            upper_limit = upper_bound + z_quantile * costs.std(ddof=1) / np.sqrt(N_eval)
+
+            gap = (upper_limit - lower_limit) / max(abs(upper_bound), 1e-10)
+            history.append({'N': N, 'lower_bound': lower_bound, 'lower_limit': lower_limit,
+                            'upper_bound': upper_bound, 'upper_limit': upper_limit, 'gap': gap})
+            if verbose:
+                print("N=%5d  lower %.4f (>= %.4f)  upper %.4f (<= %.4f)  gap %.2f%%"
+                      % (N, lower_bound, lower_limit, upper_bound, upper_limit, 100 * gap))
+            converged = gap <= tol
+            if converged or N >= max_N:
+                break
+            N = min(int(np.ceil(N * growth)), max_N)
+    finally:
+        if pool:
+            pool.shutdown()
+
+    return SAAResult(solutions[best], history, converged)
+
+
+if __name__ == "__main__":
+    import time
+
+    from MatrixModels import synthetic_problem_data
+
+    def lognormal_prices(p1, W, n):
+        return np.array([p1[w] * np.random.lognormal(0, 0.3, n) for w in W])
+
+    problem_data = synthetic_problem_data(10)
+    p1 = np.random.default_rng(0).uniform(10, 50, 10)
+    start = time.perf_counter()
+    result = solve_saa(p1, problem_data, sampler=lognormal_prices, tol=0.001, verbose=True)
+    print("N=%d, gap %.2f%%, converged: %s, %.2f s"
+          % (result.N, 100 * result.gap, result.converged, time.perf_counter() - start))
@@ -7,91 +7,210 @@ Created on Thu Feb 13 10:04:55 2025
 
 import numpy as np
 from pyomo.environ import *
-from pyomo.opt import SolverFactory
-from sklearn.cluster import KMeans
 
-def make_stochastic_here_and_now_decision(p1, N):
-    from v2_02435_two_stage_problem_data import load_the_data
+from Benders import solve_sp_benders
+from data import adjacency, load_problem_data, transport_edges
+from PersistentModel import PersistentModel, all_pairs
+from ScenarioReduction import reduce_scenarios
+from ScenarioTree import collect_tree, generate_state_tree
+
+
+class StochasticHereAndNowModel(PersistentModel):
+    """
+    Two-stage stochastic program with N price scenarios, built once.
+
+    The first-stage prices, scenario prices, probabilities, the current stock and
+    the demands of both stages are mutable Params. update() changes them in place
+    and solve() re-solves with the persistent solver.
+
+    Shipments only exist on the links of the transport network; the received
+    quantities yr1/yr2 are Expressions of the shipments on the same links.
+    """
+
+    def __init__(self, N, backend=None, problem_data=None):
+        if problem_data is None:
+            problem_data = load_problem_data('v2_02435_two_stage_problem_data')
+
+        (self.number_of_warehouses, self.W, self.cost_miss, self.cost_tr, self.warehouse_capacities,
+         self.transport_capacities, self.initial_stock, self.number_of_simulation_periods, self.sim_T,
+         self.demand_trajectory) = problem_data
+        self.N = N
+        super().__init__(backend)
+
+    def build_model(self):
+        W = self.W
+        cost_tr = self.cost_tr
+        cost_miss = self.cost_miss
+        edges = transport_edges(W, self.transport_capacities)
+        successors, predecessors = adjacency(W, edges)
+
+        model = ConcreteModel()
+
+        model.W = Set(initialize=W)
+        model.S = RangeSet(self.N)
+        model.E = Set(initialize=edges, dimen=2) # links of the transport network
+
+        # Data that changes between solves
+        model.p1 = Param(model.W, initialize=0, mutable=True) # first-stage prices
+        model.p2 = Param(model.W, model.S, initialize=0, mutable=True) # second-stage scenario prices
+        model.prob = Param(model.S, initialize=1 / self.N, mutable=True) # scenario probabilities
+        model.z0 = Param(model.W, initialize=0, mutable=True) # current stock
+        model.D1 = Param(model.W, initialize=0, mutable=True) # demand in stage 1
+        model.D2 = Param(model.W, initialize=0, mutable=True) # demand in stage 2
+
+        model.x1 = Var(model.W, within=NonNegativeReals) # quantity order in stage 1
+        model.x2 = Var(model.W, model.S, within=NonNegativeReals) # quantity order in stage 2
+        model.z1 = Var(model.W, within=NonNegativeReals) # warehouse storage in stage 1
+        model.z2 = Var(model.W, model.S, within=NonNegativeReals) # warehouse storage in stage 2
+        model.m1 = Var(model.W, within=NonNegativeReals) # missing quantity in stage 1
+        model.m2 = Var(model.W, model.S, within=NonNegativeReals) # missing quantity in stage 2
+        model.ys1 = Var(model.E, within=NonNegativeReals) # quantity send in stage 1
+        model.ys2 = Var(model.E, model.S, within=NonNegativeReals)  # quantity send in stage 2
+        # quantity received in stage 1 and 2, the quantity sent the other way along the link
+        model.yr1 = Expression([(q, w) for w, q in edges], rule=lambda m, q, w: m.ys1[w, q])
+        model.yr2 = Expression([(q, w, s) for w, q in edges for s in model.S], rule=lambda m, q, w, s: m.ys2[w, q, s])
+
+        model.obj = Objective(
+            expr=
+            sum(model.x1[w] * model.p1[w] for w in W) +
+            sum(model.x2[w, s] * model.p2[w, s] * model.prob[s] for w in W for s in model.S) +
+            sum(model.ys1[w, q] * cost_tr[w, q] for w, q in edges) +
+            sum(model.ys2[w, q, s] * cost_tr[w, q] * model.prob[s] for w, q in edges for s in model.S) +
+            sum(model.m1[w] * cost_miss[w] for w in W) +
+            sum(model.m2[w, s] * cost_miss[w] * model.prob[s] for w in W for s in model.S),
+            sense=minimize
+        )
+
+        # STAGE 1
+        #Constraint on transport capacity
+        model.TrCap1 = Constraint(model.E, rule=lambda m, w, q: m.ys1[w, q] <= self.transport_capacities[w, q])
+
+        #Constraint on storage capacity
+        model.StCap1 = Constraint(model.W, rule=lambda m, w: m.z1[w] <= self.warehouse_capacities[w])
+
+        #Constraint on demand fulfillment
+        model.Demand1 = Constraint(model.W, rule=lambda m, w: m.x1[w] + m.m1[w] + m.z0[w] + sum(m.ys1[q, w] for q in predecessors[w]) ==
+                                   m.D1[w] + m.z1[w] + sum(m.ys1[w, q] for q in successors[w]))
+
+        #Constraint on (stored) amount sent between warehouses
+        model.YsCons1 = Constraint(model.W, rule=lambda m, w: sum(m.ys1[w, q] for q in successors[w]) <= m.z0[w]
+                                   if successors[w] else Constraint.Skip)
+
+        ## Stage 2 Constraints
+        model.TrCap2 = Constraint(model.E, model.S, rule=lambda m, w, q, s: m.ys2[w, q, s] <= self.transport_capacities[w, q])
+        model.StCap2 = Constraint(model.W, model.S, rule=lambda m, w, s: m.z2[w, s] <= self.warehouse_capacities[w])
+        model.Demand2 = Constraint(model.W, model.S, rule=lambda m, w, s: m.x2[w, s] + m.m2[w, s] + m.z1[w] + sum(m.ys2[q, w, s] for q in predecessors[w]) == m.D2[w] + m.z2[w, s] + sum(m.ys2[w, q, s] for q in successors[w]))
+        model.YsCons2 = Constraint(model.W, model.S, rule=lambda m, w, s: sum(m.ys2[w, q, s] for q in successors[w]) <= m.z1[w]
+                                   if successors[w] else Constraint.Skip)
+
+        return model
+
+    def update(self, p1, p_scen, current_stock, tau=1, prob=None):
+        """
+        Changes the mutable data of the model.
+
+        Args:
+            p1: Current price of each warehouse.
+            p_scen (np.ndarray): Second-stage scenario prices, shape (warehouses, N).
+            current_stock: Current stock of each warehouse.
+            tau (int): Current timeslot (1-based), selects the demands of both stages.
+            prob (np.ndarray, optional): Scenario probabilities. Defaults to equiprobable.
+        """
+        last = self.demand_trajectory.shape[1] - 1
+        prob = np.full(self.N, 1 / self.N) if prob is None else prob
+
+        self.set_param(self.model.p1, {w: p1[w] for w in self.W})
+        self.set_param(self.model.p2, {(w, s): p_scen[i, s - 1] for i, w in enumerate(self.W) for s in self.model.S})
+        self.set_param(self.model.prob, {s: prob[s - 1] for s in self.model.S})
+        self.set_param(self.model.z0, {w: current_stock[w] for w in self.W})
+        self.set_param(self.model.D1, {w: self.demand_trajectory[w, min(tau - 1, last)] for w in self.W})
+        self.set_param(self.model.D2, {w: self.demand_trajectory[w, min(tau, last)] for w in self.W})
+
+    def values(self):
+        """Copy of the solution, with ys and yr over every (w, q) (and s) as in the dense model."""
+        values = super().values()
+        values['ys1'], values['yr1'] = all_pairs(values['ys1'], self.W)
+        values['ys2'], values['yr2'] = all_pairs(values['ys2'], self.W, list(self.model.S))
+        return values
+
+
+def price_fan_tree(p1, W, n_samples):
+    """
+    One-stage scenario tree of second-stage prices, rooted at the current prices.
+
+    Returns:
+        tuple: (prices of shape (warehouses, n_samples), leaf probabilities of shape (n_samples,)).
+    """
     from v2_price_process import sample_next
-    
-    number_of_warehouses, W, cost_miss, cost_tr, warehouse_capacities, transport_capacities, initial_stock, number_of_simulation_periods, sim_T, demand_trajectory = load_the_data()
-    
-    it = 100
-    p_scen = np.zeros((len(W), it))
-    for i, w in enumerate(W):
-        for j in range(it):
-            p_scen[i, j] = sample_next(p1[w])
-    
-    prob = 1/100
-    
-    model = ConcreteModel()
-    
-    model.W = Set(initialize=W)
-    model.S = RangeSet(N)
-    
-    model.x1 = Var(model.W, within=NonNegativeReals) # quantity order in stage 1
-    model.x2 = Var(model.W, model.S, within=NonNegativeReals) # quantity order in stage 2
-    model.z1 = Var(model.W, within=NonNegativeReals) # warehouse storage in stage 1
-    model.z2 = Var(model.W, model.S, within=NonNegativeReals) # warehouse storage in stage 2
-    model.m1 = Var(model.W, within=NonNegativeReals) # missing quantity in stage 1
-    model.m2 = Var(model.W, model.S, within=NonNegativeReals) # missing quantity in stage 2
-    model.ys1 = Var(model.W, model.W, within=NonNegativeReals) # quantity send in stage 1
-    model.ys2 = Var(model.W, model.W, model.S, within=NonNegativeReals)  # quantity send in stage 2
-    model.yr1 = Var(model.W, model.W, within=NonNegativeReals) # quantity received in stage 1
-    model.yr2 = Var(model.W, model.W, model.S, within=NonNegativeReals)  # quantity received in stage 2
-    
-    model.obj = Objective(
-        expr=
-        sum(model.x1[w] * p1[w] for w in W) +
-        sum(model.x2[w, s] * p_scen[i, s] * prob[s] for i, w in enumerate(W) for s in model.S) +
-        sum(model.ys1[w, q] * cost_tr[w, q] for w in W for q in W) +
-        sum(model.ys2[w, q, s] * cost_tr[w, q] * prob[s] for w in W for q in W for s in model.S) +
-        sum(model.m1[w] * cost_miss[w] for w in W) +
-        sum(model.m2[w, s] * cost_miss[w] * prob[s] for w in W for s in model.S),
-        sense=minimize
-    )
-    
-    # STAGE 1
-    #Constraint on transport capacity
-    model.TrCap1 = ConstraintList()
-    for w in W:
-        for q in W:
-            model.TrCap1.add(model.ys1[w, q] <= transport_capacities[w, q])
-    
-    #Constraint on quantity sent equal to quantity received
-    model.QTrans1 = ConstraintList()
-    for w in W:
-        for q in W:
-            model.QTrans1.add(model.ys1[w, q] == model.yr1[q, w])
-    
-    #Constraint on storage capacity
-    model.StCap1 = ConstraintList()
-    for w in W:
-        model.StCap1.add(model.z1[w] <= warehouse_capacities[w])
-    
-    #Constraint on demand fulfillment
-    model.Demand1 = ConstraintList()
-    for w in W:
-        model.Demand1.add(model.x1[w] + model.m1[w] + initial_stock[w] + sum(model.yr1[w, q] for q in W) ==
-                          demand_trajectory[w, 1] + model.z1[w] + sum(model.ys1[w, q] for q in W))
-    
-    #Constraint on (stored) amount sent between warehouses
-    model.YsCons1 = ConstraintList()
-    for w in W:
-        model.YsCons1.add(sum(model.ys1[w, q] for q in W) <= initial_stock[w])
-        
-        
-    ## Stage 2 Constraints
-    model.TrCap2 = Constraint(model.W, model.W, model.S, rule=lambda m, w, q, s: m.ys2[w, q, s] <= m.Ct[w, q])
-    model.QTrans2 = Constraint(model.W, model.W, model.S, rule=lambda m, w, q, s: m.ys2[w, q, s] == m.yr2[q, w, s])
-    model.StCap2 = Constraint(model.W, model.S, rule=lambda m, w, s: m.z2[w, s] <= m.Cs[w])
-    model.Demand2 = Constraint(model.W, model.S, rule=lambda m, w, s: m.x2[w, s] + m.m2[w, s] + m.z1[w] + sum(m.yr2[w, q, s] for q in W) == m.D[w, 2] + m.z2[w, s] + sum(m.ys2[w, q, s] for q in W))
-    model.YsCons2 = Constraint(model.W, model.S, rule=lambda m, w, s: sum(m.ys2[w, q, s] for q in W) <= m.z1[w])
-    
-        
-    
-    
-    opt = SolverFactory('gurobi')
-    opt.solve(model)
-    
-    return p2, model.x1, model.z1, model.m1, model.ys1, model.yr1, model.obj.expr.value
\ No newline at end of file
+
+    next_price = np.vectorize(sample_next, otypes=[float])
+
+    def step(prices, stage):
+        # Transposed, so the samples are drawn warehouse by warehouse as in a loop over W
+        return next_price(prices.T).T
+
+    root = [p1[w] for w in W]
+    leaves = collect_tree(generate_state_tree([n_samples], root, step, max_batch=max(n_samples, 1)))[-1]
+    return leaves.state.T, leaves.probability
+
+
+def sample_price_fan(p1, W, n_samples):
+    """
+    Samples second-stage prices for every warehouse, shape (warehouses, n_samples).
+    """
+    return price_fan_tree(p1, W, n_samples)[0]
+
+
+# Built models, one per number of scenarios, reused across calls
+_models = {}
+
+
+def make_stochastic_here_and_now_decision(p1, N, current_stock=None, tau=1, n_samples=100, reduction='kmeans',
+                                          method='extensive', n_workers=1):
+    """
+    Samples n_samples second-stage price scenarios from a one-stage scenario tree,
+    reduces them, weighted by the tree's probabilities, to N representative
+    scenarios with probabilities and solves the SP on those.
+    With N >= n_samples every sample is kept, so the SP has n_samples scenarios.
+
+    method='extensive' solves the extensive form with the persistent model;
+    method='benders' solves the same SP with the multi-cut L-shaped method of
+    Benders, with the subproblems spread over n_workers processes.
+
+    The demands are those of slot tau (stage 1) and tau + 1 (stage 2), capped at the
+    last slot of the trajectory; the original model always used slots 1 and 2, which
+    is the default tau=1.
+
+    Returns:
+        tuple: (p_scen of shape (warehouses, N), x1, z1, m1, ys1, yr1, objective), where the
+            decisions are copies of the solution: dicts by warehouse, and ys1/yr1 by every
+            pair (w, q), 0 off the transport links.
+    """
+    problem_data = load_problem_data('v2_02435_two_stage_problem_data')
+    W = problem_data[1]
+    current_stock = problem_data[6] if current_stock is None else current_stock
+
+    p_fan, fan_prob = price_fan_tree(p1, W, n_samples)
+    p_scen, prob = reduce_scenarios(p_fan.T, N, reduction, probabilities=fan_prob)
+    p_scen = p_scen.T
+
+    # The model is sized to the scenarios actually returned by the reduction
+    N = len(prob)
+    if method == 'benders':
+        result = solve_sp_benders(problem_data, p1, p_scen, prob, current_stock, tau, n_workers=n_workers)
+        first_stage = result.first_stage
+        x1, z1, m1 = ({w: first_stage[name][i] for i, w in enumerate(W)} for name in ('x1', 'z1', 'm1'))
+        ys1, yr1 = ({(w, q): first_stage[name][i, j] for i, w in enumerate(W) for j, q in enumerate(W)}
+                    for name in ('ys1', 'yr1'))
+        return p_scen, x1, z1, m1, ys1, yr1, result.objective
+    if method != 'extensive':
+        raise ValueError("Unknown SP method '%s', expected 'extensive' or 'benders'" % method)
+    if N not in _models:
+        _models[N] = StochasticHereAndNowModel(N, problem_data=problem_data)
+    sp = _models[N]
+
+    sp.update(p1, p_scen, current_stock, tau, prob)
+    values = sp.solve()
+
+    return (p_scen, values['x1'], values['z1'], values['m1'], values['ys1'], values['yr1'],
+            sp.objective_value())
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+"""
+Scenario reduction for the two-stage stochastic program.
+
+A large sampled fan of scenarios is reduced to N representative scenarios
+with probabilities, so the size of the stochastic program depends on N only.
+"""
+
+import time
+
+import numpy as np
+from sklearn.cluster import KMeans
+
+
+def reduce_kmeans(scenarios, N, probabilities=None, seed=0):
+    """
+    Reduces scenarios to the N k-means cluster centres.
+
+    Args:
+        scenarios (np.ndarray): Sampled scenarios, shape (n_samples, dimension).
+        N (int): Number of scenarios to keep.
+        probabilities (np.ndarray, optional): Probabilities of the samples. Defaults to equiprobable.
+        seed (int): Seed of the k-means initialisation.
+
+    Returns:
+        tuple: (reduced scenarios of shape (N, dimension), probabilities of shape (N,)).
+    """
+    n_samples = scenarios.shape[0]
+    probabilities = np.full(n_samples, 1 / n_samples) if probabilities is None else probabilities
+    if N >= n_samples:
+        return scenarios, probabilities
+
+    kmeans = KMeans(n_clusters=N, n_init=1, random_state=seed)
+    labels = kmeans.fit_predict(scenarios, sample_weight=probabilities)
+    reduced_probabilities = np.bincount(labels, weights=probabilities, minlength=N)
+
+    return kmeans.cluster_centers_, reduced_probabilities / reduced_probabilities.sum()
+
+
+def fast_forward_selection(scenarios, N, probabilities=None):
+    """
+    Selects N scenarios with the fast forward selection heuristic of Heitsch and Romisch.
+
+    Scenarios are added one at a time, each time picking the one that most reduces
+    the probability-weighted distance of the remaining samples to the selected set.
+    The probability of every sample is then moved to its closest selected scenario.
+
+    Args:
+        scenarios (np.ndarray): Sampled scenarios, shape (n_samples, dimension).
+        N (int): Number of scenarios to keep.
+        probabilities (np.ndarray, optional): Probabilities of the samples. Defaults to equiprobable.
+
+    Returns:
+        tuple: (selected scenarios of shape (N, dimension), probabilities of shape (N,)).
+    """
+    n_samples = scenarios.shape[0]
+    probabilities = np.full(n_samples, 1 / n_samples) if probabilities is None else probabilities
+    if N >= n_samples:
+        return scenarios, probabilities
+
+    distance = np.linalg.norm(scenarios[:, None, :] - scenarios[None, :, :], axis=2)
+    # Distance of every sample to the selected set (infinite while nothing is selected)
+    closest = np.full(n_samples, np.inf)
+    selected = np.zeros(n_samples, dtype=bool)
+
+    for _ in range(N):
+        # Cost of adding candidate u: sum_k p_k * min(closest_k, d(k, u))
+        candidate_cost = probabilities @ np.minimum(closest[:, None], distance)
+        candidate_cost[selected] = np.inf
+        u = np.argmin(candidate_cost)
+        selected[u] = True
+        closest = np.minimum(closest, distance[:, u])
+
+    index = np.flatnonzero(selected)
+    nearest = index[np.argmin(distance[:, index], axis=1)]
+    reduced_probabilities = np.array([probabilities[nearest == i].sum() for i in index])
+
+    return scenarios[index], reduced_probabilities
+
+
+REDUCTION_METHODS = {
+    'kmeans': reduce_kmeans,
+    'forward': fast_forward_selection,
+}
+
+
+def reduce_scenarios(scenarios, N, method='kmeans', probabilities=None):
+    return REDUCTION_METHODS[method](scenarios, N, probabilities=probabilities)
+
+
+if __name__ == "__main__":
+    # Solve time and out-of-sample cost of the SP decision against N.
+    # The out-of-sample cost fixes the first-stage decision and evaluates it
+    # on a large independent fan of second-stage prices.
+    from SP_2stage import StochasticHereAndNowModel, sample_price_fan
+
+    n_samples = 1000
+    n_out_of_sample = 2000
+
+    evaluation = StochasticHereAndNowModel(n_out_of_sample)
+    p1 = np.full(len(evaluation.W), 30.0)
+    np.random.seed(1)
+    out_of_sample_fan = sample_price_fan(p1, evaluation.W, n_out_of_sample)
+
+    for method in REDUCTION_METHODS:
+        np.random.seed(0)
+        for N in (5, 10, 20, 50, 100):
+            sp = StochasticHereAndNowModel(N)
+            fan = sample_price_fan(p1, sp.W, n_samples)
+            p_scen, prob = reduce_scenarios(fan.T, N, method)
+
+            start = time.perf_counter()
+            sp.update(p1, p_scen.T, sp.initial_stock, prob=prob)
+            sp.solve()
+            solve_time = time.perf_counter() - start
+
+            evaluation.update(p1, out_of_sample_fan, sp.initial_stock)
+            for first_stage in ('x1', 'z1', 'm1', 'ys1'):
+                decision = getattr(sp.model, first_stage)
+                evaluation.set_fixed(getattr(evaluation.model, first_stage), {i: v.value for i, v in decision.items()})
+            evaluation.solve()
+
+            print("%-8s N=%4d  solve %.3f s  in-sample %.2f  out-of-sample %.2f"
+                  % (method, N, solve_time, sp.objective_value(), evaluation.objective_value()))
@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+"""
+Streaming multi-stage scenario trees.
+
+Trees are produced lazily as a generator of node batches, walking the tree
+depth first in chunks, so at most one chunk per stage is held in memory however
+deep or wide the tree is. generate_state_tree grows a tree of any state with a
+vectorized transition; generate_tree uses the wind_model/price_model dynamics
+of the hydrogen hub, and SP_2stage.price_fan_tree the warehouse price process.
+The leaf probabilities are passed on to the models (SP_2stage, ProgressiveHedging).
+"""
+
+from collections import namedtuple
+
+import numpy as np
+
+from PriceProcess import price_model_batch
+from WindProcess import wind_model_batch
+
+# A batch of nodes of one stage. node_id numbers the nodes of a stage in generation
+# order, parent_id refers to node_id of the previous stage (-1 at the root), and
+# probability is the unconditional probability of reaching the node.
+NodeBatch = namedtuple('NodeBatch', ['stage', 'node_id', 'parent_id', 'wind', 'price', 'probability'])
+# The same for a generic state of shape (nodes, dimension)
+StateBatch = namedtuple('StateBatch', ['stage', 'node_id', 'parent_id', 'state', 'probability'])
+
+
+def generate_state_tree(branching, root, step, max_batch=100_000):
+    """
+    Generates a scenario tree of a generic state lazily, one StateBatch at a time.
+
+    Stage k + 1 has branching[k] children per node of stage k, all with the same
+    conditional probability. Parents are always yielded before their children.
+
+    Args:
+        branching (list): Number of children per node at each stage, e.g. [10, 5, 2].
+        root (np.ndarray): State of the root, shape (dimension,).
+        step (callable): (parent states of shape (k, dimension), stage of the parents) ->
+            child states of shape (k, dimension), drawing one child per row.
+        max_batch (int): Maximum number of nodes in one batch.
+
+    Yields:
+        StateBatch: Nodes of one stage.
+    """
+    next_id = [0] * (len(branching) + 1)
+    next_id[0] = 1
+
+    def expand(stage, node_id, state, probability):
+        if stage == len(branching):
+            return
+        b = branching[stage]
+        chunk = max(1, max_batch // b)
+        for start in range(0, len(node_id), chunk):
+            parents = slice(start, start + chunk)
+            parent_id = np.repeat(node_id[parents], b)
+            child_state = step(np.repeat(state[parents], b, axis=0), stage)
+            child_probability = np.repeat(probability[parents], b) / b
+            child_id = np.arange(next_id[stage + 1], next_id[stage + 1] + len(parent_id))
+            next_id[stage + 1] += len(parent_id)
+
+            yield StateBatch(stage + 1, child_id, parent_id, child_state, child_probability)
+            yield from expand(stage + 1, child_id, child_state, child_probability)
+
+    root = StateBatch(0, np.array([0]), np.array([-1]), np.asarray(root, dtype=float)[None, :], np.array([1.0]))
+    yield root
+    yield from expand(0, root.node_id, root.state, root.probability)
+
+
+def generate_tree(branching, data, rng=None, initial_wind=None, initial_price=None, max_batch=100_000):
+    """
+    Generates a wind/price scenario tree lazily, one NodeBatch at a time.
+
+    The root (stage 0) holds the initial wind and price, which as in the scalar
+    simulations are also used as the previous values. Stage k + 1 has
+    branching[k] children per node of stage k. Parents are always yielded
+    before their children. The tree is reproducible for a given seed and max_batch.
+
+    Args:
+        branching (list): Number of children per node at each stage, e.g. [10, 5, 2].
+        data (dict): Fixed data containing model parameters.
+        rng (np.random.Generator or int, optional): Generator (or seed) used for all draws.
+        initial_wind (float, optional): Wind at the root. Defaults to the target mean.
+        initial_price (float, optional): Price at the root. Defaults to the mean price.
+        max_batch (int): Maximum number of nodes in one batch.
+
+    Yields:
+        NodeBatch: Nodes of one stage.
+    """
+    rng = np.random.default_rng(rng)
+    initial_wind = data['target_mean_wind'] if initial_wind is None else initial_wind
+    initial_price = data['mean_price'] if initial_price is None else initial_price
+
+    # State (wind, previous wind, price, previous price)
+    def step(state, stage):
+        wind, previous_wind, price, previous_price = state.T
+        child_wind = wind_model_batch(wind, previous_wind, data, rng)
+        child_price = price_model_batch(price, previous_price, child_wind, data, rng)
+        return np.column_stack([child_wind, wind, child_price, price])
+
+    root = [initial_wind, initial_wind, initial_price, initial_price]
+    for batch in generate_state_tree(branching, root, step, max_batch):
+        yield NodeBatch(batch.stage, batch.node_id, batch.parent_id, batch.state[:, 0], batch.state[:, 2],
+                        batch.probability)
+
+
+def collect_tree(batches):
+    """
+    Materialises a (small) tree into one NodeBatch (or StateBatch) per stage, ordered by node_id.
+    """
+    stages = {}
+    for batch in batches:
+        stages.setdefault(batch.stage, []).append(batch)
+    return [
+        type(stages[stage][0])(stage, *(np.concatenate([getattr(b, field) for b in stages[stage]])
+                                        for field in stages[stage][0]._fields[1:]))
+        for stage in sorted(stages)
+    ]
+
+
+def tree_scenarios(levels):
+    """
+    Root-to-leaf paths of a collected tree, as inputs for scenario-based models.
+
+    Args:
+        levels (list): Output of collect_tree.
+
+    Returns:
+        tuple: (wind, price) of shape (n_leaves, n_stages + 1), the leaf probabilities
+            of shape (n_leaves,), and node of shape (n_leaves, n_stages + 1) giving the
+            node_id at each stage, so that scenarios sharing a node share its history.
+    """
+    n_stages = len(levels)
+    leaves = levels[-1]
+    node = np.empty((len(leaves.node_id), n_stages), dtype=int)
+    node[:, -1] = leaves.node_id
+    for stage in range(n_stages - 1, 0, -1):
+        node[:, stage - 1] = levels[stage].parent_id[node[:, stage]]
+
+    wind = np.column_stack([levels[stage].wind[node[:, stage]] for stage in range(n_stages)])
+    price = np.column_stack([levels[stage].price[node[:, stage]] for stage in range(n_stages)])
+    return wind, price, leaves.probability, node
+
+
+def tree_trajectories(branching, data, rng=None, T=None, max_batch=100_000):
+    """
+    Wind and price trajectories over the day along the paths of a scenario tree.
+
+    The root is slot 0 and stage k slot k. branching covers the first stages and is
+    padded with 1 (no further branching) up to T - 1 stages, so the scenarios share
+    their history up to each branching point.
+
+    Returns:
+        tuple: (wind, price) of shape (n_leaves, T) and the leaf probabilities of shape (n_leaves,),
+            e.g. for solve_progressive_hedging.
+    """
+    T = data['num_timeslots'] if T is None else T
+    branching = list(branching) + [1] * (T - 1 - len(branching))
+    wind, price, probability, _ = tree_scenarios(collect_tree(generate_tree(branching, data, rng, max_batch=max_batch)))
+    return wind, price, probability
+
+
+def stage_expectation(batches, function):
+    """
+    Probability-weighted sum of function(batch) over every node, streamed batch by batch.
+    """
+    return sum(np.sum(batch.probability * function(batch)) for batch in batches)
@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+"""
+Reproducible, independent random streams for the whole project.
+
+A SeedTree hands out numpy Generators addressed by a path such as
+('experiment', 17) or ('worker', 3). The SeedSequence of a path is exactly
+the child that SeedSequence.spawn would create at that position, so streams
+are statistically independent. Unlike with spawn, the stream of experiment 17
+does not depend on how many streams were created before it or in which
+process. Results then do not depend on the number of workers or the order of
+completion, and single experiments can be cached, checkpointed or rerun.
+
+Common random numbers: compare_policies gives every policy the same streams,
+so the paired differences of their costs only reflect the policies and not
+the sampled days. That usually needs far fewer experiments for the same
+confidence than independent runs.
+"""
+
+import zlib
+
+import numpy as np
+from scipy import stats
+
+# Stream names -> first spawn-key entry. Other names are hashed.
+STREAMS = {
+    'experiment': 0,
+    'scenario': 1,
+    'worker': 2,
+    'policy': 3,
+}
+
+
+def _key(part):
+    if isinstance(part, str):
+        return STREAMS[part] if part in STREAMS else zlib.crc32(part.encode())
+    return int(part)
+
+
+class SeedTree:
+    """
+    Args:
+        seed (int, sequence or np.random.SeedSequence, optional): Root seed of the run.
+            None draws fresh entropy; seed.entropy then records it for rerunning.
+    """
+
+    def __init__(self, seed=None):
+        self.root = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+        self.entropy = self.root.entropy
+
+    def sequence(self, *path):
+        """SeedSequence at path, e.g. sequence('experiment', e)."""
+        key = tuple(_key(part) for part in path)
+        return np.random.SeedSequence(self.root.entropy, spawn_key=self.root.spawn_key + key,
+                                      pool_size=self.root.pool_size)
+
+    def generator(self, *path):
+        """Generator of the stream at path."""
+        return np.random.default_rng(self.sequence(*path))
+
+    def generators(self, n, *path):
+        """Generators of the streams path + (0,), ..., path + (n - 1,)."""
+        return [self.generator(*path, i) for i in range(n)]
+
+    def subtree(self, *path):
+        """SeedTree rooted at path, to hand a whole branch to a component."""
+        return SeedTree(self.sequence(*path))
+
+
+def seed_global(sequence):
+    """
+    Seeds the global legacy np.random state from a SeedSequence, for code
+    that still draws from np.random (e.g. the course's policies).
+    """
+    np.random.set_state(np.random.RandomState(np.random.MT19937(sequence)).get_state())
+
+
+class PolicyComparison:
+    """
+    Outcome of compare_policies.
+
+    Attributes:
+        costs (dict): Per-experiment costs of every policy, by name.
+        means (dict): Mean cost of every policy.
+        differences (dict): For every pair (a, b): mean of cost_a - cost_b, half-width of
+            its confidence interval and the variance reduction, i.e. the variance of the
+            difference under independent runs divided by the paired variance.
+    """
+
+    def __init__(self, costs, differences):
+        self.costs = costs
+        self.means = {name: float(np.mean(value)) for name, value in costs.items()}
+        self.differences = differences
+
+
+def paired_difference(costs_a, costs_b, alpha=0.05):
+    """
+    Mean difference of two cost arrays over the same experiments, with the
+    two-sided (1 - alpha) confidence half-width and the variance reduction.
+    """
+    difference = np.asarray(costs_a) - np.asarray(costs_b)
+    n = len(difference)
+    paired_variance = difference.var(ddof=1)
+    independent_variance = np.var(costs_a, ddof=1) + np.var(costs_b, ddof=1)
+    return {
+        'mean': float(difference.mean()),
+        'half_width': float(stats.t.ppf(1 - alpha / 2, n - 1) * np.sqrt(paired_variance / n)),
+        'variance_reduction': float(independent_variance / paired_variance) if paired_variance > 0 else np.inf,
+    }
+
+
+def compare_policies(evaluate, policies, seed=0, common=True, alpha=0.05):
+    """
+    Evaluates competing policies with common random numbers.
+
+    Args:
+        evaluate (callable): (policy, rng) -> per-experiment costs; must draw all its
+            randomness from rng, e.g. lambda policy, rng: -mdp.simulate_batch(policy, rng=rng).
+        policies (dict): Policies by name.
+        seed: Root seed, see SeedTree.
+        common (bool): Give every policy the same stream. False gives each its own,
+            for comparison with independent runs.
+        alpha (float): Significance level of the confidence intervals.
+
+    Returns:
+        PolicyComparison
+    """
+    tree = SeedTree(seed)
+    costs = {}
+    for i, (name, policy) in enumerate(policies.items()):
+        rng = tree.generator('policy') if common else tree.generator('policy', i)
+        costs[name] = np.asarray(evaluate(policy, rng))
+    names = list(policies)
+    differences = {(a, b): paired_difference(costs[a], costs[b], alpha)
+                   for i, a in enumerate(names) for b in names[i + 1:]}
+    return PolicyComparison(costs, differences)
+
+
+if __name__ == "__main__":
+    from HydrogenADP import ValueTablePolicy, train_value_tables
+    from HydrogenMDP import HydrogenMDP, dummy_policy_batch
+
+    tree = SeedTree(2025)
+    policy = ValueTablePolicy(train_value_tables(rng=tree.generator('training')))
+    mdp = HydrogenMDP(None)
+    policies = {'dummy': dummy_policy_batch, 'value tables': policy.batch}
+
+    def evaluate(policy, rng):
+        return -mdp.simulate_batch(policy, episodes=200, rng=rng)
+
+    for common in (True, False):
+        comparison = compare_policies(evaluate, policies, seed=tree.sequence('evaluation'), common=common)
+        difference = comparison.differences[('dummy', 'value tables')]
+        print("%-20s dummy - value tables: %.2f +- %.2f (variance reduction x%.1f)"
+              % ('common streams' if common else 'independent streams', difference['mean'],
+                 difference['half_width'], difference['variance_reduction']))
@@ -0,0 +1,234 @@
+# -*- coding: utf-8 -*-
+"""
+LRU cache of here-and-now decisions, keyed on a discretised state.
+
+States (tau, current_stock, current_prices) recur closely across experiments.
+The cache rounds stock and prices to a configurable resolution, so that
+near-identical states share one entry, and keeps at most maxsize entries,
+evicting the least recently used. CachedPolicy wraps a policy of the
+evaluation engine with such a cache.
+"""
+
+import os
+import pickle
+import uuid
+from collections import OrderedDict
+
+import numpy as np
+
+from BatchAccounting import to_array
+from data import load_problem_data
+from feasibility_check import check_feasibility
+
+
+class SolutionCache:
+    """
+    Bounded LRU mapping from discretised states to decisions.
+
+    Args:
+        maxsize (int): Maximum number of entries.
+        stock_step (float): Resolution of the stock in the key.
+        price_step (float): Resolution of the prices in the key.
+        path (str, optional): Pickle file the cache is loaded from (if it exists) and saved to.
+    """
+
+    def __init__(self, maxsize=10_000, stock_step=0.5, price_step=1.0, path=None):
+        self.maxsize = maxsize
+        self.stock_step = stock_step
+        self.price_step = price_step
+        self.path = path
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        # Entries put since the last drain(), to be sent to another process's cache
+        self.added = OrderedDict()
+        if path is not None and os.path.exists(path):
+            self.load(path)
+
+    def key(self, tau, current_stock, current_prices):
+        return (
+            tau,
+            tuple(np.round(np.asarray(current_stock, dtype=float) / self.stock_step).astype(int)),
+            tuple(np.round(np.asarray(current_prices, dtype=float) / self.price_step).astype(int)),
+        )
+
+    def get(self, key):
+        """Cached value of key (marked as recently used), or None."""
+        value = self.entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        self._insert(self.entries, key, value)
+        self._insert(self.added, key, value)
+
+    def _insert(self, entries, key, value):
+        entries[key] = value
+        entries.move_to_end(key)
+        while len(entries) > self.maxsize:
+            entries.popitem(last=False)
+
+    def drain(self):
+        """Hits, misses and entries added since the last drain, which are then reset."""
+        state = {'hits': self.hits, 'misses': self.misses, 'entries': list(self.added.items())}
+        self.reset_counts()
+        return state
+
+    def reset_counts(self):
+        """Forgets the hits, misses and added entries, but keeps the entries themselves."""
+        self.hits = 0
+        self.misses = 0
+        self.added = OrderedDict()
+
+    def merge(self, state):
+        """Adds the counts and entries of another cache's drain()."""
+        self.hits += state['hits']
+        self.misses += state['misses']
+        for key, value in state['entries']:
+            self._insert(self.entries, key, value)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'entries': len(self.entries),
+        }
+
+    def save(self, path=None):
+        path = self.path if path is None else path
+        with open(path, 'wb') as file:
+            pickle.dump((self.stock_step, self.price_step, self.entries), file)
+
+    def load(self, path):
+        with open(path, 'rb') as file:
+            stock_step, price_step, entries = pickle.load(file)
+        # Entries of another discretisation would never be looked up
+        if (stock_step, price_step) == (self.stock_step, self.price_step):
+            self.entries = entries
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+
+def rebalance(decision, solved_stock, current_stock, warehouse_capacities):
+    """
+    Adapts a cached decision (x, send, receive, z, m), solved at solved_stock, to current_stock.
+
+    The stock difference goes to the end-of-period stock z within the capacities.
+    Any excess then reduces the missing quantity m and the order x, and any
+    shortage increases m, so the stock balance holds again.
+    """
+    x, send, receive, z, m = (np.array(value, dtype=float) for value in decision)
+    delta = current_stock - solved_stock
+    new_z = np.clip(z + delta, 0, warehouse_capacities)
+    rest = delta - (new_z - z)
+    reduce_m = np.clip(rest, 0, m)
+    reduce_x = np.clip(rest - reduce_m, 0, x)
+    m = m - reduce_m + np.maximum(-rest, 0)
+    x = x - reduce_x
+    return x, send, receive, new_z, m
+
+
+class CachedPolicy:
+    """
+    Policy (number_of_sim_periods, tau, current_stock, current_prices) of the evaluation
+    engine that reuses the decision of an already solved, near-identical state.
+
+    A cached decision is rebalanced to the exact stock and only used if it then passes
+    the course's check_feasibility, as in the evaluation engine; otherwise the wrapped policy is called as on a miss.
+
+    Each process keeps its own cache. The entries are not pickled with the policy.
+    Worker processes start from the file at `path`, if any, and share their cache
+    between all experiments they run. The evaluation engine sends the counts and new
+    entries of the workers back with the experiment results (see drain / merge), so the
+    cache of the calling process holds the whole run and save() persists it to `path`.
+    """
+
+    def __init__(self, policy, maxsize=10_000, stock_step=0.5, price_step=1.0, path=None,
+                 problem_data_module='problem_data'):
+        self.policy = policy
+        self.options = dict(maxsize=maxsize, stock_step=stock_step, price_step=price_step, path=path)
+        self.problem_data_module = problem_data_module
+        self.name = uuid.uuid4().hex
+        self.cache = _process_cache(self.name, self.options)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['cache']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.cache = _process_cache(self.name, self.options)
+
+    def __call__(self, number_of_sim_periods, tau, current_stock, current_prices):
+        problem_data = load_problem_data(self.problem_data_module)
+        W = problem_data[1]
+        current_stock = to_array(current_stock, W)
+        key = self.cache.key(tau, current_stock, current_prices)
+
+        cached = self.cache.get(key)
+        if cached is not None:
+            solved_stock, decision = cached
+            x, send, receive, z, m = rebalance(decision, solved_stock, current_stock,
+                                               to_array(problem_data[4], W))
+            # The same check the evaluation engine accepts decisions with
+            if check_feasibility(x, send, receive, z, m, current_stock, problem_data[9][:, tau - 1],
+                                 problem_data[4], problem_data[5]):
+                return x, send, receive, z, m
+            # Counted as a miss: the decision has to be solved after all
+            self.cache.hits -= 1
+            self.cache.misses += 1
+
+        decision = self.policy(number_of_sim_periods, tau, current_stock, current_prices)
+        x, send, receive, z, m = decision
+        self.cache.put(key, (current_stock.copy(), (to_array(x, W), to_array(send, W, 2), to_array(receive, W, 2),
+                                                    to_array(z, W), to_array(m, W))))
+        return decision
+
+    def drain(self):
+        return self.cache.drain()
+
+    def merge(self, state):
+        self.cache.merge(state)
+
+    def save(self):
+        """Saves the cache to `path`, if one was given."""
+        if self.cache.path is not None:
+            self.cache.save()
+
+
+# Caches of the current process, by CachedPolicy name: (SolutionCache, pid of its owner)
+_caches = {}
+
+
+def _process_cache(name, options):
+    cache, pid = _caches.get(name, (None, None))
+    if cache is None:
+        cache = SolutionCache(**options)
+    elif pid != os.getpid():
+        # Inherited from the parent by fork: the entries are a useful warm start, but the
+        # counts and added entries are the parent's and must not be reported back to it again
+        cache.reset_counts()
+    _caches[name] = (cache, os.getpid())
+    return cache
+
+
+if __name__ == "__main__":
+    import time
+
+    from dummy_policy import make_dummy_decision
+    from my_policy import make_here_and_now_decision
+    from Evaluation_Engine import evaluate_policy
+
+    for stock_step, price_step in ((1e-9, 1e-9), (0.5, 1.0), (1.0, 5.0)):
+        policy = CachedPolicy(make_here_and_now_decision, stock_step=stock_step, price_step=price_step)
+        start = time.perf_counter()
+        cost = evaluate_policy(policy, make_dummy_decision)[0]
+        print("stock step %g, price step %g: cost %.4f in %.2f s, %s"
+              % (stock_step, price_step, cost, time.perf_counter() - start, policy.cache.stats()))
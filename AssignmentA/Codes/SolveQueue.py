@@ -0,0 +1,272 @@
+# -*- coding: utf-8 -*-
+"""
+Asynchronous solve service with bounded concurrency and per-job time limits.
+
+A SolveJob describes a model by a module-level builder function and its
+arguments, since Pyomo models built with local rules cannot be pickled. The
+SolveService runs each job in its own solver subprocess, with at most
+max_workers at a time, and streams the results back in order of completion.
+
+Every job has a wall-clock limit. It is passed to the solver, which then stops
+with its best incumbent. If the solver does not return within a grace period
+after the limit, the subprocess is killed together with any solver process it
+started (it runs in its own process group). When no solution is available
+(timeout, infeasible, crash) the job's fallback decision is used, e.g. the
+dummy policy. A single pathological MILP therefore costs at most its limit
+and never stalls the whole run.
+
+    service = SolveService(max_workers=4, time_limit=10)
+    async for result in service.stream(jobs):
+        ...
+"""
+
+import asyncio
+import math
+import multiprocessing
+import os
+import signal
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from pyomo.environ import Var
+
+from SolverBackends import default_backend, solve
+
+
+class SolveJob:
+    """
+    One model to solve.
+
+    Args:
+        build_model (callable): Module-level function returning a Pyomo model.
+        args (tuple): Arguments of build_model.
+        extract (callable, optional): Module-level function model -> decision, run in the
+            subprocess after the solve. Defaults to the values of all variables.
+        fallback (callable, optional): Called without arguments in the calling process when
+            the job has no solution; its return value becomes the decision.
+        time_limit (float, optional): Wall-clock limit in seconds. Defaults to the service's.
+        key (optional): Identifies the job in its result. Defaults to its position.
+    """
+
+    def __init__(self, build_model, args=(), extract=None, fallback=None, time_limit=None, key=None):
+        self.build_model = build_model
+        self.args = args
+        self.extract = extract
+        self.fallback = fallback
+        self.time_limit = time_limit
+        self.key = key
+
+
+class JobResult:
+    """
+    Outcome of a SolveJob.
+
+    Attributes:
+        key: Key of the job.
+        status (str): 'optimal', 'incumbent' (feasible solution at the time limit),
+            'fallback' (no solution, the fallback was used) or 'failed' (no solution, no fallback).
+        decision: Output of extract or of the fallback, None if failed.
+        solve_result (SolveResult): Solver outcome, None if the subprocess was killed or crashed.
+        wall_time (float): Seconds from the start of the subprocess to the result.
+        error (str): Why no solution is available, None otherwise.
+    """
+
+    def __init__(self, key, status, decision, solve_result, wall_time, error=None):
+        self.key = key
+        self.status = status
+        self.decision = decision
+        self.solve_result = solve_result
+        self.wall_time = wall_time
+        self.error = error
+
+    def __repr__(self):
+        return "JobResult(key=%r, status=%r, wall_time=%.3f)" % (self.key, self.status, self.wall_time)
+
+
+def variable_values(model):
+    """Values of all variables of a model, by variable name and index."""
+    return {var.name: var.extract_values() for var in model.component_objects(Var, active=True)}
+
+
+def _solve_job(build_model, args, extract, backend, time_limit, connection):
+    """Runs in the solver subprocess and sends (status, decision, SolveResult, error) back."""
+    # Own process group, so that a timeout also kills shell solvers (cbc, glpk) started from here
+    if hasattr(os, 'setpgrp'):
+        os.setpgrp()
+    try:
+        model = build_model(*args)
+        options = {} if time_limit is None else {'timelimit': time_limit}
+        result = solve(model, backend, **options)
+        if result.termination_condition == 'optimal':
+            status = 'optimal'
+        elif math.isfinite(result.objective):
+            status = 'incumbent'
+        else:
+            connection.send((None, None, result, 'no solution: %s' % result.termination_condition))
+            return
+        extract = variable_values if extract is None else extract
+        connection.send((status, extract(model), result, None))
+    except Exception as error:
+        # e.g. a solver refusing to load a solution after a timeout
+        connection.send((None, None, None, '%s: %s' % (type(error).__name__, error)))
+    finally:
+        connection.close()
+
+
+def _kill(process):
+    """Kills a solver subprocess and, where process groups exist, every process it started."""
+    if hasattr(os, 'killpg'):
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+            return
+        except (ProcessLookupError, PermissionError):
+            # The subprocess did not get to create its group
+            pass
+    process.kill()
+
+
+class SolveService:
+    """
+    Runs SolveJobs on a bounded pool of solver subprocesses.
+
+    Args:
+        max_workers (int, optional): Maximum number of concurrent solver subprocesses.
+            Defaults to the number of cores.
+        backend (str, optional): Solver backend of SolverBackends. Defaults to default_backend().
+        time_limit (float, optional): Default wall-clock limit per job in seconds, None for none.
+        grace (float): Seconds after the time limit before an unresponsive subprocess is killed.
+    """
+
+    def __init__(self, max_workers=None, backend=None, time_limit=None, grace=5.0):
+        self.max_workers = os.cpu_count() if max_workers is None else max_workers
+        self.backend = default_backend() if backend is None else backend
+        self.time_limit = time_limit
+        self.grace = grace
+        self._context = multiprocessing.get_context()
+
+    async def run_job(self, job, key=None, executor=None):
+        """
+        Solves one job in a new subprocess. Use stream() to bound the concurrency.
+
+        Args:
+            executor (concurrent.futures.Executor, optional): Threads waiting on the subprocess.
+                Defaults to the event loop's default executor.
+        """
+        loop = asyncio.get_running_loop()
+        key = key if job.key is None else job.key
+        time_limit = self.time_limit if job.time_limit is None else job.time_limit
+
+        receiver, sender = self._context.Pipe(duplex=False)
+        # The fallback stays in this process, so it need not be picklable
+        process = self._context.Process(
+            target=_solve_job, args=(job.build_model, job.args, job.extract, self.backend, time_limit, sender),
+            daemon=True,
+        )
+        start = time.perf_counter()
+        process.start()
+        sender.close()
+        try:
+            # Waits in a thread, so that the event loop keeps serving the other jobs
+            deadline = None if time_limit is None else time_limit + self.grace
+            if await loop.run_in_executor(executor, receiver.poll, deadline):
+                try:
+                    status, decision, solve_result, error = receiver.recv()
+                except EOFError:
+                    status, decision, solve_result, error = None, None, None, 'solver subprocess exited'
+            else:
+                _kill(process)
+                status, decision, solve_result, error = None, None, None, 'killed after %.1f s' % deadline
+        except asyncio.CancelledError:
+            _kill(process)
+            raise
+        finally:
+            receiver.close()
+            await loop.run_in_executor(executor, process.join)
+        wall_time = time.perf_counter() - start
+
+        if status is None:
+            if job.fallback is None:
+                status = 'failed'
+            else:
+                status, decision = 'fallback', job.fallback()
+        return JobResult(key, status, decision, solve_result, wall_time, error)
+
+    async def stream(self, jobs):
+        """
+        Solves the jobs, at most max_workers at a time.
+
+        Yields:
+            JobResult: One per job, in order of completion.
+        """
+        semaphore = asyncio.Semaphore(self.max_workers)
+        # Two threads per subprocess: one waiting for its result, one joining it. The pool
+        # belongs to this call, so concurrent streams on one service do not share it
+        threads = ThreadPoolExecutor(max_workers=2 * self.max_workers)
+
+        async def bounded(job, key):
+            async with semaphore:
+                return await self.run_job(job, key, threads)
+
+        try:
+            tasks = [asyncio.ensure_future(bounded(job, key)) for key, job in enumerate(jobs)]
+            try:
+                for next_result in asyncio.as_completed(tasks):
+                    yield await next_result
+            finally:
+                for task in tasks:
+                    task.cancel()
+        finally:
+            threads.shutdown(wait=False)
+
+    async def gather(self, jobs):
+        """Solves the jobs and returns their results in the order of `jobs`."""
+        results = [result async for result in self.stream(jobs)]
+        order = {result.key: result for result in results}
+        return [order[key if job.key is None else job.key] for key, job in enumerate(jobs)]
+
+    def solve_all(self, jobs):
+        """Synchronous wrapper of gather() for code without an event loop."""
+        return asyncio.run(self.gather(jobs))
+
+
+def hydrogen_model(p_wind, lambda_grid):
+    """Task0 hydrogen hub MILP for given wind and price series, as a SolveJob builder."""
+    from Task0 import build_model
+    return build_model(p_wind, lambda_grid)[0]
+
+
+def oih_model(p1, p2, problem_data=None):
+    """Hindsight model of OiH for given prices, as a SolveJob builder."""
+    from OiH import OiHModel
+    oih = OiHModel(problem_data=problem_data)
+    oih.update(p1, p2)
+    return oih.model
+
+
+if __name__ == "__main__":
+    import numpy as np
+
+    from data import get_fixed_data
+    from ScenarioGenerator import generate_scenarios
+
+    def dummy_day():
+        return 'dummy policy'
+
+    data = get_fixed_data()
+    price = generate_scenarios(8, data, rng=0)[1]
+    # Feasible days whatever the wind: the Task0 series of its own random generator
+    rng = np.random.default_rng(1)
+    jobs = [SolveJob(hydrogen_model, (rng.normal(data['target_mean_wind'], 1, 24), p), fallback=dummy_day)
+            for p in price]
+    # A time limit too short to load the model, to show the fallback
+    jobs[3].time_limit = 1e-3
+
+    async def main():
+        service = SolveService(max_workers=2, time_limit=10)
+        start = time.perf_counter()
+        async for result in service.stream(jobs):
+            objective = result.solve_result.objective if result.solve_result else float('nan')
+            print("%.2f s  job %d: %-9s objective %.2f  %s"
+                  % (time.perf_counter() - start, result.key, result.status, objective, result.error or ''))
+
+    asyncio.run(main())
@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+"""
+Solver backend registry.
+
+All entry points get their solver from here instead of hard-coding
+SolverFactory('gurobi'). The backend is chosen by name, by the SOLVER_BACKEND
+environment variable, or defaults to HiGHS, which needs no licence.
+"""
+
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from pyomo.environ import Objective, value
+from pyomo.opt import SolverFactory
+
+# Backend name -> (Pyomo solver name, Pyomo persistent solver name or None)
+SOLVER_BACKENDS = {
+    'highs': ('appsi_highs', 'appsi_highs'),
+    'cbc': ('cbc', None),
+    'glpk': ('glpk', None),
+    'gurobi': ('gurobi', 'gurobi_persistent'),
+}
+
+DEFAULT_BACKEND = 'highs'
+
+
+def default_backend():
+    return os.environ.get('SOLVER_BACKEND', DEFAULT_BACKEND)
+
+
+def get_solver(backend=None, persistent=False):
+    """
+    Returns a Pyomo solver for the given backend.
+
+    Args:
+        backend (str, optional): Backend name. Defaults to default_backend().
+        persistent (bool): Return the persistent interface when the backend has one.
+            Backends without one return their regular solver, which re-reads the
+            whole model on every solve.
+    """
+    backend = default_backend() if backend is None else backend
+    if backend not in SOLVER_BACKENDS:
+        raise ValueError("Unknown solver backend '%s', expected one of %s" % (backend, sorted(SOLVER_BACKENDS)))
+    solver_name, persistent_name = SOLVER_BACKENDS[backend]
+    return SolverFactory(persistent_name if persistent and persistent_name else solver_name)
+
+
+def available_backends():
+    return [name for name in SOLVER_BACKENDS if get_solver(name).available(exception_flag=False)]
+
+
+class SolveResult:
+    """
+    Outcome of one solve, the same for every backend.
+
+    Attributes:
+        backend (str): Backend name.
+        termination_condition (str): Pyomo termination condition, e.g. 'optimal'.
+        solve_time (float): Wall-clock time of the solve call in seconds.
+        objective (float): Objective value, or nan if no solution was loaded.
+        mip_gap (float): Relative gap between the objective bounds, nan if they are not reported.
+    """
+
+    def __init__(self, backend, termination_condition, solve_time, objective, mip_gap):
+        self.backend = backend
+        self.termination_condition = termination_condition
+        self.solve_time = solve_time
+        self.objective = objective
+        self.mip_gap = mip_gap
+
+    def __repr__(self):
+        return ("SolveResult(backend=%r, termination_condition=%r, solve_time=%.4f, objective=%s, mip_gap=%s)"
+                % (self.backend, self.termination_condition, self.solve_time, self.objective, self.mip_gap))
+
+
+def _mip_gap(results):
+    lower = results.problem[0].lower_bound
+    upper = results.problem[0].upper_bound
+    try:
+        lower, upper = float(lower), float(upper)
+    except (TypeError, ValueError):
+        return math.nan
+    if not (math.isfinite(lower) and math.isfinite(upper)):
+        return math.nan
+    return abs(upper - lower) / max(abs(upper), 1e-10)
+
+
+# Callables notified with every SolveResult, e.g. by Instrumentation
+solve_listeners = []
+
+
+def make_result(backend, results, solve_time, objective):
+    """Collects a SolveResult from the SolverResults of a Pyomo solve."""
+    result = SolveResult(
+        backend,
+        str(results.solver.termination_condition),
+        solve_time,
+        objective,
+        _mip_gap(results),
+    )
+    for listener in solve_listeners:
+        listener(result)
+    return result
+
+
+def solve(model, backend=None, solver=None, **options):
+    """
+    Solves a Pyomo model and collects a SolveResult.
+
+    Args:
+        model: Pyomo model with a single active objective.
+        backend (str, optional): Backend name. Defaults to default_backend().
+        solver (optional): Solver instance to reuse instead of creating one from the backend.
+        **options: Passed to the solver's solve call (e.g. tee=True).
+    """
+    backend = default_backend() if backend is None else backend
+    solver = get_solver(backend) if solver is None else solver
+
+    start = time.perf_counter()
+    results = solver.solve(model, **options)
+    solve_time = time.perf_counter() - start
+
+    objective = next(model.component_data_objects(Objective, active=True))
+    objective = value(objective, exception=False)
+    objective = math.nan if objective is None else objective
+
+    return make_result(backend, results, solve_time, objective)
+
+
+def _build_and_solve(build_model, args, backend):
+    model = build_model(*args)
+    # Builders such as Task0.build_model return (model, ...)
+    if isinstance(model, tuple):
+        model = model[0]
+    return solve(model, backend)
+
+
+def solve_with_backends(build_model, args=(), backends=None, n_workers=None):
+    """
+    Solves the same model with several backends in parallel, for benchmarking.
+
+    Each backend runs in its own process and builds its own copy of the model,
+    because Pyomo models built with local rules cannot be pickled. The data must
+    therefore be passed explicitly in args: a builder that samples missing data
+    (e.g. Task0.build_model with p_wind=None) would give every backend a different
+    instance, so None arguments are rejected.
+
+    Args:
+        build_model (callable): Module-level function returning a Pyomo model, or a tuple
+            whose first element is the model.
+        args (tuple): Arguments of build_model, with all the data of the instance.
+        backends (list, optional): Backend names. Defaults to every available backend.
+        n_workers (int, optional): Number of processes. Defaults to one per backend.
+
+    Returns:
+        list: One SolveResult per backend, in the order of `backends`.
+
+    Example:
+        solve_with_backends(Task0.build_model, (p_wind, lambda_grid))
+    """
+    if any(arg is None for arg in args):
+        raise ValueError("solve_with_backends needs explicit data arguments, got None in %r" % (args,))
+    backends = available_backends() if backends is None else backends
+    n_workers = len(backends) if n_workers is None else n_workers
+    with ProcessPoolExecutor(max_workers=n_workers) as pool:
+        futures = [pool.submit(_build_and_solve, build_model, args, backend) for backend in backends]
+        return [future.result() for future in futures]
@@ -5,8 +5,9 @@ from pyomo.environ import *
 import WindProcess
 import PriceProcess
 from data import get_fixed_data
+from SolverBackends import get_solver
 
-def create_model():
+def build_model(p_wind=None, lambda_grid=None, rng=None):
         # Get fixed data
     data = get_fixed_data()
     T = data['num_timeslots']
@@ -18,9 +19,12 @@ def create_model():
     R_h2p = data['conversion_h2p']
     C_elzr = data['electrolyzer_cost']
 
-    # Generate wind and price time series
-    p_wind = np.random.normal(data['target_mean_wind'], 1, T)
-    lambda_grid = np.clip(np.random.normal(data['mean_price'], 5, T), data['price_floor'], data['price_cap'])
+    # Generate wind and price time series, unless given (from rng, or the global np.random state)
+    random = np.random if rng is None else rng
+    if p_wind is None:
+        p_wind = random.normal(data['target_mean_wind'], 1, T)
+    if lambda_grid is None:
+        lambda_grid = np.clip(random.normal(data['mean_price'], 5, T), data['price_floor'], data['price_cap'])
 
     # Define the optimization model
     model = ConcreteModel()
@@ -71,8 +75,13 @@ def create_model():
         return Constraint.Skip
     model.electrolyzer_switching_upper = Constraint(model.T, rule=electrolyzer_switching_rule_upper)
 
+    return model, T, p_wind
+
+def create_model(p_wind=None, lambda_grid=None, backend=None, rng=None):
+    model, T, p_wind = build_model(p_wind, lambda_grid, rng)
+
     # Solve the model
-    solver = SolverFactory('gurobi')  # Make sure Gurobi is installed and properly configured
+    solver = get_solver(backend)  # Backend from SolverBackends (HiGHS unless configured otherwise)
     solver.solve(model)
 
     return solver, model, T, p_wind
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""
+Array-backed store for the decisions of a policy evaluation run.
+
+Replaces the (e, tau)-keyed dicts of Evaluation_Framework with preallocated,
+typed arrays of shape (experiments, periods, ...). With a directory path the
+arrays are memory-mapped .npy files, so memory stays bounded for very large
+runs and the results can be reloaded later without recomputation.
+"""
+
+import os
+
+import numpy as np
+
+# Field name -> (trailing shape in terms of W, dtype key)
+FIELDS = {
+    'x': (1, 'value'),
+    'send': (2, 'value'),
+    'receive': (2, 'value'),
+    'z': (1, 'value'),
+    'm': (1, 'value'),
+    'cost': (0, 'value'),
+    'fallback': (0, bool),
+    'completed': (None, np.int32),
+}
+
+
+class TrajectoryStore:
+    """
+    Preallocated decision arrays for n_experiments x n_periods timeslots.
+
+    Attributes:
+        x, z, m (np.ndarray): Shape (experiments, periods, warehouses).
+        send, receive (np.ndarray): Shape (experiments, periods, warehouses, warehouses).
+        cost (np.ndarray): Cost of each timeslot, shape (experiments, periods).
+        fallback (np.ndarray): True where the dummy policy replaced the decision.
+        completed (np.ndarray): Number of recorded timeslots of each experiment.
+    """
+
+    def __init__(self, n_experiments, n_periods, n_warehouses, path=None, dtype=np.float64, mode='w+'):
+        self.n_experiments = n_experiments
+        self.n_periods = n_periods
+        self.n_warehouses = n_warehouses
+        self.path = path
+        if path is not None:
+            os.makedirs(path, exist_ok=True)
+
+        self.arrays = {}
+        for name, (rank, kind) in FIELDS.items():
+            if rank is None:
+                shape = (n_experiments,)
+            else:
+                shape = (n_experiments, n_periods) + (n_warehouses,) * rank
+            field_dtype = dtype if kind == 'value' else kind
+            if path is None:
+                array = np.zeros(shape, dtype=field_dtype)
+            elif mode == 'w+':
+                array = np.lib.format.open_memmap(os.path.join(path, name + '.npy'), mode='w+',
+                                                  dtype=field_dtype, shape=shape)
+            else:
+                array = np.load(os.path.join(path, name + '.npy'), mmap_mode=mode)
+            self.arrays[name] = array
+            setattr(self, name, array)
+
+    @classmethod
+    def open(cls, path, mode='r'):
+        """
+        Reopens a store saved in `path`; mode 'r' for analysis, 'r+' to keep writing.
+        """
+        x = np.load(os.path.join(path, 'x.npy'), mmap_mode='r')
+        n_experiments, n_periods, n_warehouses = x.shape
+        return cls(n_experiments, n_periods, n_warehouses, path=path, dtype=x.dtype, mode=mode)
+
+    def record_step(self, e, tau, x, send, receive, z, m, fallback=False):
+        """
+        Writes the decision of experiment e at timeslot tau (1-based) in place.
+        """
+        t = tau - 1
+        self.x[e, t] = x
+        self.send[e, t] = send
+        self.receive[e, t] = receive
+        self.z[e, t] = z
+        self.m[e, t] = m
+        self.fallback[e, t] = fallback
+        self.completed[e] = max(self.completed[e], tau)
+
+    def experiment(self, e):
+        """
+        Views (no copies) of all fields of experiment e.
+        """
+        return {name: array[e] for name, array in self.arrays.items()}
+
+    def set_experiment(self, e, values):
+        for name, value in values.items():
+            self.arrays[name][e] = value
+
+    def chunks(self, size=1024):
+        """Slices over the experiment axis, for processing large stores piece by piece."""
+        for start in range(0, self.n_experiments, size):
+            yield slice(start, min(start + size, self.n_experiments))
+
+    def flush(self):
+        for array in self.arrays.values():
+            if isinstance(array, np.memmap):
+                array.flush()
+
+    def save(self, path):
+        """Writes an in-memory store to `path` as .npy files readable by TrajectoryStore.open."""
+        os.makedirs(path, exist_ok=True)
+        for name, array in self.arrays.items():
+            np.save(os.path.join(path, name + '.npy'), array)
+
+    def nbytes(self):
+        return sum(array.nbytes for array in self.arrays.values())
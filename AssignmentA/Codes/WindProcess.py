@@ -7,7 +7,7 @@ Created on Thu Jan  9 10:37:57 2025
 
 import numpy as np
 
-def wind_model(current, previous, data):
+def wind_model(current, previous, data, rng=None):
     """
     Wind model to simulate realistic stochastic transitions.
 
@@ -15,21 +15,54 @@ def wind_model(current, previous, data):
         current (float): Current wind generation.
         previous (float): Wind generation at the previous time step.
         data (dict): Fixed data containing model parameters.
+        rng (np.random.Generator, optional): Generator used for all draws. Defaults to
+            the global np.random state.
 
     Returns:
         float: Next wind generation.
     """
+    random = np.random if rng is None else rng
     target_mean = data['target_mean_wind']
     reversion_strength = data['wind_reversion_strength']
     extreme_event_prob = data['extreme_event_prob_wind']
 
-    correlated_noise = np.random.normal(0, 1) + 0.8 * (current - previous)
+    correlated_noise = random.normal(0, 1) + 0.8 * (current - previous)
     mean_reversion = reversion_strength * (target_mean - current)
 
-    if np.random.rand() < extreme_event_prob:
-        extreme_event = np.random.choice([np.random.uniform(10, 15), np.random.uniform(0, 2)])
+    if random.random() < extreme_event_prob:
+        extreme_event = random.choice([random.uniform(10, 15), random.uniform(0, 2)])
     else:
         extreme_event = 0
 
     next_wind = current + mean_reversion + correlated_noise + extreme_event
-    return max(next_wind, 0)
\ No newline at end of file
+    return max(next_wind, 0)
+
+
+def wind_model_batch(current, previous, data, rng):
+    """
+    Vectorized version of wind_model, advancing a whole batch of scenarios one step.
+
+    Args:
+        current (np.ndarray): Current wind generation for each scenario.
+        previous (np.ndarray): Wind generation at the previous time step for each scenario.
+        data (dict): Fixed data containing model parameters.
+        rng (np.random.Generator): Random generator used for all draws.
+
+    Returns:
+        np.ndarray: Next wind generation for each scenario.
+    """
+    target_mean = data['target_mean_wind']
+    reversion_strength = data['wind_reversion_strength']
+    extreme_event_prob = data['extreme_event_prob_wind']
+    n = current.shape[0]
+
+    correlated_noise = rng.standard_normal(n) + 0.8 * (current - previous)
+    mean_reversion = reversion_strength * (target_mean - current)
+
+    # Same mixture as the scalar model: with equal odds a large (10-15) or small (0-2) jump
+    is_extreme = rng.random(n) < extreme_event_prob
+    extreme_event = np.where(rng.random(n) < 0.5, rng.uniform(10, 15, n), rng.uniform(0, 2, n))
+    extreme_event = np.where(is_extreme, extreme_event, 0)
+
+    next_wind = current + mean_reversion + correlated_noise + extreme_event
+    return np.maximum(next_wind, 0)
@@ -5,12 +5,38 @@ Created on Sat Dec 28 16:18:27 2024
 @author: geots
 """
 
+import functools
+import importlib
+
 import numpy as np
 
-def get_fixed_data():
+
+class FixedData(dict):
     """
-    Returns the fixed data for the energy hub simulation.
+    Read-only dict of fixed data. Arrays in it are made read-only as well, so one
+    cached instance can be shared by every caller.
+
+    Pickling (e.g. to spawned workers) rebuilds it from a plain dict, since the
+    dict protocol would go through the blocked __setitem__, and read-only flags
+    of arrays are not pickled; the copy is frozen again on construction.
     """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        for value in self.values():
+            if isinstance(value, np.ndarray):
+                value.setflags(write=False)
+
+    def _read_only(self, *args, **kwargs):
+        raise TypeError("Fixed data is read-only; use register_parameter_set for other values")
+
+    __setitem__ = __delitem__ = clear = pop = popitem = setdefault = update = _read_only
+
+    def __reduce__(self):
+        return (FixedData, (dict(self),))
+
+
+def _default_parameters():
     num_timeslots = 24
     return {
         # Conversion efficiencies
@@ -19,7 +45,7 @@ def get_fixed_data():
 
         # Hydrogen storage capacity
         'hydrogen_capacity': 15,
-        
+
         'p2h_rate': 5,
         'h2p_rate': 5,
 
@@ -37,10 +63,90 @@ def get_fixed_data():
         'wind_influence_on_price': -0.6,
         'price_cap': 90,  # Increased price cap
         'price_floor': 0,  # Allow occasional negative prices
-        
-        
+
+
         'num_timeslots': num_timeslots,
         'demand_schedule': [5 + 2 * np.sin(2 * np.pi * t / 24) for t in range(num_timeslots)]
 
-        
-    }
\ No newline at end of file
+
+    }
+
+
+# Named parameter sets, as overrides of the default values
+PARAMETER_SETS = {'default': {}}
+
+
+def register_parameter_set(name, **overrides):
+    """
+    Registers (or replaces) a named parameter set, e.g.
+    register_parameter_set('high_wind', target_mean_wind=7).
+
+    If num_timeslots is overridden without demand_schedule, the demand schedule
+    is rebuilt for the new number of timeslots.
+    """
+    PARAMETER_SETS[name] = overrides
+    get_fixed_data.cache_clear()
+
+
+@functools.lru_cache(maxsize=None)
+def get_fixed_data(name='default'):
+    """
+    Returns the fixed data for the energy hub simulation.
+
+    The data is built once per process and parameter set and returned as a
+    read-only FixedData, with demand_schedule as a read-only array.
+    """
+    data = _default_parameters()
+    overrides = PARAMETER_SETS[name]
+    data.update(overrides)
+    if 'num_timeslots' in overrides and 'demand_schedule' not in overrides:
+        data['demand_schedule'] = [5 + 2 * np.sin(2 * np.pi * t / 24) for t in range(data['num_timeslots'])]
+
+    data['demand_schedule'] = np.array(data['demand_schedule'], dtype=float)
+    return FixedData(data)
+
+
+@functools.lru_cache(maxsize=None)
+def load_problem_data(module='v2_02435_two_stage_problem_data'):
+    """
+    load_the_data() of a two-stage problem data module, loaded once per process.
+
+    Array entries are read-only copies, since the same tuple is returned to every
+    caller; the arrays of the course module itself stay writable.
+    """
+    problem_data = []
+    for value in importlib.import_module(module).load_the_data():
+        if isinstance(value, np.ndarray):
+            value = value.copy()
+            value.setflags(write=False)
+        problem_data.append(value)
+    return tuple(problem_data)
+
+
+def transport_edges(W, transport_capacities):
+    """
+    Links (w, q) of the transport network, i.e. the pairs with a positive capacity.
+
+    Args:
+        W: Warehouses.
+        transport_capacities: Capacity of each pair, indexed [w, q]; an array or a dict
+            holding only the links of a sparse network.
+    """
+    if isinstance(transport_capacities, dict):
+        return [(w, q) for (w, q), capacity in transport_capacities.items() if capacity > 0]
+    return [(w, q) for w in W for q in W if transport_capacities[w, q] > 0]
+
+
+def adjacency(W, edges):
+    """
+    Outgoing and incoming neighbours of every warehouse.
+
+    Returns:
+        tuple: (successors, predecessors), dicts mapping w to lists of warehouses.
+    """
+    successors = {w: [] for w in W}
+    predecessors = {w: [] for w in W}
+    for w, q in edges:
+        successors[w].append(q)
+        predecessors[q].append(w)
+    return successors, predecessors
@@ -1,11 +1,12 @@
 # Import necessary libraries
 from pyomo.environ import *
-from pyomo.opt import SolverFactory
 import numpy as np
 import matplotlib.pyplot as plt
 from data import get_fixed_data
 from PriceProcess import price_model  # Import the price model
 from WindProcess import wind_model 
+from SolverBackends import get_solver
+from Seeding import SeedTree
 
 # Retrieve Data
 data = get_fixed_data()
@@ -18,6 +19,9 @@ R_p2h = data['conversion_p2h']
 R_h2p = data['conversion_h2p']
 C_elzr = data['electrolyzer_cost']
 
+# Generator of the wind and price series, a stream of the project's seed tree
+rng = SeedTree(0).generator('experiment', 0)
+
 ## Initialize Wind Power Dynamically
 wind_power = np.zeros(T)
 wind_power[0] = data['target_mean_wind']  # Start with target mean wind
@@ -26,7 +30,7 @@ if T > 1:
 
 # Generate wind power using wind_model
 for t in range(2, T):
-    wind_power[t] = wind_model(wind_power[t-1], wind_power[t-2], data)
+    wind_power[t] = wind_model(wind_power[t-1], wind_power[t-2], data, rng)
 
 # Initialize Electricity Price Dynamically
 price = np.zeros(T)
@@ -34,7 +38,7 @@ price[0] = data['mean_price']  # Start with the mean price
 if T > 1:
     price[1] = price[0]  # Initialize the second value as well
 for t in range(2, T):
-    price[t] = price_model(price[t-1], price[t-2], wind_power[t], data)
+    price[t] = price_model(price[t-1], price[t-2], wind_power[t], data, rng)
 
 # Create Pyomo Model
 model = ConcreteModel()
@@ -82,8 +86,8 @@ def electrolyzer_switch_on(model, t):
     return model.E_SW[t] == 0  # Initial state when t=0 is off
 
 
-# Solve Optimization Problem (Using Gurobi)
-solver = SolverFactory('gurobi')
+# Solve Optimization Problem (backend from SolverBackends)
+solver = get_solver()
 solver.solve(model, tee=True)
 
 # Organize Results for Visualization
@@ -0,0 +1,9 @@
+# -*- coding: utf-8 -*-
+"""
+The modules of this directory import each other by name, as when run from Codes.
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+"""
+The L-shaped method reaches the optimum of the extensive form.
+"""
+
+import pytest
+
+np = pytest.importorskip('numpy')
+pytest.importorskip('scipy')
+pytest.importorskip('highspy')
+
+from Benders import recourse_lower_bound, solve_sp_benders
+from MatrixModels import build_sp_matrix, synthetic_problem_data
+
+
+@pytest.mark.parametrize('low', [10, -20])
+def test_benders_matches_extensive_form(low):
+    # low < 0 gives negative scenario prices, where theta >= 0 would cut off the optimum
+    problem_data = synthetic_problem_data(6, seed=1)
+    rng = np.random.default_rng(2)
+    N = 20
+    p1 = rng.uniform(10, 50, 6)
+    p_scen = rng.uniform(low, 50, (6, N))
+    prob = rng.dirichlet(np.ones(N))
+
+    extensive = build_sp_matrix(problem_data, p1, p_scen, prob).solve()[0]
+    result = solve_sp_benders(problem_data, p1, p_scen, prob, n_workers=1)
+
+    assert result.objective == pytest.approx(extensive, rel=1e-5, abs=1e-6)
+    assert result.lower_bound <= result.objective + 1e-6
+    assert result.first_stage['ys1'].shape == (6, 6)
+
+
+def test_recourse_lower_bound():
+    problem_data = synthetic_problem_data(4, seed=3)
+    p_scen = np.array([[10.0, -1.0], [5.0, 0.0], [1.0, 2.0], [3.0, -2.0]])
+    D2, Cs = problem_data[9][:, 1], problem_data[4]
+
+    bound = recourse_lower_bound(problem_data, p_scen)
+
+    assert bound[0] == 0
+    assert bound[1] == pytest.approx(-(D2[0] + 2 * Cs[0]) - 2 * (D2[3] + 2 * Cs[3]))
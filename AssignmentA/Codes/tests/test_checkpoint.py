@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+"""
+Checkpoints restore finished experiments, and only into the run they belong to.
+"""
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from Checkpoint import Checkpoint
+from TrajectoryStore import TrajectoryStore
+
+
+def _metadata(prices_sha256):
+    return {'policy': 'p', 'seed_entropy': 1, 'seed_spawn_key': [], 'prices_sha256': prices_sha256}
+
+
+def test_restore_and_refuse_other_prices(tmp_path):
+    store = TrajectoryStore(3, 2, 2)
+    rng = np.random.default_rng(0)
+    for e in range(2):
+        for tau in (1, 2):
+            store.record_step(e, tau, rng.random(2), rng.random((2, 2)), rng.random((2, 2)), rng.random(2), rng.random(2))
+    checkpoint = Checkpoint(str(tmp_path), _metadata('a'), every=1)
+    checkpoint.add(store, 0)
+    checkpoint.add(store, 1)
+
+    restored = TrajectoryStore(3, 2, 2)
+    assert Checkpoint(str(tmp_path), _metadata('a')).restore(restored) == {0, 1}
+    np.testing.assert_array_equal(restored.x, store.x)
+    np.testing.assert_array_equal(restored.send, store.send)
+
+    with pytest.raises(ValueError):
+        Checkpoint(str(tmp_path), _metadata('b'))
+
+
+def test_resumed_run_matches_uninterrupted_run(tmp_path):
+    for module in ('my_policy', 'dummy_policy', 'feasibility_check', 'simulation_experiments'):
+        pytest.importorskip(module)
+    from dummy_policy import make_dummy_decision
+    from Evaluation_Engine import evaluate_policy
+
+    def run(experiments, base_seed=5, checkpoint_path=None):
+        return evaluate_policy(make_dummy_decision, make_dummy_decision, n_workers=1, base_seed=base_seed,
+                               experiments=experiments, checkpoint_path=checkpoint_path, checkpoint_every=1)
+
+    path = str(tmp_path / 'checkpoint')
+    run(2, checkpoint_path=path)
+    resumed = run(4, checkpoint_path=path)
+    uninterrupted = run(4)
+
+    np.testing.assert_array_equal(resumed[1], uninterrupted[1])
+    # Another seed draws other prices, so the checkpoint is refused
+    with pytest.raises(ValueError):
+        run(4, base_seed=6, checkpoint_path=path)
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+"""
+Seed streams are addressed by path, and compare_policies uses common random numbers.
+"""
+
+import pytest
+
+np = pytest.importorskip('numpy')
+pytest.importorskip('scipy')
+
+from Seeding import SeedTree, compare_policies, seed_global
+
+
+def test_streams_do_not_depend_on_order():
+    forward = [SeedTree(7).generator('experiment', e).random(3) for e in range(5)]
+    tree = SeedTree(7)
+    backward = [tree.generator('experiment', e).random(3) for e in reversed(range(5))][::-1]
+
+    np.testing.assert_array_equal(forward, backward)
+    assert not np.array_equal(forward[0], forward[1])
+
+
+def test_seed_global_is_reproducible():
+    tree = SeedTree(7)
+    seed_global(tree.sequence('prices'))
+    first = np.random.uniform(size=4)
+    seed_global(tree.sequence('prices'))
+
+    np.testing.assert_array_equal(first, np.random.uniform(size=4))
+
+
+def test_common_random_numbers():
+    def evaluate(policy, rng):
+        return rng.normal(size=50) + policy
+
+    policies = {'a': 0.0, 'b': 1.0}
+    common = compare_policies(evaluate, policies, seed=3)
+    independent = compare_policies(evaluate, policies, seed=3, common=False)
+
+    # With the same draws the paired difference is exactly the difference of the policies
+    np.testing.assert_allclose(common.costs['a'] - common.costs['b'], -1.0)
+    assert common.differences[('a', 'b')]['half_width'] == pytest.approx(0.0, abs=1e-12)
+    assert not np.allclose(independent.costs['a'] - independent.costs['b'], -1.0)
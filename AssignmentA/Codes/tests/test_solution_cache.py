@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+"""
+Worker caches are merged into the caller's without counting any lookup twice.
+"""
+
+import copy
+import pickle
+
+import pytest
+
+np = pytest.importorskip('numpy')
+# SolutionCache validates hits with the course's feasibility check
+pytest.importorskip('feasibility_check')
+
+import SolutionCache
+from SolutionCache import CachedPolicy
+
+
+def _policy(number_of_sim_periods, tau, current_stock, current_prices):
+    raise AssertionError("not called")
+
+
+def test_forked_worker_reports_only_its_own_lookups(monkeypatch):
+    parent = CachedPolicy(_policy)
+    key = parent.cache.key(1, [1.0, 2.0], [30.0, 40.0])
+    parent.cache.put(key, 'decision')
+    parent.cache.get(key)
+    parent.cache.get(('missing',))
+    parent.cache.drain()
+    parent.cache.get(key)
+
+    # A forked worker inherits a copy of the parent's cache under another pid
+    SolutionCache._caches[parent.name] = (copy.deepcopy(parent.cache), 0)
+    worker = pickle.loads(pickle.dumps(parent))
+    assert worker.cache.stats()['hits'] == 0 and worker.cache.get(key) == 'decision'
+    other = worker.cache.key(2, [0.0, 0.0], [10.0, 10.0])
+    worker.cache.get(other)
+    worker.cache.put(other, 'other decision')
+
+    parent.merge(worker.drain())
+
+    assert parent.cache.stats()['hits'] == 2
+    assert parent.cache.stats()['misses'] == 1
+    assert parent.cache.get(other) == 'other decision'
+    # A second drain of the same worker has nothing left to report
+    assert worker.drain() == {'hits': 0, 'misses': 0, 'entries': []}